@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Generate a synthetic corpus of EOS running-configs for benchmarks.
+
+Devices get a leaf or spine role and the sections a real EOS config
+has: header comments, management, AAA, VLANs, interfaces, port
+channels, SVIs, BGP. Most stanzas are shared by every device of a
+role, the variability knob controls how many are made device specific
+(descriptions, extra VLANs, addresses, one-off settings). The same
+seed always gives the same corpus.
+
+Usage:
+    ./bench/gencorpus.py --directory corpus --devices 10000 --stanzas 200
+"""
+
+import argparse
+import os
+import random
+from typing import List
+
+
+def gen_config(index: int, stanzas: int = 200, variability: float = 0.1,
+               seed: int = 1) -> str:
+    """Config of one synthetic device.
+
+    Args:
+        index: Device number, it names the device
+        stanzas: Approximate number of '!' separated stanzas
+        variability: Probability, 0 to 1, that a shared stanza is
+            made device specific
+        seed: Corpus seed
+
+    Returns:
+        The running-config text
+    """
+    rnd = random.Random(f"{seed}-{index}")
+    role = "spine" if index % 16 == 0 else "leaf"
+    name = f"{role}{index}"
+    pod = index // 64
+
+    def varies() -> bool:
+        return rnd.random() < variability
+
+    lines: List[str] = []
+    if rnd.random() < 0.5:
+        lines += ["!RANCID-CONTENT-TYPE: arista", "!"]
+    lines += [
+        "! Command: show running-config",
+        f"! device: {name} (DCS-7050SX3-48YC8, EOS-4.2{index % 4}.1F)",
+        "!",
+        "! boot system flash:/EOS.swi",
+        "!",
+    ]
+    if varies():
+        lines.append(f"!! last change by netops ticket {rnd.randint(1000, 9999)}")
+    lines += [
+        "transceiver qsfp default-mode 4x10G",
+        "!",
+        "service routing protocols model multi-agent",
+        "!",
+        f"hostname {name}",
+        "ip name-server vrf MGMT 10.0.0.53",
+        "ip name-server vrf MGMT 10.0.1.53",
+        "dns domain dc1.example.com",
+        "!",
+        "ntp server vrf MGMT 10.0.0.123 prefer",
+        "ntp server vrf MGMT 10.0.1.123",
+        "!",
+        "spanning-tree mode mstp",
+        f"spanning-tree mst 0 priority {4096 if role == 'spine' else 32768}",
+        "!",
+        "no aaa root",
+        "aaa authentication login default group tacacs+ local",
+        "aaa authorization exec default group tacacs+ local",
+        "!",
+        "username admin privilege 15 role network-admin secret sha512 $6$saltsalt$hash!",
+        "!",
+    ]
+    if varies():
+        lines += [f"username ops{index} privilege 1 secret sha512 $6$x$y", "!"]
+
+    # the rest of the budget goes to vlans, interfaces and routing
+    budget = max(stanzas - 12, 8)
+    vlans = max(budget // 8, 2)
+    for vlan in range(10, 10 + vlans):
+        lines += [f"vlan {vlan}", f"   name {role.upper()}_VLAN{vlan}", "!"]
+    if varies():
+        lines += [f"vlan {3000 + index % 900}", f"   name TEMP_{name}", "!"]
+    lines += ["vrf instance MGMT", "!"]
+
+    ethernets = max(budget - vlans - 20, 4)
+    for port in range(1, ethernets + 1):
+        lines.append(f"interface Ethernet{port}")
+        if role == "spine":
+            lines.append(f"   description to-leaf{port} Ethernet49")
+            lines.append("   no switchport")
+            lines.append(f"   ip address 10.{pod}.{port}.0/31")
+        else:
+            if varies():
+                lines.append(f"   description {name}-host{port}")
+            lines.append(f"   switchport access vlan {10 + port % vlans}")
+            lines.append("   spanning-tree portfast")
+            if varies():
+                lines.append("   ! cabling to be checked")
+            if varies():
+                lines.append("   shutdown")
+        lines.append("!")
+    for channel in range(1, 3):
+        lines += [
+            f"interface Port-Channel{channel}",
+            "   switchport mode trunk",
+            f"   switchport trunk allowed vlan 10-{9 + vlans}",
+            "!",
+        ]
+    lines += [
+        "interface Loopback0",
+        f"   ip address 10.255.{pod}.{index % 256}/32",
+        "!",
+        "interface Management1",
+        "   vrf MGMT",
+        f"   ip address 192.168.{pod % 256}.{index % 256}/16",
+        "!",
+    ]
+    for vlan in range(10, 10 + min(vlans, 8)):
+        lines += [
+            f"interface Vlan{vlan}",
+            f"   ip address virtual 10.{vlan}.0.1/24",
+            "!",
+        ]
+    lines += ["ip routing", "no ip routing vrf MGMT", "!"]
+    lines += [
+        "ip route vrf MGMT 0.0.0.0/0 192.168.0.1",
+        "!",
+        f"router bgp {65000 + (0 if role == 'spine' else index)}",
+        f"   router-id 10.255.{pod}.{index % 256}",
+        "   maximum-paths 4 ecmp 4",
+        "   neighbor SPINES peer group",
+        "   neighbor SPINES remote-as 65000",
+        "   redistribute connected",
+        "!",
+        "management api http-commands",
+        "   no shutdown",
+        "   vrf MGMT",
+        "      no shutdown",
+        "!",
+        "banner motd",
+        "Authorized access only!",
+        "EOF",
+        "!",
+        "end",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_corpus(directory: str, devices: int, stanzas: int = 200,
+                 variability: float = 0.1, seed: int = 1) -> List[str]:
+    """Write a corpus, one '<name>.txt' file per device.
+
+    Returns:
+        Paths of the files written
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(devices):
+        config = gen_config(index, stanzas, variability, seed)
+        name = config.split("hostname ", 1)[1].split("\n", 1)[0]
+        path = os.path.join(directory, f"{name}.txt")
+        with open(path, "w") as writer:
+            writer.write(config)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--directory", type=str, required=True,
+                        help="directory to write the configs to")
+    parser.add_argument("-n", "--devices", type=int, default=100,
+                        help="number of devices")
+    parser.add_argument("-s", "--stanzas", type=int, default=200,
+                        help="approximate number of stanzas per config")
+    parser.add_argument("-v", "--variability", type=float, default=0.1,
+                        help="probability that a shared stanza is made device specific")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="corpus seed")
+    args = parser.parse_args()
+    write_corpus(args.directory, args.devices, args.stanzas,
+                 args.variability, args.seed)
+
+
+if __name__ == "__main__":
+    main()
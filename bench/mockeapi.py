@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Mock eAPI '/command-api' server for confgrabber.py benchmarks.
+
+Speaks JSON-RPC over plain HTTP/1.1 with keep-alive, from one event
+loop, so thousands of devices can be served from a laptop. Devices are
+loopback addresses: 127.0.0.1 is device 0, 127.0.0.2 device 1, and so
+on across the 127.0.0.0/8 range. Each device serves a config from a
+corpus directory, or one made by gencorpus.gen_config().
+
+Latency and failures are tunable: every request waits the given
+latency plus a random jitter, and fails with the given probability
+with a JSON-RPC error, an HTTP 500, a dropped connection, or a
+response cut in the middle of its body. With a
+capacity, the server behaves like a shared AAA server under load:
+beyond that many requests in flight, latency grows with the load and
+the excess requests fail.
+
+Usage:
+    ./bench/mockeapi.py --port 18080 --latency 0.2 --failure-rate 0.01
+    ./confgrabber.py -u u -p p -f hosts --transport http ...
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from hashlib import blake2b
+from typing import List, Optional
+
+from gencorpus import gen_config
+
+
+def host_list(devices: int, port: int) -> List[str]:
+    """'host:port' of the first devices served by the mock."""
+    hosts = []
+    for index in range(devices):
+        n = index + 1
+        hosts.append(f"127.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}:{port}")
+    return hosts
+
+
+def device_index(host: str) -> int:
+    """Device number of a 'host[:port]' Host header."""
+    octets = [int(octet) for octet in host.rsplit(":", 1)[0].split(".")]
+    return (octets[1] << 16 | octets[2] << 8 | octets[3]) - 1
+
+
+class CommandError(Exception):
+    """A command of a runCmds request failed.
+
+    Attributes:
+        data: Results of the commands run, the failed one last
+    """
+
+    def __init__(self, message: str, data: list):
+        super().__init__(message)
+        self.data = data
+
+
+class MockEapi:
+    """Mock eAPI server.
+
+    Args:
+        corpus: Directory of configs to serve, None to generate them
+        stanzas: Stanzas of the generated configs
+        variability: Variability of the generated configs
+        latency: Seconds every request waits
+        jitter: Maximum random seconds added to the latency
+        failure_rate: Probability, 0 to 1, that a request fails
+        failure_modes: Failures picked from 'error', 'http500', 'drop',
+            'truncate'
+        seed: Seed of the failures and of the generated configs
+        capacity: Requests in flight beyond which the server is
+            overloaded, 0 for no limit
+    """
+
+    def __init__(self, corpus: Optional[str] = None, stanzas: int = 200,
+                 variability: float = 0.1, latency: float = 0.0,
+                 jitter: float = 0.0, failure_rate: float = 0.0,
+                 failure_modes: List[str] = ("error", "http500", "drop"),
+                 seed: int = 1, capacity: int = 0):
+        self.files = None
+        if corpus:
+            self.files = sorted(
+                os.path.join(corpus, name) for name in os.listdir(corpus)
+                if not name.startswith(".")
+            )
+        self.stanzas = stanzas
+        self.variability = variability
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_modes = list(failure_modes)
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.configs = {}
+        self.capacity = capacity
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+
+    def config(self, index: int) -> str:
+        """Running-config of a device."""
+        config = self.configs.get(index)
+        if config is None:
+            if self.files:
+                with open(self.files[index % len(self.files)], "r") as current_file:
+                    config = current_file.read()
+            else:
+                config = gen_config(index, self.stanzas, self.variability, self.seed)
+            self.configs[index] = config
+        return config
+
+    def run_cmds(self, host: str, cmds: List[str]) -> list:
+        """Result of a runCmds request.
+
+        Commands other than 'enable' and 'show' commands fail as EOS
+        fails them: the error data holds the results of the commands
+        run so far, then the error of the failed command.
+
+        Raises:
+            CommandError: a command failed
+        """
+        index = device_index(host)
+        result = []
+        for number, cmd in enumerate(cmds, 1):
+            structured = cmd.endswith("| json")
+            if structured:
+                cmd = cmd[:-len("| json")].rstrip()
+            if cmd == "enable":
+                result.append({})
+            elif cmd.startswith(("show running-config", "show startup-config")):
+                result.append({"output": self.config(index)})
+            elif cmd == "show version":
+                # changes with the config, for --fingerprint-cmd
+                digest = blake2b(self.config(index).encode(), digest_size=8)
+                if structured:
+                    result.append({"output": json.dumps({
+                        "modelName": "vEOS-mock", "serialNumber": digest.hexdigest(),
+                    })})
+                else:
+                    result.append({"output": f"Serial number: {digest.hexdigest()}\n"})
+            elif cmd.startswith("show "):
+                result.append({"output": "{}" if structured else ""})
+            else:
+                result.append({"errors": ["Invalid input (at token 0)"]})
+                raise CommandError(
+                    f"CLI command {number} of {len(cmds)} '{cmd}' failed: invalid command",
+                    result,
+                )
+        return result
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of one keep-alive connection."""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = {}
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                self.in_flight += 1
+                load = self.in_flight / self.capacity if self.capacity else 0
+                delay = self.latency + self.random.uniform(0, self.jitter)
+                if load > 1:
+                    delay *= load
+                try:
+                    if delay:
+                        await asyncio.sleep(delay)
+                finally:
+                    self.in_flight -= 1
+                status = "200 OK"
+                request = json.loads(body)
+                failure = None
+                if load > 1 and self.random.random() > 1 / load:
+                    self.failures += 1
+                    failure = "error"
+                elif self.random.random() < self.failure_rate:
+                    self.failures += 1
+                    failure = self.random.choice(self.failure_modes)
+                if failure == "drop":
+                    break
+                if failure == "http500":
+                    status = "500 Internal Server Error"
+                    data = b"internal error"
+                elif failure == "error":
+                    data = json.dumps({
+                        "jsonrpc": "2.0", "id": request.get("id"),
+                        "error": {"code": 1002, "message": "CLI command 2 of 2 failed: mock failure"},
+                    }).encode()
+                else:
+                    try:
+                        data = json.dumps({
+                            "jsonrpc": "2.0", "id": request.get("id"),
+                            "result": self.run_cmds(headers.get("host", "127.0.0.1"),
+                                                    request["params"]["cmds"]),
+                        }).encode()
+                    except CommandError as error:
+                        data = json.dumps({
+                            "jsonrpc": "2.0", "id": request.get("id"),
+                            "error": {"code": 1002, "message": str(error), "data": error.data},
+                        }).encode()
+                head = (
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode()
+                )
+                if failure == "truncate":
+                    # the connection is closed in the middle of the body
+                    writer.write(head + data[:len(data) // 2])
+                    await writer.drain()
+                    break
+                writer.write(head + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 18080) -> None:
+        """Serve until cancelled."""
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=18080,
+                        help="port to listen on, on every loopback address")
+    parser.add_argument("--corpus", type=str, default=None,
+                        help="directory of configs to serve, generated if omitted")
+    parser.add_argument("-s", "--stanzas", type=int, default=200,
+                        help="stanzas of the generated configs")
+    parser.add_argument("-v", "--variability", type=float, default=0.1,
+                        help="variability of the generated configs")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds every request waits")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="maximum random seconds added to the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="probability that a request fails")
+    parser.add_argument("--failure-modes", type=str, nargs="+",
+                        default=["error", "http500", "drop"],
+                        choices=["error", "http500", "drop", "truncate"],
+                        help="failures to pick from")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="requests in flight beyond which latency grows and the excess fails, 0 for no limit")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="seed of the failures and generated configs")
+    parser.add_argument("--hosts", type=int, default=0,
+                        help="print a switches file for this many devices and exit")
+    args = parser.parse_args()
+    if args.hosts:
+        print("\n".join(host_list(args.hosts, args.port)))
+        return
+    mock = MockEapi(args.corpus, args.stanzas, args.variability, args.latency,
+                    args.jitter, args.failure_rate, args.failure_modes, args.seed,
+                    args.capacity)
+    try:
+        asyncio.run(mock.serve(port=args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
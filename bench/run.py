@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Timed benchmark scenarios for config-tool.py, config-differ.py,
+the normalization engine and confgrabber.py.
+
+A synthetic corpus is generated (or an existing one is used), every
+scenario is run --repeat times as a separate process, as a user would
+run it, and the timings are written as JSON so runs can be compared
+over time.
+
+Usage:
+    ./bench/run.py --devices 1000 --repeat 3 --output bench.json
+    ./bench/run.py --scenarios grab --devices 10000 --latency 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+sys.path.insert(0, ROOT)
+
+from gencorpus import write_corpus  # noqa: E402
+from mockeapi import host_list  # noqa: E402
+
+SCENARIOS = [
+    "normalize",
+    "tool-common",
+    "tool-specific",
+    "differ-common",
+    "differ-diffs",
+    "grab",
+]
+
+
+def free_port() -> int:
+    """A free TCP port on the loopback interface."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_port(port: int, timeout: float = 10) -> None:
+    """Wait until something listens on a loopback port."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), 1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def run_script(args: List[str]) -> Dict:
+    """Run one of the scripts, output discarded.
+
+    Returns:
+        Dict with the wall time in seconds and the output line count
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable] + args, cwd=ROOT, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, env=dict(os.environ, PYTHONHASHSEED="0"),
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr.decode()}")
+    return {
+        "seconds": seconds,
+        "output_lines": result.stdout.count(b"\n"),
+        "stdout": result.stdout,
+    }
+
+
+def normalize(corpus: str) -> Dict:
+    """Normalize and split every config of the corpus, in process."""
+    from confparse import Normalizer
+
+    normalizer = Normalizer()
+    start = time.perf_counter()
+    stanzas = 0
+    for name in sorted(os.listdir(corpus)):
+        stanzas += sum(1 for _ in normalizer.file_stanzas(os.path.join(corpus, name)))
+    return {"seconds": time.perf_counter() - start, "stanzas": stanzas}
+
+
+def grab(corpus: str, devices: int, args: argparse.Namespace) -> Dict:
+    """Fetch the corpus from the mock eAPI server with confgrabber.py."""
+    port = free_port()
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH, "mockeapi.py"), "--port", str(port),
+         "--corpus", corpus, "--latency", str(args.latency),
+         "--jitter", str(args.jitter), "--failure-rate", str(args.failure_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_port(port)
+        with tempfile.TemporaryDirectory() as out:
+            hosts = os.path.join(out, ".switches")
+            with open(hosts, "w") as writer:
+                writer.write("\n".join(host_list(devices, port)) + "\n")
+            result = run_script([
+                "confgrabber.py", "-u", "bench", "-p", "bench", "-f", hosts,
+                "-d", os.path.join(out, "configs"), "--transport", "http",
+                "-c", str(args.concurrency),
+            ])
+    finally:
+        mock.terminate()
+        mock.wait()
+    result["failed"] = result["stdout"].count(b"Failed to download")
+    return result
+
+
+def scenario(name: str, corpus: str, files: List[str], args: argparse.Namespace) -> Callable[[], Dict]:
+    """Function running one repetition of a scenario."""
+    if name == "normalize":
+        return lambda: normalize(corpus)
+    if name == "tool-common":
+        return lambda: run_script(["config-tool.py", "-d", corpus, "-j", str(args.jobs)])
+    if name == "tool-specific":
+        return lambda: run_script(["config-tool.py", "-d", corpus, "-a", "specific",
+                                   "-j", str(args.jobs)])
+    if name == "differ-common":
+        return lambda: run_script(["config-differ.py", "-t", "common", "-f"] + files[:2])
+    if name == "differ-diffs":
+        return lambda: run_script(["config-differ.py", "-t", "diffs", "-f"] + files[:2])
+    if name == "grab":
+        return lambda: grab(corpus, len(files), args)
+    raise ValueError(name)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None,
+                        help="existing corpus directory, generated in a temporary directory if omitted")
+    parser.add_argument("-n", "--devices", type=int, default=200,
+                        help="devices of the generated corpus")
+    parser.add_argument("-s", "--stanzas", type=int, default=200,
+                        help="stanzas per generated config")
+    parser.add_argument("-v", "--variability", type=float, default=0.1,
+                        help="variability of the generated configs")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="corpus seed")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="repetitions of each scenario")
+    parser.add_argument("--scenarios", type=str, nargs="+", default=SCENARIOS,
+                        choices=SCENARIOS, help="scenarios to run")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="--jobs given to config-tool.py")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="grab: seconds each mock eAPI request waits")
+    parser.add_argument("--jitter", type=float, default=0.05,
+                        help="grab: maximum random seconds added to the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="grab: probability that a mock eAPI request fails")
+    parser.add_argument("-c", "--concurrency", type=int, default=1000,
+                        help="grab: --concurrency given to confgrabber.py")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="JSON file to write the results to, printed if omitted")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = os.path.join(tmp, "corpus")
+            write_corpus(corpus, args.devices, args.stanzas, args.variability, args.seed)
+        files = sorted(
+            os.path.join(corpus, name) for name in os.listdir(corpus)
+            if not name.startswith(".")
+        )
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "corpus": {
+                "directory": args.corpus,
+                "devices": len(files),
+                "bytes": sum(os.path.getsize(path) for path in files),
+                "stanzas": args.stanzas,
+                "variability": args.variability,
+                "seed": args.seed,
+            },
+            "scenarios": {},
+        }
+        for name in args.scenarios:
+            run = scenario(name, corpus, files, args)
+            runs = []
+            for _ in range(args.repeat):
+                result = run()
+                result.pop("stdout", None)
+                runs.append(result)
+            seconds = [result["seconds"] for result in runs]
+            report["scenarios"][name] = {
+                "min": min(seconds),
+                "median": statistics.median(seconds),
+                "max": max(seconds),
+                "runs": runs,
+            }
+            print(f"{name}: {min(seconds):.3f}s min, "
+                  f"{statistics.median(seconds):.3f}s median", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as writer:
+            json.dump(report, writer, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confcache.py
+#
+"""DESCRIPTION
+Persistent parse cache for config-tool.py and config-differ.py
+
+A SQLite file keeps the comments and stanza hashes of every parsed
+config, and the text of every stanza once.  Entries are keyed by
+path and checked against the size and mtime of the file, then its
+content hash, so only the configs that changed are parsed again.
+Every entry is invalidated when the normalization rules (the source
+of confparse.py) or the mask change.
+"""
+
+import json
+import os
+import sqlite3
+from array import array
+from hashlib import blake2b
+
+import confparse
+from confmetrics import metrics
+
+
+def signed_hash(h):
+    """64 bit stanza hash as a SQLite integer"""
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+def unsigned_hash(h):
+    """SQLite integer back to a 64 bit stanza hash, see signed_hash()"""
+    return h + (1 << 64) if h < 0 else h
+
+
+def rules_digest(mask=""):
+    """digest of the normalization rules and mask in use
+
+    Args:
+        mask (string): mask given to the Normalizer
+
+    Returns:
+        string: hex digest
+    """
+    with open(confparse.__file__, "rb") as source:
+        digest = blake2b(source.read(), digest_size=16)
+    digest.update(mask.encode())
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """content hash of a file
+
+    Args:
+        path (string): path of the file
+
+    Returns:
+        bytes: digest
+    """
+    digest = blake2b(digest_size=16)
+    with open(path, "rb") as current_file:
+        for chunk in iter(lambda: current_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class ParseCache:
+    """SQLite cache of parsed config files
+
+    Args:
+        path (string): path of the SQLite file, created if needed
+        mask (string): mask given to the Normalizer
+    """
+
+    def __init__(self, path, mask=""):
+        self.rules = rules_digest(mask)
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "digest BLOB, rules TEXT, comments TEXT, hashes BLOB)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS stanzas ("
+            "hash INTEGER PRIMARY KEY, text TEXT)"
+        )
+        self.db.commit()
+
+    def get(self, path):
+        """parsed config file, if it is cached and did not change
+
+        Args:
+            path (string): config file
+
+        Returns:
+            tuple: (comments, array of stanza hashes) or None
+        """
+        key = os.path.abspath(path)
+        row = self.db.execute(
+            "SELECT size, mtime_ns, digest, rules, comments, hashes "
+            "FROM files WHERE path = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            metrics.count("cache.misses")
+            return None
+        size, mtime_ns, digest, rules, comments, blob = row
+        if rules != self.rules:
+            metrics.count("cache.misses")
+            return None
+        stat = os.stat(path)
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            # touched, but maybe not changed
+            if file_digest(path) != digest:
+                metrics.count("cache.misses")
+                return None
+            self.db.execute(
+                "UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                (stat.st_size, stat.st_mtime_ns, key),
+            )
+            self.db.commit()
+        metrics.count("cache.hits")
+        hashes = array("Q")
+        hashes.frombytes(blob)
+        return json.loads(comments), hashes
+
+    def stamp(self, path):
+        """size, modification time and digest of a config file, taken
+        before it is parsed and given back to put()
+
+        Args:
+            path (string): config file
+
+        Returns:
+            tuple: (size, mtime_ns, digest)
+        """
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns, file_digest(path)
+
+    def put(self, path, stamp, comments, hashes, texts):
+        """store a parsed config file
+
+        Nothing is stored if the file was modified since its stamp was
+        taken, the hashes may be of neither version
+
+        Args:
+            path (string): config file
+            stamp (tuple): see stamp(), taken before parsing it
+            comments (list): its '!!' comments
+            hashes (array): its stanza hashes, in file order
+            texts (dict): stanza hash to text, for all its stanzas
+        """
+        size, mtime_ns, digest = stamp
+        stat = os.stat(path)
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            metrics.count("cache.changed")
+            return
+        self.db.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                os.path.abspath(path),
+                size,
+                mtime_ns,
+                digest,
+                self.rules,
+                json.dumps(comments),
+                hashes.tobytes(),
+            ),
+        )
+        self.db.executemany(
+            "INSERT OR IGNORE INTO stanzas VALUES (?, ?)",
+            ((signed_hash(h), text) for h, text in texts.items()),
+        )
+        self.db.commit()
+
+    def texts(self, hashes):
+        """text of cached stanzas
+
+        Args:
+            hashes (iterable): stanza hashes
+
+        Returns:
+            dict: stanza hash to text, for the stanzas in the cache
+        """
+        hashes = [signed_hash(h) for h in set(hashes)]
+        texts = {}
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            for h, text in self.db.execute(
+                "SELECT hash, text FROM stanzas WHERE hash IN ({})".format(
+                    ",".join("?" * len(chunk))
+                ),
+                chunk,
+            ):
+                texts[unsigned_hash(h)] = text
+        return texts
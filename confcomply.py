@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confcomply.py
+#
+"""DESCRIPTION
+Golden config compliance for config-differ.py
+
+The golden config is parsed once, its stanzas are sent to the worker
+processes when they start.  Each device config is then normalized in
+a worker and only its differences come back: the golden stanzas it
+lacks, the stanzas it has that are not in the golden config, and the
+lines of those stanzas that the other side does not have, stanzas
+with the same first line compared with each other.  Devices of a
+dictionary encoded corpus are compared by stanza hash without any
+parsing, only the stanzas that differ are decoded.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from confindex import bounded_map
+from confparse import Normalizer, stanza_hash
+from confsimilar import stanza_lines
+
+
+# normalizer and golden config of a worker process,
+# set up once by _init_worker
+_normalizer = None
+_golden = None
+
+
+def _init_worker(mask, golden):
+    global _normalizer, _golden
+    _normalizer = Normalizer(mask)
+    _golden = golden
+
+
+def _head(text):
+    """first line of a stanza, the context of its other lines"""
+    lines = stanza_lines(text)
+    return lines[0] if lines else ""
+
+
+def _keyed(stanzas, paired):
+    """lines of stanzas keyed by their first line if the other side
+    has a stanza with the same first line, by None otherwise"""
+    keyed = set()
+    for text in stanzas:
+        head = _head(text)
+        key = head if head in paired else None
+        keyed.update((key, line) for line in stanza_lines(text))
+    return keyed
+
+
+def _lines(stanzas, others, paired):
+    """(first line, line) of the lines of the stanzas the other side
+    does not have
+
+    A stanza is compared with the stanzas of the other side with the
+    same first line, e.g. the same interface, or with all the stanzas
+    of the other side without such a pair.
+
+    Args:
+        stanzas (list): stanza texts
+        others (set): lines of the other side, see _keyed()
+        paired (set): first lines found on both sides
+    """
+    found = []
+    seen = set()
+    for text in stanzas:
+        head = _head(text)
+        key = head if head in paired else None
+        for line in stanza_lines(text):
+            if (key, line) not in others and (head, line) not in seen:
+                seen.add((head, line))
+                found.append((head, line))
+    return found
+
+
+def _compare(device, stanzas):
+    """differences of the stanzas of a device with the golden config
+
+    Returns:
+        tuple: (device, missing stanzas, extra stanzas, missing lines,
+            extra lines), lines as (first line of their stanza, line)
+    """
+    texts = {}
+    for stanza in stanzas:
+        if stanza and not stanza.isspace():
+            texts[stanza_hash(stanza)] = stanza
+    missing = [text for h, text in _golden.items() if h not in texts]
+    extra = [text for h, text in texts.items() if h not in _golden]
+    return _differences(device, missing, extra)
+
+
+def _differences(device, missing, extra):
+    """differences of a device from its missing and extra stanzas,
+    see _compare()"""
+    # stanzas with the same first line on both sides are diffed as pairs
+    paired = {_head(text) for text in missing}
+    paired &= {_head(text) for text in extra}
+    return (
+        device,
+        missing,
+        extra,
+        _lines(missing, _keyed(extra, paired), paired),
+        _lines(extra, _keyed(missing, paired), paired),
+    )
+
+
+def _check_file(path):
+    """compare one config file with the golden config"""
+    return _compare(path, _normalizer.file_stanzas(path))
+
+
+def _check_config(config):
+    """compare a (device name, config text) tuple with the golden config"""
+    name, text = config
+    return _compare(name, _normalizer.text_stanzas(text))
+
+
+class Golden:
+    """golden config that device configs are checked against
+
+    Args:
+        path (string): golden config file
+        mask (string): optional string to ignore, see Normalizer
+
+    Attributes:
+        stanzas (dict): stanza hash to text, in file order
+    """
+
+    def __init__(self, path, mask=""):
+        self.mask = mask
+        self.stanzas = {}
+        for stanza in Normalizer(mask).file_stanzas(path):
+            if stanza and not stanza.isspace():
+                self.stanzas[stanza_hash(stanza)] = stanza
+
+    def _map(self, jobs, func, *iterables):
+        if jobs > 1:
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=_init_worker,
+                initargs=(self.mask, self.stanzas),
+            ) as executor:
+                # a few configs per worker in flight, the input is
+                # only read as the results come back
+                yield from bounded_map(
+                    executor, func, *iterables, window=2 * jobs
+                )
+        else:
+            _init_worker(self.mask, self.stanzas)
+            yield from map(func, *iterables)
+
+    def check_files(self, paths, jobs=1):
+        """compare config files with the golden config, in a process
+        pool if jobs > 1
+
+        Args:
+            paths (list): config files
+            jobs (int): number of worker processes
+
+        Yields:
+            tuple: differences of each file, in order, see _compare()
+        """
+        return self._map(jobs, _check_file, paths)
+
+    def check_texts(self, configs, jobs=1):
+        """compare configs held in memory with the golden config
+
+        Args:
+            configs (iterable): (device name, config text) tuples
+            jobs (int): number of worker processes
+
+        Yields:
+            tuple: differences of each config, in order, see _compare()
+        """
+        return self._map(jobs, _check_config, configs)
+
+    def check_corpus(self, corpus, devices=None):
+        """compare the devices of a dictionary encoded corpus with the
+        golden config
+
+        Args:
+            corpus (Corpus): corpus, normalized with the same mask
+            devices (list): device names, every device if None
+
+        Yields:
+            tuple: differences of each device, in order, see _compare()
+
+        Raises:
+            ValueError: the corpus was normalized with another mask
+        """
+        if corpus.mask != self.mask:
+            raise ValueError(
+                f"the corpus was written with the mask '{corpus.mask}'"
+            )
+        golden = np.fromiter(self.stanzas, dtype=np.uint64, count=len(self.stanzas))
+        texts = list(self.stanzas.values())
+        numbers = {name: n for n, name in enumerate(corpus.devices)}
+        return self._check_corpus(corpus, golden, texts, numbers, devices)
+
+    def _check_corpus(self, corpus, golden, texts, numbers, devices):
+        for device in corpus.devices if devices is None else devices:
+            ids = corpus.device_stanza_ids(numbers[device])
+            # distinct stanzas, in the order they first appear
+            ids, first = np.unique(ids, return_index=True)
+            ids = ids[np.argsort(first)]
+            hashes = corpus.stanza_hashes[ids]
+            missing = np.flatnonzero(~np.isin(golden, hashes))
+            extra = [
+                corpus.stanza(i) for i in ids[~np.isin(hashes, golden)].tolist()
+            ]
+            yield _differences(
+                device,
+                [texts[i] for i in missing],
+                [text for text in extra if text and not text.isspace()],
+            )
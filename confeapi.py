@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+"""asyncio eAPI client
+
+JSON-RPC over keep-alive HTTP/1.1 connections to /command-api,
+pooled per host so retries and follow-up commands to a device reuse
+the same TLS session.
+"""
+
+import asyncio
+import base64
+import itertools
+import json
+import ssl
+import time
+from typing import Dict, List, Optional, Tuple
+
+from confmetrics import metrics
+
+
+class EapiError(Exception):
+    """Error returned by eAPI, or an unusable HTTP response.
+
+    Attributes:
+        code: JSON-RPC error code, or HTTP status code
+        data: JSON-RPC error data, per command results and errors
+    """
+
+    def __init__(self, message: str, code: Optional[int] = None, data=None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+def unverified_ssl_context() -> ssl.SSLContext:
+    """SSL context that does not verify the device certificates."""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def split_host(host: str, default_port: int) -> Tuple[str, int]:
+    """Split an optional ':port' off a host.
+
+    IPv6 addresses take a port in brackets, '[2001:db8::1]:8443', a
+    bare IPv6 address has no port.
+
+    Args:
+        host: hostname, IPv4 or IPv6 address, optionally with a port
+        default_port: port used when there is none
+
+    Returns:
+        Tuple of (host, port)
+    """
+    if host.startswith("["):
+        name, _, rest = host[1:].partition("]")
+        if rest.startswith(":"):
+            return name, int(rest[1:])
+        return name, default_port
+    if host.count(":") == 1:
+        name, port = host.split(":")
+        return name, int(port)
+    return host, default_port
+
+
+class EapiConnection:
+    """One keep-alive HTTP/1.1 connection to a device."""
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.keep_alive = True
+
+    @classmethod
+    async def open(cls, host: str, port: int,
+                   ssl_context: Optional[ssl.SSLContext]) -> "EapiConnection":
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl_context
+        )
+        return cls(reader, writer)
+
+    async def post(self, request: bytes) -> Tuple[int, bytes]:
+        """Send a request and read the response.
+
+        Args:
+            request: complete HTTP request
+
+        Returns:
+            Tuple of (status code, body)
+
+        Raises:
+            ConnectionError: the device closed the connection, before
+                or in the middle of the response
+            EapiError: the response is not valid HTTP
+        """
+        self.writer.write(request)
+        await self.writer.drain()
+        try:
+            return await self._response()
+        except asyncio.IncompleteReadError as e:
+            self.keep_alive = False
+            raise ConnectionError(
+                f"connection closed by device after {len(e.partial)} bytes"
+            ) from e
+        except (ValueError, IndexError) as e:
+            self.keep_alive = False
+            raise EapiError(f"malformed HTTP response: {e}") from e
+
+    async def _response(self) -> Tuple[int, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by device")
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # trailers end with an empty line
+                    while (await self.reader.readline()) not in (
+                        b"\r\n", b"\n", b""
+                    ):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(
+                int(headers["content-length"])
+            )
+        else:
+            body = await self.reader.read()
+            self.keep_alive = False
+
+        if headers.get("connection", "").lower() == "close":
+            self.keep_alive = False
+        return status, body
+
+    def close(self) -> None:
+        self.keep_alive = False
+        self.writer.close()
+
+
+class EapiPool:
+    """Pool of keep-alive eAPI connections, per host.
+
+    Args:
+        user: Username
+        passwd: Password
+        transport: 'https', or 'http' e.g. for a local mock server
+        timeout: Seconds allowed for one request, connecting included
+    """
+
+    def __init__(self, user: str, passwd: str, transport: str = "https",
+                 timeout: float = 30):
+        self.transport = transport
+        self.timeout = timeout
+        self.ssl_context = (
+            unverified_ssl_context() if transport == "https" else None
+        )
+        self.default_port = 443 if transport == "https" else 80
+        token = base64.b64encode(f"{user}:{passwd}".encode()).decode()
+        self.authorization = f"Basic {token}"
+        self.idle: Dict[str, List[EapiConnection]] = {}
+        self.request_ids = itertools.count(1)
+
+    async def acquire(self, host: str) -> EapiConnection:
+        """Idle connection to a host, or a new one."""
+        idle = self.idle.get(host)
+        if idle:
+            return idle.pop()
+        name, port = split_host(host, self.default_port)
+        start = time.perf_counter()
+        connection = await EapiConnection.open(name, port, self.ssl_context)
+        # TCP connect and TLS handshake
+        metrics.observe("eapi.connect_seconds", time.perf_counter() - start)
+        return connection
+
+    def release(self, host: str, connection: EapiConnection) -> None:
+        """Give a connection back to the pool, if it is still usable."""
+        if connection.keep_alive:
+            self.idle.setdefault(host, []).append(connection)
+        else:
+            connection.close()
+
+    def discard(self, host: str) -> None:
+        """Close the idle connections to a host, e.g. once its device
+        is done, so open sockets follow the devices in flight."""
+        for connection in self.idle.pop(host, []):
+            connection.close()
+
+    def _request(self, host: str, payload: dict) -> bytes:
+        body = json.dumps(payload).encode()
+        head = (
+            f"POST /command-api HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            f"Authorization: {self.authorization}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        )
+        return head.encode() + body
+
+    async def run_cmds(self, host: str, cmds: list, format: str = "text",
+                       version: int = 1) -> list:
+        """Run commands on a device with one runCmds call.
+
+        Args:
+            host: Device hostname, optionally followed by ':port'
+            cmds: Commands, as eAPI accepts them
+            format: 'text' or 'json'
+            version: eAPI version of the JSON output
+
+        Returns:
+            List of the results of the commands
+
+        Raises:
+            EapiError: eAPI error, or an invalid HTTP or JSON-RPC
+                response
+            asyncio.TimeoutError: the request took more than timeout
+            OSError: the device could not be reached, or closed the
+                connection before the end of the response
+        """
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "runCmds",
+            "params": {"version": version, "cmds": cmds, "format": format},
+            "id": next(self.request_ids),
+        }
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(
+                self._run(host, self._request(host, payload)), self.timeout
+            )
+        finally:
+            metrics.observe("eapi.request_seconds", time.perf_counter() - start)
+
+    async def _run(self, host: str, request: bytes) -> list:
+        reused = bool(self.idle.get(host))
+        connection = await self.acquire(host)
+        try:
+            status, body = await connection.post(request)
+        except ConnectionError:
+            connection.close()
+            if not reused:
+                raise
+            # the device closed the idle connection, try a fresh one
+            metrics.count("eapi.stale_connections")
+            connection = await self.acquire(host)
+            try:
+                status, body = await connection.post(request)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+        self.release(host, connection)
+
+        if status != 200:
+            raise EapiError(f"HTTP {status} from {host}", code=status)
+        try:
+            response = json.loads(body)
+        except ValueError as e:
+            raise EapiError(f"invalid JSON-RPC response from {host}: {e}") from e
+        if "error" in response:
+            error = response["error"]
+            raise EapiError(
+                error.get("message", "eAPI error"),
+                code=error.get("code"),
+                data=error.get("data"),
+            )
+        return response["result"]
+
+    async def close(self) -> None:
+        """Close every idle connection."""
+        for connections in self.idle.values():
+            for connection in connections:
+                connection.close()
+        self.idle.clear()
@@ -3,13 +3,211 @@
 from jsonrpclib import Server
 import ssl
 import argparse
+import asyncio
+import contextlib
+import errno
+import json
 import os
+import re
+import resource
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import ping3
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import time
 from functools import partial
+from hashlib import blake2b
+
+import confmetrics
+from confeapi import EapiError, EapiPool, split_host
+from confindex import StanzaIndex
+from confmetrics import metrics
+from confreport import print_comments, print_counts
+from confsched import Scheduler, read_inventory
+from confstore import ConfigStore
+
+STATE_FILE = ".confgrabber.json"
+# file descriptors kept free of the sweep, for the output files,
+# the parse workers and the event loop
+FD_HEADROOM = 64
+# errors of this host running out of sockets, not of the device
+LOCAL_ERRNOS = (errno.EMFILE, errno.ENFILE, errno.ENOBUFS)
+
+def write_config(output_file: str, config: str) -> bool:
+    """Write a config atomically, only if its content changed.
+
+    The config goes to a hidden temporary file in one buffered write
+    and is renamed over the output file, so readers never see a
+    partial config and unchanged files keep their mtime.
+
+    Args:
+        output_file: Path of the config file
+        config: Config text
+
+    Returns:
+        True if the file was written, False if it was unchanged
+    """
+    data = config.encode("utf-8")
+    if os.path.exists(output_file):
+        with open(output_file, "rb") as current_file:
+            if blake2b(current_file.read()).digest() == blake2b(data).digest():
+                return False
+    directory, name = os.path.split(output_file)
+    tmp_file = os.path.join(directory, f".{name}.tmp")
+    with open(tmp_file, "wb") as writer:
+        writer.write(data)
+    os.replace(tmp_file, output_file)
+    return True
+
+def command_results(commands: List[str], results: list) -> Tuple[dict, dict]:
+    """Outputs of the extra commands of a runCmds call.
+
+    Commands ending with '| json' are run in text format like the
+    others, EOS prints their output as JSON, which is parsed.
+
+    Args:
+        commands: Extra commands
+        results: Their results, in the same order
+
+    Returns:
+        Tuple of (dict of command to output, dict of command to error)
+    """
+    outputs = {}
+    errors = {}
+    for command, result in zip(commands, results):
+        if "errors" in result:
+            errors[command] = "; ".join(result["errors"])
+        elif command.endswith("| json"):
+            try:
+                outputs[command] = json.loads(result["output"])
+            except ValueError as e:
+                errors[command] = f"invalid JSON output: {e}"
+        else:
+            outputs[command] = result["output"]
+    return outputs, errors
+
+def write_command_outputs(directory: str, hostname: str, outputs: dict,
+                          errors: dict, layout: str = "json") -> None:
+    """Write the outputs of the extra commands of a device.
+
+    Files are only rewritten when their content changed, see
+    write_config().
+
+    Args:
+        directory: Directory of the command outputs
+        hostname: Device hostname
+        outputs: Dict of command to output, see command_results()
+        errors: Dict of command to error message
+        layout: 'json' for one hostname.json document per device,
+            'files' for one file per command in a hostname directory
+    """
+    if layout == "json":
+        document = {"hostname": hostname, "commands": outputs, "errors": errors}
+        write_config(os.path.join(directory, f"{hostname}.json"),
+                     json.dumps(document, indent=2) + "\n")
+        return
+    device_directory = os.path.join(directory, hostname)
+    os.makedirs(device_directory, exist_ok=True)
+    for command, output in outputs.items():
+        name = re.sub(r"[^\w.-]+", "_", command.strip()).strip("_")
+        if isinstance(output, str):
+            write_config(os.path.join(device_directory, f"{name}.txt"), output)
+        else:
+            write_config(os.path.join(device_directory, f"{name}.json"),
+                         json.dumps(output, indent=2) + "\n")
+    errors_file = os.path.join(device_directory, "errors.json")
+    if errors:
+        write_config(errors_file, json.dumps(errors, indent=2) + "\n")
+    elif os.path.exists(errors_file):
+        os.remove(errors_file)
+
+async def run_batch(pool: EapiPool, hostname: str, cmds: List[str],
+                    required: int) -> list:
+    """Run commands in one runCmds call.
+
+    EOS stops at the first command that fails. When it is not one of
+    the required first commands, their results are kept and the
+    commands that failed or were not run get an 'errors' result, so a
+    bad extra command does not cost the config.
+
+    Args:
+        pool: eAPI connection pool
+        hostname: Device hostname
+        cmds: Commands, the required ones first
+        required: Number of commands that must succeed
+
+    Returns:
+        List of the results of the commands
+
+    Raises:
+        EapiError: one of the required commands failed
+    """
+    try:
+        return await pool.run_cmds(hostname, cmds, format="text")
+    except EapiError as e:
+        data = e.data if isinstance(e.data, list) else None
+        if data is None or len(data) <= required or any("errors" in result for result in data[:required]):
+            raise
+        metrics.count("commands.failed")
+        return data + [{"errors": [f"not run: {e}"]}] * (len(cmds) - len(data))
+
+def load_fingerprints(directory: str, fingerprint_cmd: str, sanitized: bool) -> dict:
+    """Fingerprints of the devices from the last incremental run.
+
+    Args:
+        directory: Output directory, where the state file is kept
+        fingerprint_cmd: Command the fingerprints come from
+        sanitized: Whether the configs are sanitized
+
+    Returns:
+        Dict of hostname to fingerprint, empty if the last run used
+        another command or config type
+    """
+    try:
+        with open(os.path.join(directory, STATE_FILE), "r") as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+    if (state.get("fingerprint_cmd"), state.get("sanitized")) != (fingerprint_cmd, sanitized):
+        return {}
+    return state.get("fingerprints", {})
+
+def save_fingerprints(directory: str, fingerprint_cmd: str, sanitized: bool,
+                      fingerprints: dict) -> None:
+    """Store the fingerprints for the next incremental run."""
+    state = {
+        "fingerprint_cmd": fingerprint_cmd,
+        "sanitized": sanitized,
+        "fingerprints": fingerprints,
+    }
+    write_config(os.path.join(directory, STATE_FILE), json.dumps(state, indent=1))
+
+def run_extra_commands(device: Server, commands: List[str]) -> list:
+    """Run the extra commands of the threads engine, after the config.
+
+    jsonrpclib drops the partial results of a failed runCmds call, so
+    when the batch fails each command is run on its own, and the
+    commands that fail get an 'errors' result, as with run_batch().
+
+    Args:
+        device: jsonrpclib server of the device
+        commands: Extra commands
+
+    Returns:
+        List of the results of the commands
+    """
+    try:
+        return device.runCmds(version=1, cmds=["enable"] + commands, format="text")[1:]
+    except Exception:
+        pass
+    results = []
+    for command in commands:
+        try:
+            results.append(device.runCmds(version=1, cmds=["enable", command], format="text")[1])
+        except Exception as e:
+            metrics.count("commands.failed")
+            results.append({"errors": [str(e)]})
+    return results
 
 def check_device_availability(hostname: str, timeout: int = 2) -> Tuple[str, bool]:
     """Check if a device is available via ping.
@@ -22,13 +220,18 @@ def check_device_availability(hostname: str, timeout: int = 2) -> Tuple[str, boo
         Tuple of (hostname, is_available)
     """
     try:
+        start = time.perf_counter()
         ping_result = ping3.ping(hostname.strip(), timeout=timeout, unit='ms')
+        metrics.observe("ping_seconds", time.perf_counter() - start)
         return hostname.strip(), ping_result is not None
     except Exception:
         return hostname.strip(), False
 
 def grab_single_config(hostname: str, user: str, passwd: str, directory: str, 
-                      sanitized: bool, max_retries: int = 3) -> Tuple[str, bool, str]:
+                      sanitized: bool, max_retries: int = 3,
+                      commands: Optional[List[str]] = None,
+                      commands_dir: str = "",
+                      commands_layout: str = "json") -> Tuple[str, bool, str]:
     """Download configuration from a single EOS device using jsonrpc.
     
     Args:
@@ -38,6 +241,9 @@ def grab_single_config(hostname: str, user: str, passwd: str, directory: str,
         directory: Output directory
         sanitized: Whether to get sanitized config
         max_retries: Maximum number of retry attempts
+        commands: Extra commands, run once the config is saved
+        commands_dir: Directory of the extra command outputs
+        commands_layout: 'json' or 'files', see write_command_outputs()
         
     Returns:
         Tuple of (hostname, success, error_message)
@@ -52,6 +258,7 @@ def grab_single_config(hostname: str, user: str, passwd: str, directory: str,
         return hostname, False, "Device does not respond to ping"
     
     # Implement retry logic
+    start = time.perf_counter()
     for attempt in range(max_retries):
         try:
             device = Server(f"https://{user}:{passwd}@{hostname}/command-api")
@@ -64,20 +271,31 @@ def grab_single_config(hostname: str, user: str, passwd: str, directory: str,
             
             # Write config to file
             output_file = os.path.join(directory, f"{hostname}.txt")
-            with open(output_file, mode="wt", encoding="utf-8") as writer:
-                for line in result[1]["output"]:
-                    writer.write(line)
+            write_config(output_file, result[1]["output"])
+            if commands:
+                # a bad extra command can't cost the config
+                outputs, errors = command_results(
+                    commands, run_extra_commands(device, list(commands)))
+                metrics.count("commands.collected", len(outputs))
+                write_command_outputs(commands_dir, hostname, outputs, errors,
+                                      layout=commands_layout)
+            metrics.observe("fetch_seconds", time.perf_counter() - start)
             return hostname, True, ""
             
         except Exception as e:
             if attempt == max_retries - 1:
                 return hostname, False, str(e)
+            metrics.count("retries")
+            metrics.count("backoff_seconds", 2 ** attempt)
             time.sleep(2 ** attempt)  # Exponential backoff
     
     return hostname, False, "Max retries exceeded"
 
 def grab_configs(hostnames: List[str], user: str, passwd: str, 
-                directory: str, sanitized: bool, max_workers: int = None) -> None:
+                directory: str, sanitized: bool, max_workers: int = None,
+                commands: Optional[List[str]] = None,
+                commands_dir: str = "",
+                commands_layout: str = "json") -> None:
     """Download configurations from multiple EOS devices in parallel.
     
     Args:
@@ -87,18 +305,27 @@ def grab_configs(hostnames: List[str], user: str, passwd: str,
         directory: Output directory
         sanitized: Whether to get sanitized config
         max_workers: Maximum number of worker threads
+        commands: Extra commands, run once each config is saved
+        commands_dir: Directory of the extra command outputs
+        commands_layout: 'json' or 'files', see write_command_outputs()
     """
     if not os.path.exists(directory):
         os.makedirs(directory)
+    if commands and not os.path.exists(commands_dir):
+        os.makedirs(commands_dir)
     
     # Create a partial function with fixed arguments
     grab_func = partial(grab_single_config, 
                        user=user, 
                        passwd=passwd, 
                        directory=directory, 
-                       sanitized=sanitized)
+                       sanitized=sanitized,
+                       commands=commands,
+                       commands_dir=commands_dir,
+                       commands_layout=commands_layout)
     
     # Use ThreadPoolExecutor for parallel processing
+    metrics.begin("fetch")
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Submit all tasks
         future_to_host = {executor.submit(grab_func, host): host for host in hostnames}
@@ -108,12 +335,341 @@ def grab_configs(hostnames: List[str], user: str, passwd: str,
             hostname = future_to_host[future]
             try:
                 host, success, error = future.result()
+                metrics.count("devices.fetched" if success else "devices.failed")
                 if success:
                     print(f"Successfully downloaded config from {host}")
                 else:
                     print(f"Failed to download config from {host}: {error}")
             except Exception as e:
                 print(f"Error processing {hostname}: {str(e)}")
+    metrics.end()
+
+def fd_limited(concurrency: int, per_task: int = 1) -> int:
+    """Cap a number of tasks in flight below the open file limit.
+
+    Args:
+        concurrency: Tasks in flight asked for
+        per_task: File descriptors each task holds at once
+
+    Returns:
+        Tasks in flight that fit in the limit, at least one
+    """
+    soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft_limit == resource.RLIM_INFINITY:
+        return concurrency
+    return max(1, min(concurrency, (soft_limit - FD_HEADROOM) // per_task))
+
+async def probe_device(hostname: str, port: int, timeout: float) -> Tuple[str, bool]:
+    """Check if a device accepts TCP connections on its eAPI port.
+
+    Unlike ping this needs no raw-socket privileges.
+
+    Args:
+        hostname: Device hostname, optionally followed by ':port'
+        port: eAPI port used when the hostname has none
+        timeout: Connect timeout in seconds
+
+    Returns:
+        Tuple of (hostname, is_available)
+
+    Raises:
+        OSError: This host is out of file descriptors or buffers, the
+            device was not probed
+    """
+    name, port = split_host(hostname, port)
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(name, port), timeout
+        )
+    except OSError as e:
+        if e.errno in LOCAL_ERRNOS:
+            raise
+        return hostname, False
+    except asyncio.TimeoutError:
+        return hostname, False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return hostname, True
+
+async def sweep_devices(hostnames: List[str], port: int, timeout: float = 2,
+                        concurrency: int = 1000) -> Tuple[List[str], List[str]]:
+    """Probe every device concurrently before any config is fetched.
+
+    The probes in flight are capped below the open file limit. A probe
+    that fails for lack of local resources is tried again rather than
+    taken as an unreachable device.
+
+    Args:
+        hostnames: List of hostnames
+        port: eAPI port used when a hostname has none
+        timeout: Connect timeout in seconds
+        concurrency: Maximum number of probes in flight
+
+    Returns:
+        Tuple of (reachable hostnames, unreachable hostnames)
+    """
+    semaphore = asyncio.Semaphore(fd_limited(concurrency))
+
+    async def probe(hostname: str) -> Tuple[str, bool]:
+        async with semaphore:
+            for attempt in range(5):
+                try:
+                    return await probe_device(hostname, port, timeout)
+                except OSError as e:
+                    if e.errno not in LOCAL_ERRNOS or attempt == 4:
+                        raise
+                    metrics.count("sweep.local_errors")
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+
+    results = await asyncio.gather(*(probe(host) for host in hostnames))
+    reachable = [host for host, available in results if available]
+    unreachable = [host for host, available in results if not available]
+    return reachable, unreachable
+
+async def grab_single_config_async(pool: EapiPool, hostname: str,
+                                   directory: str, sanitized: bool,
+                                   max_retries: int = 3,
+                                   fingerprint_cmd: Optional[str] = None,
+                                   fingerprints: Optional[dict] = None,
+                                   write: bool = True,
+                                   queue: Optional[asyncio.Queue] = None,
+                                   store: Optional[ConfigStore] = None,
+                                   snapshot: str = "",
+                                   scheduler: Optional[Scheduler] = None,
+                                   commands: Optional[List[str]] = None,
+                                   commands_dir: str = "",
+                                   commands_layout: str = "json") -> Tuple[str, bool, str]:
+    """Download configuration from a single EOS device over a pooled connection.
+
+    Retries wait without holding a connection, a thread or a slot of
+    the scheduler. With a fingerprint command, the device is first
+    asked for the output of that command and the config is only
+    fetched if it changed since the fingerprint stored in
+    fingerprints, which is updated. With a queue, the config is also
+    put on it for analysis as soon as it is fetched, waiting if the
+    analysis is behind. With a store, the config is also added to the
+    snapshot of the store. Extra commands are run in the same runCmds
+    call as the fingerprint command, or else as the config, and their
+    outputs written to commands_dir.
+
+    Args:
+        pool: eAPI connection pool
+        hostname: Device hostname
+        directory: Output directory
+        sanitized: Whether to get sanitized config
+        max_retries: Maximum number of retry attempts
+        fingerprint_cmd: Cheap command whose output changes with the config
+        fingerprints: Dict of hostname to fingerprint of the last run
+        write: Whether to write the config to the output directory
+        queue: Optional queue of (hostname, config) tuples to analyze
+        store: Optional config store
+        snapshot: Snapshot of the store the config is added to
+        scheduler: Optional scheduler each attempt takes a slot of,
+            only while it talks to the device
+        commands: Extra commands, '| json' at the end for JSON output
+        commands_dir: Directory of the extra command outputs
+        commands_layout: 'json' or 'files', see write_command_outputs()
+
+    Returns:
+        Tuple of (hostname, success, error_message), on success the
+        message is 'skipped' or 'unchanged' if the file was not written
+    """
+    cmd = "show running-config sanitized" if sanitized else "show running-config"
+    output_file = os.path.join(directory, f"{hostname}.txt")
+    start = time.perf_counter()
+    commands = list(commands or [])
+    for attempt in range(max_retries):
+        config = None
+        try:
+            slot = scheduler.slot(hostname) if scheduler is not None else contextlib.nullcontext()
+            async with slot:
+                if fingerprint_cmd:
+                    result = await run_batch(pool, hostname, ["enable", fingerprint_cmd] + commands, 2)
+                    fingerprint = blake2b(result[1]["output"].encode(), digest_size=16).hexdigest()
+                    extra = result[2:]
+                if not (fingerprint_cmd and fingerprints.get(hostname) == fingerprint
+                        and os.path.exists(output_file)):
+                    result = await run_batch(
+                        pool, hostname, ["enable", cmd] + ([] if fingerprint_cmd else commands), 2
+                    )
+                    config = result[1]["output"]
+                    if not fingerprint_cmd:
+                        extra = result[2:]
+        except (EapiError, OSError, asyncio.TimeoutError) as e:
+            if attempt == max_retries - 1:
+                return hostname, False, str(e) or type(e).__name__
+            metrics.count("retries")
+            metrics.count(f"retries.{type(e).__name__}")
+            metrics.count("backoff_seconds", 2 ** attempt)
+            await asyncio.sleep(2 ** attempt)  # Exponential backoff
+            continue
+
+        if commands:
+            outputs, errors = command_results(commands, extra)
+            metrics.count("commands.collected", len(outputs))
+            write_command_outputs(commands_dir, hostname, outputs, errors, commands_layout)
+
+        if config is None:
+            # same fingerprint as the last run, the file is up to date
+            if store is not None:
+                with open(output_file, "rb") as current_file:
+                    store.put(snapshot, f"{hostname}.txt", current_file.read())
+            if queue is not None:
+                with open(output_file, "r") as current_file:
+                    await queue.put((hostname, current_file.read()))
+            return hostname, True, "skipped"
+
+        metrics.observe("fetch_seconds", time.perf_counter() - start)
+        metrics.count("fetch_bytes", len(config))
+
+        # Write config to file
+        written = write_config(output_file, config) if write else True
+        if store is not None:
+            store.put(snapshot, f"{hostname}.txt", config)
+        if queue is not None:
+            await queue.put((hostname, config))
+        if fingerprint_cmd:
+            fingerprints[hostname] = fingerprint
+        return hostname, True, "" if written else "unchanged"
+
+    return hostname, False, "Max retries exceeded"
+
+async def grab_configs_async(hostnames: List[str], user: str, passwd: str,
+                             directory: str, sanitized: bool,
+                             concurrency: int = 1000, timeout: float = 30,
+                             transport: str = "https",
+                             sweep_timeout: Optional[float] = 2,
+                             fingerprint_cmd: Optional[str] = None,
+                             index: Optional[StanzaIndex] = None,
+                             write: bool = True,
+                             store: Optional[ConfigStore] = None,
+                             snapshot: str = "",
+                             adaptive: bool = False,
+                             initial_concurrency: int = 16,
+                             sites: Optional[dict] = None,
+                             limits: Optional[dict] = None,
+                             commands: Optional[List[str]] = None,
+                             commands_dir: str = "",
+                             commands_layout: str = "json") -> None:
+    """Download configurations from multiple EOS devices with asyncio.
+
+    With an index, each config is analyzed as soon as it is fetched:
+    the downloads feed a bounded queue that the index consumes, so
+    parsing overlaps with the network instead of following it. The
+    devices in flight are scheduled by a Scheduler, a fixed number of
+    them or adjusted by AIMD, and capped per site or prefix.
+
+    Args:
+        hostnames: List of hostnames
+        user: Username
+        passwd: Password
+        directory: Output directory
+        sanitized: Whether to get sanitized config
+        concurrency: Maximum number of devices in flight
+        timeout: Seconds allowed for each eAPI request
+        transport: 'https', or 'http' for a local mock eAPI server
+        sweep_timeout: Connect timeout of the reachability sweep run
+            before fetching, None to fetch from every device
+        fingerprint_cmd: Cheap command whose output changes with the
+            config, devices whose output did not change since the last
+            run are not fetched again
+        index: Optional stanza index the configs are added to
+        write: Whether to write the configs to the output directory
+        store: Optional config store the configs are added to
+        snapshot: Snapshot of the store the configs are added to
+        adaptive: Whether to adjust the devices in flight by AIMD, up
+            to concurrency, from latency and errors
+        initial_concurrency: Devices in flight to start with, adaptive
+        sites: Dict of hostname to site, see read_inventory()
+        limits: Dict of site or IP prefix to maximum devices in flight
+        commands: Extra commands collected in the same runCmds call
+        commands_dir: Directory of the extra command outputs
+        commands_layout: 'json' or 'files', see write_command_outputs()
+    """
+    if write and not os.path.exists(directory):
+        os.makedirs(directory)
+    if commands and not os.path.exists(commands_dir):
+        os.makedirs(commands_dir)
+
+    if sweep_timeout is not None:
+        metrics.begin("sweep")
+        port = 443 if transport == "https" else 80
+        hostnames, unreachable = await sweep_devices(
+            hostnames, port, timeout=sweep_timeout, concurrency=concurrency
+        )
+        print(f"Reachability: {len(hostnames)} of "
+              f"{len(hostnames) + len(unreachable)} devices reachable")
+        for host in unreachable:
+            print(f"Unreachable: {host}")
+
+    fingerprints = {}
+    if fingerprint_cmd:
+        fingerprints = load_fingerprints(directory, fingerprint_cmd, sanitized)
+
+    pool = EapiPool(user, passwd, transport=transport, timeout=timeout)
+    # a socket and a file being written per device in flight
+    scheduler = Scheduler(fd_limited(concurrency, 2), adaptive, initial_concurrency, sites, limits)
+
+    queue = None
+    consumer = None
+    if index is not None:
+        # a few configs per parsing job, downloads wait beyond that
+        queue = asyncio.Queue(maxsize=4 * index.jobs)
+        consumer = asyncio.ensure_future(index.consume(queue))
+
+    async def grab(hostname: str) -> Tuple[str, bool, str]:
+        # one device failing, e.g. its file can't be written, does not
+        # stop the others, as with the threads engine
+        try:
+            return await grab_single_config_async(
+                pool, hostname, directory, sanitized,
+                fingerprint_cmd=fingerprint_cmd, fingerprints=fingerprints,
+                write=write, queue=queue, store=store, snapshot=snapshot,
+                scheduler=scheduler, commands=commands, commands_dir=commands_dir,
+                commands_layout=commands_layout
+            )
+        except Exception as e:
+            return hostname, False, f"{type(e).__name__}: {e}"
+        finally:
+            pool.discard(hostname)
+
+    async def grab_all() -> None:
+        for future in asyncio.as_completed([grab(host) for host in hostnames]):
+            host, success, error = await future
+            metrics.count(f"devices.{error or 'fetched'}" if success else "devices.failed")
+            if success and error == "skipped":
+                print(f"Config of {host} unchanged since the last run, skipped")
+            elif success and error == "unchanged":
+                print(f"Successfully downloaded config from {host}, unchanged")
+            elif success:
+                print(f"Successfully downloaded config from {host}")
+            else:
+                print(f"Failed to download config from {host}: {error}")
+
+    metrics.begin("fetch")
+    fetch = asyncio.ensure_future(grab_all())
+    try:
+        if consumer is not None:
+            # the consumer only stops early on an error, the downloads
+            # would then wait on the full queue forever
+            await asyncio.wait({fetch, consumer}, return_when=asyncio.FIRST_COMPLETED)
+            if consumer.done():
+                consumer.result()
+        await fetch
+        if consumer is not None:
+            await queue.put(None)
+            await consumer
+    finally:
+        fetch.cancel()
+        if consumer is not None:
+            consumer.cancel()
+        await pool.close()
+        metrics.end()
+        if fingerprint_cmd:
+            save_fingerprints(directory, fingerprint_cmd, sanitized, fingerprints)
 
 def main():
     parser = argparse.ArgumentParser()
@@ -129,28 +685,134 @@ def main():
                       help="flag for running-config to be sanitized: show running-config sanitized")
     parser.add_argument("-w", "--workers", type=int, default=None,
                       help="maximum number of worker threads (default: number of CPU cores)")
+    parser.add_argument("-e", "--engine", type=str, default="async",
+                      choices=["async", "threads"],
+                      help="asyncio engine with pooled connections, or the ping and thread pool engine")
+    parser.add_argument("-c", "--concurrency", type=int, default=1000,
+                      help="maximum number of devices in flight with the async engine")
+    parser.add_argument("--adaptive", action="store_true",
+                      help="async engine: adjust the devices in flight by AIMD, up to --concurrency, backing off on errors and rising latency")
+    parser.add_argument("--initial-concurrency", type=int, default=16,
+                      help="with --adaptive, number of devices in flight to start with")
+    parser.add_argument("-t", "--timeout", type=float, default=30,
+                      help="seconds allowed for each eAPI request with the async engine")
+    parser.add_argument("--sweep-timeout", type=float, default=2,
+                      help="connect timeout of the reachability sweep run before fetching with the async engine")
+    parser.add_argument("--no-sweep", action="store_true",
+                      help="skip the reachability sweep of the async engine")
+    parser.add_argument("--fingerprint-cmd", type=str, default=None,
+                      help="incremental mode for the async engine: cheap command whose output changes with the config, devices with the same output as the last run are skipped")
+    parser.add_argument("-a", "--analyze", action="store_true",
+                      help="async engine: count the common stanzas of the configs as they are downloaded, as config-tool --count")
+    parser.add_argument("--count", type=str, nargs="+", default=["all"],
+                      help="with --analyze, min number of devices a stanza is seen in, or 'all'")
+    parser.add_argument("-m", "--mask", type=str, default="",
+                      help="with --analyze, string to ignore, e.g. 'description'")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                      help="with --analyze, number of processes parsing the configs")
+    parser.add_argument("--no-write", action="store_true",
+                      help="with --analyze, do not write the configs to the directory")
+    parser.add_argument("--store", type=str, default=None,
+                      help="async engine: config store the configs are also added to")
+    parser.add_argument("--snapshot", type=str, default=None,
+                      help="with --store, snapshot name (default: today's date)")
+    parser.add_argument("--command", type=str, action="append", default=[],
+                      help="extra command collected in the same eAPI call as the config, repeat it for each command, end it with '| json' for JSON output")
+    parser.add_argument("--commands-dir", type=str, default=None,
+                      help="directory of the outputs of the extra commands (default: a 'commands' directory in --directory)")
+    parser.add_argument("--commands-layout", type=str, default="json",
+                      choices=["json", "files"],
+                      help="one JSON document per device, or one file per command in a directory per device")
+    parser.add_argument("--transport", type=str, default="https",
+                      choices=["https", "http"],
+                      help="eAPI transport, http is meant for a local mock eAPI server")
+    confmetrics.add_arguments(parser)
     args = parser.parse_args()
+    for count in args.count:
+        if count != "all" and not count.isdigit():
+            parser.error(f"--count: invalid count '{count}'")
+    if args.analyze and args.engine != "async":
+        parser.error("--analyze needs the async engine")
+    if args.store and args.engine != "async":
+        parser.error("--store needs the async engine")
+    if args.no_write and not (args.analyze or args.store):
+        parser.error("--no-write needs --analyze or --store")
+    if args.no_write and args.fingerprint_cmd:
+        parser.error("--fingerprint-cmd needs the configs written to the directory")
 
-    # Read hostnames from file
-    with open(args.file, "r") as current_file:
-        hostnames = current_file.readlines()
+    if args.command and args.no_write:
+        parser.error("--command needs the outputs written, --no-write is not available")
+    commands_dir = args.commands_dir or os.path.join(args.directory, "commands")
+    if args.adaptive and args.engine != "async":
+        parser.error("--adaptive needs the async engine")
+    if args.engine != "async":
+        for option in ("concurrency", "initial_concurrency", "timeout",
+                       "sweep_timeout", "no_sweep", "fingerprint_cmd"):
+            if getattr(args, option) != parser.get_default(option):
+                flag = option.replace("_", "-")
+                parser.error(f"--{flag} needs the async engine")
+    try:
+        hostnames, sites, limits = read_inventory(args.file)
+    except ValueError as e:
+        parser.error(f"--file: {e}")
+    if limits and args.engine != "async":
+        parser.error("limit lines of the inventory need the async engine")
+
+    index = StanzaIndex(args.mask, args.jobs) if args.analyze else None
+    store = ConfigStore(args.store) if args.store else None
+    snapshot = args.snapshot or time.strftime("%Y-%m-%d")
 
     # Start timing
     start_time = time.time()
+    confmetrics.start(args, "confgrabber")
     
-    # Grab configs in parallel
-    grab_configs(
-        hostnames=hostnames,
-        user=args.user,
-        passwd=args.passwd,
-        directory=args.directory,
-        sanitized=args.sanitized,
-        max_workers=args.workers
-    )
+    if args.engine == "async":
+        asyncio.run(grab_configs_async(
+            hostnames=hostnames,
+            user=args.user,
+            passwd=args.passwd,
+            directory=args.directory,
+            sanitized=args.sanitized,
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+            transport=args.transport,
+            sweep_timeout=None if args.no_sweep else args.sweep_timeout,
+            fingerprint_cmd=args.fingerprint_cmd,
+            index=index,
+            write=not args.no_write,
+            store=store,
+            snapshot=snapshot,
+            adaptive=args.adaptive,
+            initial_concurrency=args.initial_concurrency,
+            sites=sites,
+            limits=limits,
+            commands=args.command,
+            commands_dir=commands_dir,
+            commands_layout=args.commands_layout
+        ))
+    else:
+        # Grab configs in parallel
+        grab_configs(
+            hostnames=hostnames,
+            user=args.user,
+            passwd=args.passwd,
+            directory=args.directory,
+            sanitized=args.sanitized,
+            max_workers=args.workers,
+            commands=args.command,
+            commands_dir=commands_dir,
+            commands_layout=args.commands_layout
+        )
     
     # Calculate and display execution time
     execution_time = time.time() - start_time
     print(f"\nProcessing {len(hostnames)} EOS devices took {execution_time:.2f} seconds")
 
+    if index is not None:
+        metrics.begin("report")
+        num_files = str(len(index.devices))
+        print_counts(index, args.count, num_files)
+        print_comments(index.comments)
+
 if __name__ == "__main__":
     main()
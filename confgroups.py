@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confgroups.py
+#
+"""DESCRIPTION
+Commonality per container of devices, CloudVision style
+
+Devices are put in a hierarchy of containers, from a mapping file or
+from regexes matched against their names, under the 'Tenant' root
+container that holds every device.  The number of devices of each
+container having each stanza is reduced from the membership matrix
+of the StanzaIndex, one pass per level of the hierarchy, so every
+container comes from the same parse.
+
+Each stanza is reported once, at the highest container whose devices
+all have it, which is the configlet of that container.  Stanzas that
+are not common anywhere are reported at the smallest container that
+holds every device having them.
+"""
+
+import os
+import re
+
+import numpy as np
+
+
+ROOT = "Tenant"
+
+
+# extensions of config files, left out of the names in a groups file
+EXTENSIONS = (".txt", ".cfg", ".conf")
+
+
+def device_name(device):
+    """name of a device of the index, config file name or store name,
+    corpus files keep the path of the config files as a string"""
+    return os.path.basename(str(device))
+
+
+def read_groups(path):
+    """read a device to container mapping file
+
+    One device per line, its name then its container, separated by
+    a comma or whitespace.  Nested containers are separated by '/',
+    e.g. 'leaf1 DC1/pod1'.  Lines starting with '#' are ignored.
+
+    Args:
+        path (string): mapping file
+
+    Returns:
+        dict: device name to tuple of container names, outermost first
+    """
+    groups = {}
+    with open(path, "r") as mapping:
+        for line in mapping:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = re.split(r"[,\s]+", line, maxsplit=1)
+            if len(fields) < 2:
+                raise ValueError(f"{path}: no container for '{line}'")
+            groups[fields[0]] = tuple(
+                name for name in fields[1].strip().split("/") if name
+            )
+    return groups
+
+
+def match_groups(names, patterns):
+    """containers of devices from regexes matched against their names
+
+    Each regex is one level of the hierarchy, the container is named
+    by its first group or else the whole match.  A device stops at
+    the first regex it does not match.
+
+    Args:
+        names (iterable): device names
+        patterns (list): regexes, outermost level first
+
+    Returns:
+        dict: device name to tuple of container names
+    """
+    regexes = [re.compile(pattern) for pattern in patterns]
+    groups = {}
+    for name in names:
+        path = []
+        for regex in regexes:
+            match = regex.search(name)
+            if match is None:
+                break
+            path.append(match.group(1) if regex.groups else match.group())
+        groups[name] = tuple(path)
+    return groups
+
+
+class Containers:
+    """stanza counts of a hierarchy of containers of devices
+
+    Args:
+        index (StanzaIndex): stanza index, not in streaming mode
+        groups (dict): device name, with or without its extension, to
+            tuple of container names; devices missing from it are only
+            in the root container
+
+    Attributes:
+        names (list): container paths, '/' separated, ROOT first
+        parents (list): parent container of each container, -1 for ROOT
+        sizes (array): number of devices of each container
+    """
+
+    def __init__(self, index, groups):
+        self.index = index
+        names = {(): 0}
+        self.parents = [-1]
+        # container of each device at each depth, -1 above its own
+        device_paths = []
+        for device in index.devices:
+            name = device_name(device)
+            path = groups.get(name)
+            if path is None:
+                # 'leaf1.txt' is 'leaf1', 'leaf1.dc1' is only itself
+                stem, extension = os.path.splitext(name)
+                path = groups.get(stem, ()) if extension in EXTENSIONS else ()
+            device_paths.append(path)
+            for depth in range(1, len(path) + 1):
+                if path[:depth] not in names:
+                    names[path[:depth]] = len(names)
+                    self.parents.append(names[path[:depth - 1]])
+        self.names = [
+            "/".join((ROOT,) + path) for path in sorted(names, key=names.get)
+        ]
+        depths = max((len(path) for path in device_paths), default=0)
+        self.labels = np.full((depths, len(device_paths)), -1, dtype=np.int64)
+        for n, path in enumerate(device_paths):
+            for depth in range(1, len(path) + 1):
+                self.labels[depth - 1, n] = names[path[:depth]]
+        self.sizes = np.zeros(len(names), dtype=np.int64)
+        self.sizes[0] = len(device_paths)
+        for labels in self.labels:
+            found = labels[labels >= 0]
+            self.sizes += np.bincount(found, minlength=len(names))
+        self._counts = None
+        self._common = None
+
+    def children(self, container):
+        """containers right below a container"""
+        return [
+            child
+            for child, parent in enumerate(self.parents)
+            if parent == container
+        ]
+
+    def counts(self):
+        """number of devices of each container having each stanza
+
+        Returns:
+            list: (stanza ids, device counts) numpy arrays of each
+                container, the stanzas in no device of it are left out
+        """
+        if self._counts is not None:
+            return self._counts
+        index = self.index
+        num_stanzas = len(index.hashes)
+        device_counts = index.device_counts()
+        seen = np.flatnonzero(device_counts)
+        empty = np.zeros(0, dtype=np.int64)
+        counts = [(seen, device_counts[seen])] + [(empty, empty)] * (
+            len(self.names) - 1
+        )
+        indptr, indices = index.membership()
+        rows = np.repeat(np.arange(len(index.devices)), np.diff(indptr))
+        for labels in self.labels:
+            entries = labels[rows]
+            keep = entries >= 0
+            keys, found = np.unique(
+                entries[keep] * num_stanzas + indices[keep],
+                return_counts=True,
+            )
+            containers = keys // num_stanzas
+            bounds = np.searchsorted(
+                containers, np.arange(len(self.names) + 1)
+            )
+            for container in np.unique(containers):
+                part = slice(bounds[container], bounds[container + 1])
+                counts[container] = (keys[part] % num_stanzas, found[part])
+        self._counts = counts
+        return counts
+
+    def _assign(self):
+        """stanzas common to each container and not to its parent, and
+        smallest container that holds all the devices having each stanza"""
+        device_counts = self.index.device_counts()
+        full = []
+        self._common = []
+        self._lowest = np.zeros(len(self.index.hashes), dtype=np.int64)
+        self._anywhere = np.zeros(len(self.index.hashes), dtype=bool)
+        # parents are numbered before their children
+        for container, (ids, found) in enumerate(self.counts()):
+            full.append(ids[found == self.sizes[container]])
+            common = full[container]
+            parent = self.parents[container]
+            if parent >= 0:
+                # common to the parent is common to this container
+                common = common[~np.isin(common, full[parent])]
+            self._common.append(common)
+            self._anywhere[common] = True
+            self._lowest[ids[found == device_counts[ids]]] = container
+
+    def common(self, container):
+        """stanzas in every device of a container but not in every
+        device of its parent, the configlet of the container"""
+        if self._common is None:
+            self._assign()
+        return self._common[container]
+
+    def specific(self, container):
+        """stanzas in more than one device, all of them in a container,
+        that are not in every device of any container"""
+        if self._common is None:
+            self._assign()
+        device_counts = self.index.device_counts()
+        return np.flatnonzero(
+            (self._lowest == container)
+            & ~self._anywhere
+            & (device_counts > 1)
+        )
+
+    def promotions(self, container, min_children=2):
+        """stanzas common to several children of a container, that
+        could be moved up to it
+
+        Args:
+            container (int): parent container
+            min_children (int): least number of children they are
+                common to
+
+        Returns:
+            list: (stanza id, number of children it is common to,
+                number of devices of the container having it)
+        """
+        if self._common is None:
+            self._assign()
+        children = self.children(container)
+        common = [self.common(child) for child in children]
+        if not common or len(children) < min_children:
+            return []
+        ids, times = np.unique(np.concatenate(common), return_counts=True)
+        ids = ids[times >= min_children]
+        times = times[times >= min_children]
+        stanza_ids, found = self.counts()[container]
+        devices = found[np.searchsorted(stanza_ids, ids)]
+        return [
+            (int(i), int(t), int(d)) for i, t, d in zip(ids, times, devices)
+        ]
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confhistory.py
+#
+"""DESCRIPTION
+Stanza level history of the devices of a config store
+
+Each device is kept as the stanza hashes added and removed since
+its previous snapshot, so months of daily snapshots take little
+more than the changes made in them.  The history is built once per
+snapshot, normalization rules and mask, from the stanza hashes the
+store already keeps, and answers without parsing any config:
+
+  - what changed on a device between two snapshots
+  - which devices dropped stanzas of the common baseline
+  - when a stanza was first seen, and on which devices
+
+Snapshot names must sort in time order, as the default YYYY-MM-DD
+names of confgrabber.py and confstore.py do.
+"""
+
+import numpy as np
+
+from confcache import rules_digest, signed_hash
+from confindex import StanzaIndex
+
+
+def _blob(hashes):
+    """sorted stanza hashes as a SQLite blob"""
+    return np.asarray(hashes, dtype=np.uint64).tobytes()
+
+
+def _hashes(blob):
+    return np.frombuffer(blob, dtype=np.uint64)
+
+
+class StanzaHistory:
+    """stanza hash deltas of the devices of a config store
+
+    Args:
+        store (ConfigStore): config store, the history is kept in it
+        mask (string): mask given to the Normalizer
+        jobs (int): number of processes parsing new configs
+    """
+
+    def __init__(self, store, mask="", jobs=1):
+        self.store = store
+        self.mask = mask
+        self.jobs = jobs
+        self.rules = rules_digest(mask)
+        self.db = store.db
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS history_snapshots ("
+            "rules TEXT, snapshot TEXT, PRIMARY KEY (rules, snapshot));"
+            "CREATE TABLE IF NOT EXISTS history_deltas ("
+            "rules TEXT, device TEXT, snapshot TEXT, added BLOB, "
+            "removed BLOB, PRIMARY KEY (rules, device, snapshot));"
+            "CREATE TABLE IF NOT EXISTS history_first ("
+            "rules TEXT, hash INTEGER, snapshot TEXT, "
+            "PRIMARY KEY (rules, hash));"
+        )
+        self.db.commit()
+
+    def snapshots(self):
+        """snapshots in the history, in time order"""
+        return [
+            row[0]
+            for row in self.db.execute(
+                "SELECT snapshot FROM history_snapshots WHERE rules = ? "
+                "ORDER BY snapshot",
+                (self.rules,),
+            )
+        ]
+
+    def snapshot_at(self, name):
+        """last snapshot in the history at or before name
+
+        Args:
+            name (string): snapshot name or date
+
+        Returns:
+            string: snapshot name, None if the history starts later
+        """
+        found = None
+        for snapshot in self.snapshots():
+            if snapshot <= name:
+                found = snapshot
+        return found
+
+    def states(self, snapshot, devices=None):
+        """stanza hashes of the devices at a snapshot
+
+        Devices missing from a snapshot keep the stanzas of the last
+        snapshot they were in
+
+        Args:
+            snapshot (string): snapshot name
+            devices (list): device names, every device if None
+
+        Returns:
+            dict: device name to sorted array of stanza hashes
+        """
+        query = (
+            "SELECT device, added, removed FROM history_deltas "
+            "WHERE rules = ? AND snapshot <= ?"
+        )
+        if devices is None:
+            batches = [[]]
+        else:
+            # 500 devices a query, below the SQLite variable limit
+            devices = list(devices)
+            batches = [
+                devices[start:start + 500]
+                for start in range(0, len(devices), 500)
+            ]
+        states = {}
+        empty = np.zeros(0, dtype=np.uint64)
+        for batch in batches:
+            where = ""
+            if devices is not None:
+                where = " AND device IN ({})".format(",".join("?" * len(batch)))
+            for device, added, removed in self.db.execute(
+                query + where + " ORDER BY snapshot",
+                [self.rules, snapshot] + batch,
+            ):
+                state = np.setdiff1d(
+                    states.get(device, empty), _hashes(removed), assume_unique=True
+                )
+                states[device] = np.union1d(state, _hashes(added))
+        return states
+
+    def update(self):
+        """add the store snapshots missing from the history
+
+        New configs are parsed, and kept in the store, on the way
+
+        Returns:
+            list: snapshots added
+        """
+        done = self.snapshots()
+        new = [s for s in self.store.snapshots() if s not in done]
+        if not new:
+            return []
+        if done and new[0] < done[-1]:
+            # a snapshot older than the history, deltas are rebuilt
+            for table in ("history_snapshots", "history_deltas", "history_first"):
+                self.db.execute(
+                    "DELETE FROM {} WHERE rules = ?".format(table),
+                    (self.rules,),
+                )
+            new = self.store.snapshots()
+        states = self.states(new[0])
+        empty = np.zeros(0, dtype=np.uint64)
+        for snapshot in new:
+            index = StanzaIndex(self.mask, self.jobs)
+            index.load_snapshot(self.store, snapshot)
+            hashes = np.frombuffer(index.hashes, dtype=np.uint64)
+            deltas = []
+            for device, ids in index.devices.items():
+                state = np.unique(hashes[np.frombuffer(ids, dtype=np.uint32)])
+                before = states.get(device, empty)
+                added = np.setdiff1d(state, before, assume_unique=True)
+                removed = np.setdiff1d(before, state, assume_unique=True)
+                if len(added) or len(removed) or device not in states:
+                    deltas.append(
+                        (
+                            self.rules,
+                            device,
+                            snapshot,
+                            _blob(added),
+                            _blob(removed),
+                        )
+                    )
+                states[device] = state
+            self.db.executemany(
+                "INSERT OR REPLACE INTO history_deltas VALUES (?, ?, ?, ?, ?)",
+                deltas,
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO history_first VALUES (?, ?, ?)",
+                ((self.rules, signed_hash(h), snapshot) for h in index.hashes),
+            )
+            self.db.execute(
+                "INSERT INTO history_snapshots VALUES (?, ?)",
+                (self.rules, snapshot),
+            )
+            self.db.commit()
+        return new
+
+    def changes(self, device, start, end):
+        """stanzas added to and removed from a device between snapshots
+
+        Args:
+            device (string): device name
+            start (string): snapshot name
+            end (string): snapshot name
+
+        Returns:
+            tuple: (added, removed) arrays of stanza hashes
+        """
+        empty = np.zeros(0, dtype=np.uint64)
+        before = self.states(start, [device]).get(device, empty)
+        after = self.states(end, [device]).get(device, empty)
+        return (
+            np.setdiff1d(after, before, assume_unique=True),
+            np.setdiff1d(before, after, assume_unique=True),
+        )
+
+    def drift(self, start, end, count=None):
+        """devices that dropped stanzas of the baseline between snapshots
+
+        The baseline is the stanzas seen in at least count devices,
+        every device by default, at the start snapshot
+
+        Args:
+            start (string): snapshot name
+            end (string): snapshot name
+            count (int): minimum number of devices of a baseline stanza
+
+        Returns:
+            tuple: (baseline array of stanza hashes, dict of device
+                name to array of the baseline stanza hashes it lost)
+        """
+        before = self.states(start)
+        if not before:
+            return np.zeros(0, dtype=np.uint64), {}
+        stanzas, devices = np.unique(
+            np.concatenate(list(before.values())), return_counts=True
+        )
+        baseline = stanzas[devices >= (count or len(before))]
+        after = self.states(end, list(before))
+        drifted = {}
+        for device, state in before.items():
+            lost = np.intersect1d(
+                np.setdiff1d(state, after[device], assume_unique=True),
+                baseline,
+                assume_unique=True,
+            )
+            if len(lost):
+                drifted[device] = lost
+        return baseline, drifted
+
+    def first_seen(self, h):
+        """snapshot a stanza was first seen in, and its devices there
+
+        Args:
+            h (int): stanza hash
+
+        Returns:
+            tuple: (snapshot name, list of device names), or None if
+                the stanza was never seen
+        """
+        row = self.db.execute(
+            "SELECT snapshot FROM history_first WHERE rules = ? AND hash = ?",
+            (self.rules, signed_hash(h)),
+        ).fetchone()
+        if row is None:
+            return None
+        snapshot = row[0]
+        h = np.uint64(h)
+        devices = []
+        for device, added in self.db.execute(
+            "SELECT device, added FROM history_deltas "
+            "WHERE rules = ? AND snapshot = ? ORDER BY device",
+            (self.rules, snapshot),
+        ):
+            added = _hashes(added)
+            i = np.searchsorted(added, h)
+            if i < len(added) and added[i] == h:
+                devices.append(device)
+        return snapshot, devices
@@ -38,49 +38,193 @@ or the common stanzas between two configs
 """
 
 import pathlib
-from collections import Counter
-import re
 import argparse
+import csv as csvlib
+import json
 import os
+import sys
 from os.path import expanduser
 
+import numpy as np
 
-def search_comments(line):
-    """collect the comments
+import confmetrics
+from confcomply import Golden
+from confindex import LineIndex, StanzaIndex
+from confmetrics import metrics
+from confparse import restore_bangs
+from confsnapshot import open_corpus
+from confstore import ConfigStore
 
-    Args:
-        line (string): line of config to search for comments
 
-    Returns:
-        list: list of lines with comments
+def nway(index, type, csv):
+    """compare any number of files, for each line or stanza
+    print the files that have it and the files that lack it
+
+    Args:
+        index (StanzaIndex): stanza index of the files
+        type (string): 'common', 'diffs' (lines) or 'stanzas'
+        csv (bool): output to CSV instead of colors
     """
-    regex_match = re.compile(r"^\s*!!.*", re.M)
-    re_match = re.findall(regex_match, line)
-    return list(re_match)
+    if type == "common":
+        common = index.common()
+        index.resolve(common)
+        for k in sorted(index.texts[i] for i in common):
+            if k and not str.isspace(k):
+                print(restore_bangs(k).strip())
+                print("!")
+        return
+
+    if csv:
+        print(f"In device files,NOT in device files,config line\n")
+    else:
+        print(
+            f"\x1b[0;30;42m{'In device files' : <25}\x1b[0m \x1b[0;37;41m{'NOT in device files' : <25}\x1b[0m \x1b[0;30;47m{'config line' : <40}\x1b[0m\n"
+        )
+    devices = list(index.devices)
+    corpus = index.corpus
+
+    if type == "stanzas":
+        index.resolve(range(len(index.hashes)))
+        device_counts = index.device_counts()
+        # devices holding each stanza, from the inverted index
+        indptr, holders = index.inverted()
+        names = np.array([str(device) for device in devices], dtype=object)
+        # a corpus keeps the stanzas of the devices not compared
+        for i in np.flatnonzero(
+            (device_counts > 0) & (device_counts < len(devices))
+        ):
+            k = index.texts[i]
+            if not k or str.isspace(k):
+                continue
+            lacking = np.ones(len(devices), dtype=bool)
+            lacking[holders[indptr[i]:indptr[i + 1]]] = False
+            have = list(names[~lacking])
+            lack = list(names[lacking])
+            print(
+                f"\n\x1b[6;30;42m{' '.join(have) : <25}\x1b[0m \x1b[6;37;41m{' '.join(lack) : <25}\x1b[0m"
+            )
+            print(restore_bangs(k).strip())
+        return
+
+    # one presence bitmap per line, over every line of every file,
+    # by line id for a corpus, decoded only if it is printed
+    lines = LineIndex()
+    if corpus is None:
+        index.resolve(range(len(index.hashes)))
+    for device in devices:
+        if corpus is None:
+            device_lines = (
+                line
+                for i in index.devices[device]
+                for line in index.texts[i].split("\n")
+            )
+        else:
+            device_lines = corpus.lines_of(index.devices[device])[0].tolist()
+        lines.add(device, device_lines)
+    everyone = (1 << len(devices)) - 1
+    for line, (count, mask) in lines.lines.items():
+        if mask == everyone:
+            continue
+        if corpus is not None:
+            line = corpus.line(line)
+        if not line or str.isspace(line):
+            continue
+        have = lines.files_in(mask)
+        lack = lines.files_in(everyone & ~mask)
+        if csv:
+            print(f"{';'.join(have)},{';'.join(lack)},{line}")
+        else:
+            print(
+                f"\x1b[6;30;42m{' '.join(have) : <25}\x1b[0m \x1b[6;37;41m{' '.join(lack) : <25}\x1b[0m {line : <40}"
+            )
+
+
+def corpus_devices(corpus, names):
+    """devices of a corpus, reporting the names it lacks
 
+    Args:
+        corpus (Corpus): dictionary encoded corpus
+        names (list): device names
 
-def fix_ups(line):
-    """fix any issues with the stanzas
-    Example these lines will appear as one stanza:
+    Returns:
+        list: the names that are devices of the corpus
+    """
+    devices = set(corpus.devices)
+    for name in names:
+        if name not in devices:
+            print(f"Device '{name}' is not in the corpus")
+    return [name for name in names if name in devices]
 
-       hostname superswitch101
-       ip name-server vrf mgmt foo.com
-       ip name-server vrf mgmt foo2.com
-       dns domain bar.com
 
-    If hostname is separated, the following 3
-    lines are likely to be shared among some or
-    all of the configs
+def compliance(results, csv, json_lines):
+    """print the differences of each device with the golden config
 
-       hostname superswitch101
-       !
-       ip name-server vrf mgmt foo.com
-       ip name-server vrf mgmt foo2.com
-       dns domain bar.com
+    Args:
+        results (iterable): differences of each device, see Golden
+        csv (bool): output to CSV, one row per stanza and line
+        json_lines (bool): output one JSON object per device
     """
-    regex_match = re.compile(r"^(hostname.*)", re.M)
-    re_match = re.sub(regex_match, r"\1\n!", line)
-    return str(re_match)
+    writer = csvlib.writer(sys.stdout, lineterminator="\n")
+    if csv:
+        writer.writerow(["device", "type", "stanza", "config"])
+    for device, missing, extra, missing_lines, extra_lines in results:
+        device = str(device)
+        metrics.count("compliance.devices")
+        compliant = not missing and not extra
+        if not compliant:
+            metrics.count("compliance.noncompliant")
+        if json_lines:
+            print(
+                json.dumps(
+                    {
+                        "device": device,
+                        "compliant": compliant,
+                        "missing_stanzas": [
+                            restore_bangs(text).strip() for text in missing
+                        ],
+                        "extra_stanzas": [
+                            restore_bangs(text).strip() for text in extra
+                        ],
+                        "missing_lines": [
+                            {"stanza": head, "line": restore_bangs(line)}
+                            for head, line in missing_lines
+                        ],
+                        "extra_lines": [
+                            {"stanza": head, "line": restore_bangs(line)}
+                            for head, line in extra_lines
+                        ],
+                    }
+                )
+            )
+        elif csv:
+            for kind, texts in (("missing stanza", missing), ("extra stanza", extra)):
+                for text in texts:
+                    text = restore_bangs(text).strip()
+                    writer.writerow([device, kind, text.split("\n")[0], text])
+            for kind, lines in (
+                ("missing line", missing_lines),
+                ("extra line", extra_lines),
+            ):
+                for head, line in lines:
+                    writer.writerow([device, kind, head, restore_bangs(line)])
+        else:
+            if compliant:
+                print(f"\x1b[6;30;42m{device} compliant\x1b[0m")
+                continue
+            print(
+                f"\n\x1b[6;30;44m{device}: {len(missing)} missing, {len(extra)} extra stanzas\x1b[0m"
+            )
+            changes = {}
+            for sign, lines in (("-", missing_lines), ("+", extra_lines)):
+                for head, line in lines:
+                    changes.setdefault(head, []).append((sign, line))
+            for head, lines in changes.items():
+                # the first line is only signed if it differs too
+                if head not in (line for _, line in lines):
+                    print(f"  {restore_bangs(head)}")
+                for sign, line in lines:
+                    color = "0;37;41" if sign == "-" else "0;30;42"
+                    print(f"\x1b[{color}m{sign}\x1b[0m {restore_bangs(line)}")
 
 
 def main():
@@ -89,13 +233,14 @@ def main():
         "-t",
         "--type",
         type=str,
-        default="diffs",
+        default=None,
         choices=[
             "common",
             "diffs",
+            "stanzas",
         ],
-        help="specify config output type: common stanzas or differences between files",
-        required=True,
+        help="specify config output type: common stanzas or differences between files.\n 'stanzas' lists the files that have and lack each stanza",
+        required=False,
     )
     parser.add_argument(
         "-c",
@@ -108,24 +253,130 @@ def main():
         "-f",
         "--files",
         type=str,
-        nargs=2,
-        help="Specify the EOS device configuration files to compare",
-        required=True,
+        nargs="+",
+        help="Specify the EOS device configuration files to compare, more than two for an N-way comparison",
+        required=False,
+    )
+    parser.add_argument(
+        "-d",
+        "--directory",
+        type=str,
+        default="",
+        help="Specify a directory of EOS device configuration files for an N-way comparison",
+        required=False,
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default="",
+        help="SQLite file caching the parsed configuration files between runs",
+        required=False,
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default="",
+        help="config store to read the configurations from, --files are then device names of the snapshot, every device if omitted",
+        required=False,
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=str,
+        default="",
+        help="snapshot of the --store to compare, default the latest one",
+        required=False,
+    )
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        default="",
+        help="dictionary encoded corpus file to compare, --files are then device names of the corpus, every device if omitted",
+        required=False,
+    )
+    parser.add_argument(
+        "-g",
+        "--golden",
+        type=str,
+        default="",
+        help="golden configuration file, the missing and extra stanzas and lines of every device are reported instead of --type",
+        required=False,
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="with --golden, output one JSON object per device",
+        required=False,
+    )
+    parser.add_argument(
+        "-m",
+        "--mask",
+        type=str,
+        default="",
+        help="with --golden, the rest of any line containing this string is ignored, e.g. 'hostname'",
+        required=False,
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse the configuration files",
+        required=False,
+    )
+    confmetrics.add_arguments(parser)
     args = parser.parse_args()
-
-    stanzas = []
-    device_stanzas = {}
-    common_stanzas = []
-    comments = []
+    if args.golden:
+        if args.type:
+            parser.error("--type is not available with --golden")
+        if not os.path.isfile(args.golden):
+            parser.error(f"--golden: no such file '{args.golden}'")
+        if args.csv and args.json:
+            parser.error("--csv and --json can't be used together")
+    elif args.type is None:
+        parser.error("the following arguments are required: -t/--type")
+    elif args.json or args.mask:
+        parser.error("--json and --mask need --golden")
+    if args.corpus and (args.store or args.directory or args.cache):
+        parser.error("--store, --directory and --cache are not available with --corpus")
+    if args.corpus:
+        try:
+            corpus = open_corpus(args.corpus)
+        except (OSError, ValueError) as error:
+            parser.error(f"--corpus: {error}")
+        if args.golden and args.mask != corpus.mask:
+            parser.error(
+                f"--mask: {args.corpus} was written with the mask '{corpus.mask}'"
+            )
+    confmetrics.start(args, "config-differ")
 
     home = expanduser("~")
-    if args.files:
+    if args.store:
+        store = ConfigStore(args.store)
+        snapshot = args.snapshot or store.latest()
+        if snapshot not in store.snapshots():
+            parser.error(f"--snapshot: no snapshot '{snapshot}' in {args.store}")
+        myfiles = args.files or store.devices(snapshot)
+        if len(myfiles) < 2 and not args.golden:
+            parser.error("specify two or more --files")
+    elif args.corpus:
+        myfiles = args.files or corpus.devices
+        if len(myfiles) < 2 and not args.golden:
+            parser.error("specify two or more --files")
+    elif args.directory:
+        myfiles = sorted(
+            str(path)
+            for path in pathlib.Path(args.directory).iterdir()
+            if path.is_file() and not path.name.startswith(".")
+        )
+    elif args.files and (len(args.files) >= 2 or args.golden):
         myfiles = args.files
     else:
-        print(f"This didn't work: arg.files is: {arg.files}")
-    
-    if args.csv and args.type == "common":
+        parser.error("specify two or more --files, or a --directory")
+    nway_mode = bool(args.directory) or len(myfiles) > 2
+    if (args.store or args.corpus) and not args.files:
+        nway_mode = True
+
+    if args.csv and args.type in ("common", "stanzas"):
         print(f"\nOutput to CSV with option {args.type} is not supported")
         raise SystemExit(1)
 
@@ -142,65 +393,92 @@ def main():
         maxcount = 1
         type = "diffs"
 
-    # Series of regex statements to remove extraneous unusable config patterns
-    regex_sub_doublebang = re.compile(r"^\s*!!.*|^>.*|^end.*|", re.M)
-    regex_sub_command = re.compile(r"^\s.*Command:.*", re.M)
-    regex_sub_bang = re.compile(r"(^.\s+)!(.*)", re.M)
-    regex_sub_endbang = re.compile(r"(\w)!", re.M)
-    regex_sub_boot_system = re.compile(r"^!.*boot\ssystem.*", re.M)
-    regex_sub_comments = re.compile(r"(^\s+)#(.*)", re.M)
-    regex_sub_rancid = re.compile(
-        r"RANCID-CONTENT-TYPE:\sarista", re.IGNORECASE
-    )
-
-    for file in myfiles:
-        if os.path.exists(file):
-            current_file = open(file, "r")
-            content = current_file.read()
-            comments += search_comments(content)
-            content = fix_ups(content)
-            subcontent = re.sub(regex_sub_doublebang, "", content)
-            subcontent = re.sub(regex_sub_rancid, "", subcontent)
-            subcontent = re.sub(regex_sub_command, "", subcontent)
-            # change any '!' with preceding whitespace to a '#'
-            # change any '!' at the end of a word to a '#'
-            # We will change those back at the end
-            subcontent = re.sub(regex_sub_bang, r"\1#\2", subcontent)
-            subcontent = re.sub(regex_sub_endbang, r"\1#", subcontent)
-            subcontent = re.sub(regex_sub_boot_system, "", subcontent)
-
-            stanzas += subcontent.split("!")
-            device_stanzas[file] = subcontent.split("!")
-            current_file.close()
+    if args.golden:
+        # the golden config is parsed once, the devices are streamed
+        # through the workers
+        metrics.begin("compare")
+        golden = Golden(args.golden, args.mask)
+        if args.corpus:
+            names = corpus_devices(corpus, myfiles)
+            results = golden.check_corpus(corpus, names)
+        elif args.store:
+            devices = set(store.devices(snapshot))
+            names = [name for name in myfiles if name in devices]
+            for file in myfiles:
+                if file not in devices:
+                    print(f"Device '{file}' is not in snapshot {snapshot}")
+            results = golden.check_texts(
+                (
+                    (name, data.decode("utf-8"))
+                    for name, data in store.configs(snapshot, names)
+                ),
+                args.jobs,
+            )
         else:
-            print(f"File '{file}' does not exist, check path")
-    if type == "common":
-        for k, v in sorted(Counter(stanzas).items()):
-            if v >= int(mincount) and v <= int(maxcount):
-                # substitute the '  !' back in for the '#'
-                # used to trick the split parser earlier
-                if k and not str.isspace(k):
-                    print(re.sub(regex_sub_comments, r"\1!\2", k).strip())
-                    print("!")
+            paths = []
+            for file in myfiles:
+                if os.path.exists(file):
+                    paths.append(file)
+                else:
+                    print(f"File '{file}' does not exist, check path")
+            results = golden.check_files(paths, args.jobs)
+        compliance(results, csv, args.json)
+        return
+
+    metrics.begin("load")
+    index = StanzaIndex(jobs=args.jobs, cache=args.cache)
+    if args.corpus:
+        index.load_corpus(corpus, corpus_devices(corpus, myfiles))
+    elif args.store:
+        devices = set(store.devices(snapshot))
+        for file in myfiles:
+            if file not in devices:
+                print(f"Device '{file}' is not in snapshot {snapshot}")
+        index.load_snapshot(store, snapshot, myfiles)
+    else:
+        paths = []
+        for file in myfiles:
+            if os.path.exists(file):
+                paths.append(file)
+            else:
+                print(f"File '{file}' does not exist, check path")
+        index.load(paths)
+
+    metrics.begin("compare")
+    metrics.count("devices", len(index.devices))
+    metrics.count("unique_stanzas", len(index.hashes))
+    if nway_mode or args.type == "stanzas":
+        nway(index, args.type, csv)
+    elif type == "common":
+        occurrences = index.occurrences()
+        seen = np.flatnonzero(
+            (occurrences >= int(mincount)) & (occurrences <= int(maxcount))
+        )
+        index.resolve(seen)
+        for k in sorted(index.texts[i] for i in seen):
+            # substitute the '  !' back in for the '#'
+            # used to trick the split parser earlier
+            if k and not str.isspace(k):
+                print(restore_bangs(k).strip())
+                print("!")
     elif type == "diffs":
-        for k, v in sorted(Counter(stanzas).items()):
-            if v > int(maxcount):
-                common_stanzas.append(k)
-        _global = []
+        if len(index.devices) < 2:
+            print("\nOption diffs needs two different, existing files")
+            raise SystemExit(1)
+        # stanzas of each file that are not in the other one,
+        # straight from the inverted index
         _globaldict = {}
-        for device in device_stanzas:
-            _con = []
-            for _stanza in device_stanzas[device]:
-                specific = True
-                for _common in common_stanzas:
-                    if _common == _stanza:
-                        specific = False
-                if specific:
-                    # _con.append("!")
-                    _con.append(_stanza)
-                    _global.append(_stanza)
-                    # print(f"stanza is {_stanza}")
+        lines = LineIndex()
+        index.resolve(np.flatnonzero(index.occurrences() <= int(maxcount)))
+        for device in index.devices:
+            _con = [
+                index.texts[i] for i in index.specific(device, int(maxcount))
+            ]
             _globaldict[device] = _con
+            lines.add(
+                device,
+                (line for _stanza in _con for line in _stanza.split("\n")),
+            )
         if csv:
             print(
             f"In device file,NOT in device file,config line\n")
@@ -209,21 +487,14 @@ def main():
                 f"\x1b[0;30;42m{'In device file' : <25}\x1b[0m \x1b[0;37;41m{'NOT in device file' : <25}\x1b[0m \x1b[0;30;47m{'config line' : <40}\x1b[0m\n"
             )
         for device in _globaldict:
+            otherDevice = [
+                _peer for _peer in _globaldict if _peer != device
+            ][-1]
             for _stanza in _globaldict[device]:
                 for line in _stanza.split("\n"):
-                    lineCounter = 0
-                    _peer = []
-                    for _gstanza in _global:
-                        for _gline in _gstanza.split("\n"):
-                            if line == _gline:
-                                lineCounter += 1
-                    if lineCounter == 1:
-                        _peers = list(_globaldict.keys())
-                        for _peer in _peers:
-                            if device != _peer:
-                                otherDevice = _peer
-                            else:
-                                otherDevice = list(set(_peers) - {_peer})[0]
+                    # lines seen once in the specific stanzas
+                    # of both files
+                    if lines.count(line) == 1:
                         if csv:
                             print(f"{device},{otherDevice},{line}")
                         else:
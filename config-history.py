@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# config-history.py
+#
+"""DESCRIPTION
+Audit queries over the snapshots of a config store: what changed on a
+device, which devices drifted from the common baseline, and when a
+stanza first appeared.  Answered from stanza hash deltas, the configs
+are only parsed the first time a snapshot is seen
+"""
+
+import argparse
+import datetime
+
+from confhistory import StanzaHistory
+from confparse import Normalizer, restore_bangs, stanza_hash
+from confstore import ConfigStore
+
+
+def print_stanzas(store, hashes, color, sign):
+    """print stanzas with a colored '+' or '-' banner
+
+    Args:
+        store (ConfigStore): config store holding the stanza texts
+        hashes (array): stanza hashes
+        color (string): ANSI color of the banner
+        sign (string): '+' or '-'
+    """
+    texts = store.texts(int(h) for h in hashes)
+    for stanza in sorted(texts.values()):
+        if not stanza or str.isspace(stanza):
+            continue
+        print(f"\n\x1b[6;30;{color}m {sign} \x1b[0m")
+        print(restore_bangs(stanza).strip())
+
+
+def default_start(history, end):
+    """snapshot a week before end if snapshots are dates, else the
+    snapshot before end
+
+    Args:
+        history (StanzaHistory): snapshot history
+        end (string): snapshot name
+
+    Returns:
+        string: snapshot name
+    """
+    snapshots = history.snapshots()
+    try:
+        week = datetime.date.fromisoformat(end) - datetime.timedelta(days=7)
+    except ValueError:
+        i = snapshots.index(end)
+        return snapshots[max(i - 1, 0)]
+    return history.snapshot_at(week.isoformat()) or snapshots[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--store",
+        type=str,
+        required=True,
+        help="config store holding the snapshots",
+    )
+    parser.add_argument(
+        "--changes",
+        type=str,
+        default="",
+        help="device to list the stanzas added and removed between --from and --to",
+        required=False,
+    )
+    parser.add_argument(
+        "--drift",
+        action="store_true",
+        help="list the devices that lost stanzas of the common baseline between --from and --to",
+        required=False,
+    )
+    parser.add_argument(
+        "--first-seen",
+        type=str,
+        default="",
+        help="file with stanzas to find the first snapshot and devices of",
+        required=False,
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="list the snapshots of the history",
+        required=False,
+    )
+    parser.add_argument(
+        "--from",
+        dest="start",
+        type=str,
+        default="",
+        help="snapshot name or date, default a week before --to, or the snapshot before it",
+        required=False,
+    )
+    parser.add_argument(
+        "--to",
+        dest="end",
+        type=str,
+        default="",
+        help="snapshot name or date, default the latest snapshot",
+        required=False,
+    )
+    parser.add_argument(
+        "-c",
+        "--count",
+        type=int,
+        default=None,
+        help="with --drift, min number of devices of a baseline stanza, default all",
+        required=False,
+    )
+    parser.add_argument(
+        "-m",
+        "--mask",
+        type=str,
+        default="",
+        help="specify a string to ignore, e.g. 'description'",
+        required=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse new snapshots",
+        required=False,
+    )
+    args = parser.parse_args()
+    if not (args.changes or args.drift or args.first_seen or args.list):
+        parser.error("specify one of --changes, --drift, --first-seen or --list")
+
+    store = ConfigStore(args.store)
+    history = StanzaHistory(store, args.mask, args.jobs)
+    history.update()
+    snapshots = history.snapshots()
+    if not snapshots:
+        parser.error(f"no snapshot in {args.store}")
+
+    if args.list:
+        for snapshot in snapshots:
+            print(snapshot)
+        return
+
+    end = history.snapshot_at(args.end) if args.end else snapshots[-1]
+    if end is None:
+        parser.error(f"--to: no snapshot at or before '{args.end}'")
+    if args.start:
+        start = history.snapshot_at(args.start)
+        if start is None:
+            parser.error(f"--from: no snapshot at or before '{args.start}'")
+    else:
+        start = default_start(history, end)
+
+    if args.changes:
+        added, removed = history.changes(args.changes, start, end)
+        print(
+            f"\n##################### {args.changes} FROM {start} TO {end} #######################"
+        )
+        print_stanzas(store, removed, "41", "-")
+        print_stanzas(store, added, "42", "+")
+    elif args.drift:
+        baseline, drifted = history.drift(start, end, args.count)
+        print(
+            f"\n##################### DRIFT FROM {start} TO {end}, {len(baseline)} BASELINE STANZAS #######################"
+        )
+        for device in sorted(drifted):
+            print(
+                f"\n\n\x1b[6;30;44m ↓ {device} lost {len(drifted[device])} baseline stanzas ↓\x1b[0m"
+            )
+            print_stanzas(store, drifted[device], "41", "-")
+    else:
+        normalizer = Normalizer(args.mask)
+        for stanza in normalizer.file_stanzas(args.first_seen):
+            if not stanza or str.isspace(stanza):
+                continue
+            # stanzas of a config start on the line after the '!'
+            if not stanza.startswith("\n"):
+                stanza = "\n" + stanza
+            first = history.first_seen(stanza_hash(stanza))
+            if first is None:
+                print("\n\x1b[6;30;44m never seen \x1b[0m")
+            else:
+                print(f"\n\x1b[6;30;44m first seen in {first[0]} \x1b[0m")
+            print(restore_bangs(stanza).strip())
+            if first is not None:
+                print("\n".join(first[1]))
+
+
+if __name__ == "__main__":
+    main()
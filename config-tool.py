@@ -40,50 +40,36 @@ CloudVision Portal
 """
 
 import pathlib
-from collections import Counter
 import re
 import argparse
+import asyncio
 import os
 from os.path import expanduser
 
+import numpy as np
 
-def search_comments(line):
-    """collect the comments
+import confmetrics
+from confgroups import Containers, device_name, match_groups, read_groups
+from confindex import StanzaIndex, TreeIndex
+from confmetrics import metrics
+from confparse import Normalizer, restore_bangs
+from confreport import (
+    print_comments,
+    print_counts,
+    print_groups,
+    print_seen,
+    print_similar,
+    print_templates,
+    print_tree_counts,
+    print_tree_specific,
+)
+from confsimilar import similar_clusters
+from confsnapshot import open_corpus, write_corpus
+from conftemplate import templates
+from confstore import ConfigStore
+from confwatch import ConfigWatch
 
-    Args:
-        line (string): line of config to search for comments
 
-    Returns:
-        list: list of lines with comments
-    """
-    regex_match = re.compile(r"^\s*!!.*", re.M)
-    re_match = re.findall(regex_match, line)
-    return list(re_match)
-
-
-def fix_ups(line):
-    """ fix any issues with the stanzas
-    Example these lines will appear as one stanza:
-
-       hostname superswitch101
-       ip name-server vrf mgmt foo.com
-       ip name-server vrf mgmt foo2.com
-       dns domain bar.com 
-    
-    If hostname is separated, the following 3 
-    lines are likely to be shared among some or 
-    all of the configs
-
-       hostname superswitch101
-       !
-       ip name-server vrf mgmt foo.com
-       ip name-server vrf mgmt foo2.com
-       dns domain bar.com 
-    """   
-    regex_match = re.compile(r"^(hostname.*)", re.M)
-    re_match = re.sub(regex_match, r"\1\n!", line)
-    return str(re_match)
-       
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -101,9 +87,10 @@ def main():
     parser.add_argument(
         "-c",
         "--count",
-        type=int,
-        default=3,
-        help="specify min count",
+        type=str,
+        nargs="+",
+        default=None,
+        help="specify min number of devices a stanza is seen in, or 'all'.\n several counts are answered from a single parse",
         required=False,
     )
     parser.add_argument(
@@ -122,118 +109,387 @@ def main():
         help="directory that contains EOS configuration files",
         required=False,
     )
+    parser.add_argument(
+        "--which",
+        type=str,
+        default="",
+        help="file with stanzas to list the devices that contain them",
+        required=False,
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default="",
+        help="SQLite file caching the parsed configuration files between runs",
+        required=False,
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default="",
+        help="config store to read the configuration files from, instead of --directory",
+        required=False,
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=str,
+        default="",
+        help="snapshot of the --store to analyze, default the latest one",
+        required=False,
+    )
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        default="",
+        help="dictionary encoded corpus file to analyze, instead of --directory, see confsnapshot.py",
+        required=False,
+    )
+    parser.add_argument(
+        "--save-corpus",
+        type=str,
+        default="",
+        help="write the configuration files loaded to a dictionary encoded corpus file",
+        required=False,
+    )
+    parser.add_argument(
+        "--similar",
+        type=float,
+        nargs="?",
+        const=0.7,
+        default=None,
+        help="cluster near-duplicate stanzas whose lines are at least this similar (Jaccard, default 0.7)",
+        required=False,
+    )
+    parser.add_argument(
+        "--templates",
+        type=int,
+        nargs="?",
+        const=2,
+        default=None,
+        metavar="MIN_DEVICES",
+        help="print stanzas that only differ in their values as templates, with the variables of each device as CSV (default in 2 or more devices)",
+        required=False,
+    )
+    parser.add_argument(
+        "-t",
+        "--tree",
+        action="store_true",
+        help="compare each line under its parent commands instead of whole stanzas",
+        required=False,
+    )
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        help="keep only stanza hashes and counts in memory, configs are read again to print them",
+        required=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse the configuration files",
+        required=False,
+    )
+    parser.add_argument(
+        "-g",
+        "--groups",
+        type=str,
+        default="",
+        help="file of 'device container' lines, stanzas common to each container and the ones above it are printed, nested containers are separated by '/'",
+        required=False,
+    )
+    parser.add_argument(
+        "--group-regex",
+        type=str,
+        action="append",
+        default=[],
+        help="regex matched against the device names, its first group or else the whole match names the container, repeat it for each level of containers",
+        required=False,
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running, follow the changes of the config directory and answer queries over HTTP",
+        required=False,
+    )
+    parser.add_argument(
+        "--listen",
+        type=str,
+        default="",
+        metavar="HOST:PORT",
+        help="address of the --watch query API, default 127.0.0.1:8700 without --socket",
+        required=False,
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default="",
+        help="Unix socket of the --watch query API",
+        required=False,
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="seconds between scans of the config directory with --watch, when inotify is not available",
+        required=False,
+    )
+    confmetrics.add_arguments(parser)
     args = parser.parse_args()
+    for count in args.count or []:
+        if count != "all" and not count.isdigit():
+            parser.error(f"--count: invalid count '{count}'")
+    if args.stream and args.which:
+        parser.error("--which is not available with --stream")
+    if args.similar is not None and (args.stream or args.tree or args.which):
+        parser.error("--stream, --tree and --which are not available with --similar")
+    if args.templates is not None and (
+        args.stream or args.tree or args.which or args.similar is not None
+    ):
+        parser.error(
+            "--stream, --tree, --which and --similar are not available with --templates"
+        )
+    if args.similar is not None and not 0 < args.similar <= 1:
+        parser.error("--similar: the similarity is between 0 and 1")
+    if args.tree and (args.stream or args.cache or args.which):
+        parser.error("--stream, --cache and --which are not available with --tree")
+    if args.groups and args.group_regex:
+        parser.error("--groups and --group-regex can't be used together")
+    grouped = bool(args.groups or args.group_regex)
+    if grouped and (
+        args.stream
+        or args.tree
+        or args.which
+        or args.similar is not None
+        or args.templates is not None
+    ):
+        parser.error(
+            "--stream, --tree, --which, --similar and --templates are not available with --groups or --group-regex"
+        )
+    if args.groups:
+        try:
+            groups = read_groups(args.groups)
+        except (OSError, ValueError) as error:
+            parser.error(f"--groups: {error}")
+    for pattern in args.group_regex:
+        try:
+            re.compile(pattern)
+        except re.error as error:
+            parser.error(f"--group-regex: invalid regex '{pattern}': {error}")
+    if args.watch and (
+        args.stream
+        or args.store
+        or args.tree
+        or args.which
+        or args.similar is not None
+        or args.templates is not None
+        or grouped
+    ):
+        parser.error(
+            "--stream, --store, --tree, --which, --similar, --templates and the groups are not available with --watch"
+        )
+    if (args.listen or args.socket) and not args.watch:
+        parser.error("--listen and --socket need --watch")
+    listen = None
+    if args.watch and (args.listen or not args.socket):
+        host, _, port = (args.listen or "127.0.0.1:8700").rpartition(":")
+        if not host or not port.isdigit():
+            parser.error(f"--listen: invalid address '{args.listen}'")
+        listen = (host, int(port))
+    if args.store and (args.stream or args.cache):
+        parser.error("--stream and --cache are not available with --store")
+    if args.corpus and (
+        args.directory or args.store or args.stream or args.cache or args.tree
+    ):
+        parser.error(
+            "--directory, --store, --stream, --cache and --tree are not available with --corpus"
+        )
+    if (args.corpus or args.save_corpus) and args.watch:
+        parser.error("--corpus and --save-corpus are not available with --watch")
+    if args.save_corpus and (args.stream or args.tree):
+        parser.error("--stream and --tree are not available with --save-corpus")
+    if args.corpus:
+        try:
+            corpus = open_corpus(args.corpus)
+        except (OSError, ValueError) as error:
+            parser.error(f"--corpus: {error}")
+        if args.mask and args.mask != corpus.mask:
+            parser.error(
+                f"--mask: {args.corpus} was written with the mask '{corpus.mask}'"
+            )
+        args.mask = corpus.mask
 
-    stanzas = []
-    device_stanzas = {}
-    common_stanzas = []
-    comments = []
-
-    home = expanduser("~")
-    if args.directory:
-        mydir = args.directory
+    confmetrics.start(args, "config-tool")
+    metrics.begin("list")
+    if args.corpus:
+        num_files = str(len(corpus.devices))
+    elif args.store:
+        store = ConfigStore(args.store)
+        snapshot = args.snapshot or store.latest()
+        if snapshot not in store.snapshots():
+            parser.error(f"--snapshot: no snapshot '{snapshot}' in {args.store}")
+        num_files = str(len(store.devices(snapshot)))
     else:
-        mydir = home + "/vs-code/config-tool/configs/"
+        home = expanduser("~")
+        if args.directory:
+            mydir = args.directory
+        else:
+            mydir = home + "/vs-code/config-tool/configs/"
 
-    num_files = str(
-        len(
-            [
-                name
-                for name in os.listdir(mydir)
-                if os.path.isfile(mydir + "/" + name)
-            ]
+        num_files = str(
+            len(
+                [
+                    name
+                    for name in os.listdir(mydir)
+                    if os.path.isfile(mydir + "/" + name)
+                    and not name.startswith(".")
+                ]
+            )
         )
-    )
 
     if args.absolute == "common":
         mincount = num_files
         maxcount = num_files
     elif args.absolute == "specific":
         maxcount = 1
-    else:
-        mincount = args.count
-        maxcount = args.count
-
-    # Series of regex statements to remove extraneous unusable config patterns
-    regex_sub_doublebang = re.compile(r"^\s*!!.*|^>.*|^end.*|", re.M)
-    regex_sub_command = re.compile(r"^\s.*Command:.*", re.M)
-    regex_sub_bang = re.compile(r"(^.\s+)!(.*)", re.M)
-    regex_sub_endbang = re.compile(r"(\w)!", re.M)
-    regex_sub_boot_system = re.compile(r"^!.*boot\ssystem.*", re.M)
-    regex_sub_comments = re.compile(r"(^\s+)#(.*)", re.M)
-    regex_sub_rancid = re.compile(r"RANCID-CONTENT-TYPE:\sarista", re.IGNORECASE)
-
-
-    for path in pathlib.Path(mydir).iterdir():
-        if path.is_file():
-            current_file = open(path, "r")
-            content = current_file.read()
-            comments += search_comments(content)
-            content = fix_ups(content)
-            subcontent = re.sub(regex_sub_doublebang, "", content)
-            subcontent = re.sub(regex_sub_rancid, "", subcontent)
-            subcontent = re.sub(regex_sub_command, "", subcontent)
-            # change any '!' with preceding whitespace to a '#'
-            # change any '!' at the end of a word to a '#' 
-            # We will change those back at the end
-            subcontent = re.sub(regex_sub_bang, r"\1#\2", subcontent)
-            subcontent = re.sub(regex_sub_endbang, r"\1#", subcontent)
-            subcontent = re.sub(regex_sub_boot_system, "", subcontent)
-            if args.mask:
-                ignore_mask = args.mask
-                regex_sub_mask = re.compile(
-                    r"(.*{}).*".format(ignore_mask), re.M | re.IGNORECASE
+
+    metrics.begin("load")
+    if args.tree:
+        # one command tree for the corpus, lines counted per parent
+        tree = TreeIndex(args.mask, args.jobs)
+        if args.store:
+            tree.load_snapshot(store, snapshot)
+        else:
+            tree.load(
+                sorted(
+                    path
+                    for path in pathlib.Path(mydir).iterdir()
+                    if path.is_file() and not path.name.startswith(".")
                 )
-                subcontent = re.sub(regex_sub_mask, r"\1 MASKED", subcontent)
+            )
+        metrics.begin("report")
+        if args.count:
+            print_tree_counts(tree, args.count, num_files)
+        elif args.absolute == "specific":
+            print_tree_specific(tree, int(maxcount))
+        else:
+            print_tree_counts(tree, ["all"], num_files)
+        print_comments(tree.comments)
+        return
 
-            stanzas += subcontent.split("!")
-            device_stanzas[path] = subcontent.split("!")
-            current_file.close()
+    # stanza hashes of every file, parsed by 'jobs' processes
+    index = StanzaIndex(args.mask, args.jobs, args.cache, args.stream)
+    if args.corpus:
+        # nothing to parse, the stanza ids are mapped from the file
+        index.load_corpus(corpus)
+    elif args.store:
+        index.load_snapshot(store, snapshot)
+    else:
+        index.load(
+            [
+                path
+                for path in pathlib.Path(mydir).iterdir()
+                if path.is_file() and not path.name.startswith(".")
+            ]
+        )
+
+    if args.save_corpus:
+        with metrics.phase("corpus.write"):
+            index.resolve(range(len(index.hashes)))
+            write_corpus(args.save_corpus, index)
+
+    if args.watch:
+        # the index stays in memory, updated one device at a time
+        metrics.begin("watch")
+        watch = ConfigWatch(index, mydir, args.interval)
+        try:
+            asyncio.run(watch.serve(listen, args.socket))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+        return
 
+    metrics.begin("report")
+    metrics.count("devices", len(index.devices))
+    metrics.count("unique_stanzas", len(index.hashes))
     # print statements for debugging/testing
-    # print(len(stanzas))
+    # print(len(index.counts))
 
     """This loop will print only stanzas
       that were seen 'min_count' or more times
     """
-    if int(maxcount) > 1:
-        for k, v in sorted(Counter(stanzas).items()):
-            #print(f"v is: {v} and k is {k}")
-            if v >= int(mincount) and v <= int(num_files):
-                # substitute the '  !' back in for the '#'
-                # used to trick the split parser earlier
-                #print(f"K is: ->{k}<-")
-                if k and not str.isspace(k):
-                  print(
-                      f'\n\n\n\n\n\x1b[6;30;44m ↓ SEEN ->({str(v)}/{num_files})<- TIMES ↓\x1b[0m'
-                  )
-                  # gah this is hacky stuff to get the "!" in correctly
-                  if not re.match("\n#", k):
-                    print("!")
-                  print(re.sub(regex_sub_comments, r"\1!\2", k).strip())
-                  print("!")
-                  print(
-                      f'\x1b[6;30;44m ↑ SEEN ->({str(v)}/{num_files})<- TIMES ↑\x1b[0m'
-                  )
+    if grouped:
+        # one reduction of the membership matrix per container level
+        if args.group_regex:
+            groups = match_groups(
+                [device_name(device) for device in index.devices],
+                args.group_regex,
+            )
+        with metrics.phase("groups"):
+            containers = Containers(index, groups)
+            containers.counts()
+        print_groups(index, containers)
+    elif args.similar is not None:
+        # MinHash and LSH over every distinct stanza of the corpus
+        stanza_ids = range(len(index.hashes))
+        index.resolve(stanza_ids)
+        with metrics.phase("similar"):
+            clusters = similar_clusters(
+                [index.texts[i] for i in stanza_ids], args.similar
+            )
+        print_similar(index, clusters, num_files)
+    elif args.templates is not None:
+        # stanzas grouped by the shape of their tokens
+        stanza_ids = range(len(index.hashes))
+        index.resolve(stanza_ids)
+        with metrics.phase("templates"):
+            found = templates([index.texts[i] for i in stanza_ids])
+        print_templates(index, found, num_files, args.templates)
+    elif args.which:
+        # devices that have each stanza of the file, from the
+        # inverted index
+        normalizer = Normalizer(args.mask)
+        for stanza in normalizer.file_stanzas(args.which):
+            if not stanza or str.isspace(stanza):
+                continue
+            # stanzas of a config start on the line after the '!'
+            if not stanza.startswith("\n"):
+                stanza = "\n" + stanza
+            stanza_id = index.lookup(stanza)
+            if stanza_id is None:
+                devices = []
+            else:
+                devices = index.devices_with(stanza_id)
+            print_seen(stanza, len(devices), num_files)
+            for device in devices:
+                print(device)
+    elif args.count:
+        print_counts(index, args.count, num_files)
+    elif int(maxcount) > 1:
+        occurrences = index.occurrences()
+        seen = np.flatnonzero(
+            (occurrences >= int(mincount)) & (occurrences <= int(num_files))
+        )
+        index.resolve(seen)
+        for k, v in sorted(
+            (index.texts[i], int(occurrences[i])) for i in seen
+        ):
+            print_seen(k, v, num_files)
     else:
-        for k, v in sorted(Counter(stanzas).items()):
-            if v > int(maxcount):
-                common_stanzas.append(k)
-        for device in device_stanzas:
+        if not args.stream:
+            occurrences = index.occurrences()
+            index.resolve(np.flatnonzero(occurrences <= int(maxcount)))
+        for device in index.devices:
             _con = []
-            for _stanza in device_stanzas[device]:
-                specific = True
-                for _common in common_stanzas:
-                    if _common == _stanza:
-                        specific = False
-                if specific:
-                    _con.append("!")
-                    _con.append(_stanza)
+            for _stanza in index.specific_texts(device, int(maxcount)):
+                _con.append("!")
+                _con.append(_stanza)
             if _con:
                 print(
                     f'\n\n\n\n\n\x1b[6;30;44m ↓ Device Specific Config for: {device} ↓\x1b[0m'
                 )
-                print(re.sub(regex_sub_comments, r"\1!\2", "".join(_con).strip()))
+                print(restore_bangs("".join(_con).strip()))
                 print(
                     f'!\n\x1b[6;30;44m ↑ Device Specific Config for: {device} ↑\x1b[0m'
                 )
@@ -243,11 +499,7 @@ def main():
 
     # Coments list for review
     # print(len(comments))
-    comments = set(comments)
-    print(
-        "\n\n##################### COMMENTS  '!!' found in corpus #######################"
-    )
-    print("\n".join(comments))
+    print_comments(index.comments)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,935 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confindex.py
+#
+"""DESCRIPTION
+Stanza index of a corpus of EOS configs
+
+Each file is normalized into a sequence of 64 bit stanza hashes,
+optionally across a pool of worker processes.  Workers only send
+the hashes back, the parent interns them to integer ids and asks
+for the text of a stanza only when it is going to be printed.
+With a parse cache, unchanged files are not parsed again.  Configs
+can also be fed from an asyncio queue as they are downloaded, read
+from a snapshot of a config store, or mapped from a dictionary
+encoded corpus file, see confsnapshot.py.
+"""
+
+import asyncio
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from confcache import ParseCache, rules_digest
+from confmetrics import metrics
+from confparse import (
+    Normalizer,
+    read_lines,
+    stanza_hash,
+    text_lines,
+    tree_lines,
+)
+
+
+# normalizer and parse cache of a worker process,
+# set up once by init_worker
+_normalizer = None
+_cache = None
+
+
+def init_worker(mask, cache=None):
+    """set up the normalizer and parse cache of a worker process, or
+    of this process when it parses itself"""
+    global _normalizer, _cache
+    _normalizer = Normalizer(mask)
+    _cache = ParseCache(cache, mask) if cache else None
+
+
+def bounded_map(executor, func, *iterables, window=8):
+    """executor.map() that takes its input as it goes
+
+    executor.map() submits every item before returning, reading
+    generators to the end, e.g. every config of a store snapshot.
+    At most window items are in flight here.
+
+    Args:
+        executor (Executor): executor the items are submitted to
+        func (callable): function of one item of each iterable
+        window (int): most items submitted and not yet yielded
+
+    Yields:
+        results of func, in order
+    """
+    pending = deque()
+    try:
+        for args in zip(*iterables):
+            pending.append(executor.submit(func, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _pool_map(jobs, mask, cache, func, *iterables):
+    """run func over the iterables, in a process pool if jobs > 1
+
+    Args:
+        jobs (int): number of worker processes
+        mask (string): mask of the workers' Normalizer
+        cache (string): parse cache of the workers, if any
+        func (callable): worker function
+
+    Yields:
+        results of func, in order
+    """
+    if jobs > 1:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=init_worker,
+            initargs=(mask, cache),
+        ) as executor:
+            yield from bounded_map(executor, func, *iterables, window=4 * jobs)
+    else:
+        init_worker(mask, cache)
+        yield from map(func, *iterables)
+
+
+def parse_file(path, keep_text=False):
+    """normalize one config file into stanza hashes
+
+    Unchanged files are read from the parse cache, if there is one
+
+    Args:
+        path (Path): config file
+        keep_text (bool): also return the text of the stanzas
+
+    Returns:
+        tuple: (path, comments, array of stanza hashes in file order,
+            dict of stanza hash to text, empty unless keep_text)
+    """
+    if _cache is not None:
+        cached = _cache.get(path)
+        if cached is not None:
+            comments, hashes = cached
+            texts = _cache.texts(hashes) if keep_text else {}
+            return path, comments, hashes, texts
+        # before parsing, a file modified meanwhile is not cached
+        stamp = _cache.stamp(path)
+    comments = []
+    hashes = array("Q")
+    texts = {}
+    # the parse cache keeps every text, only sent back if asked for
+    collect = keep_text or _cache is not None
+    for stanza in _normalizer.file_stanzas(path, comments):
+        h = stanza_hash(stanza)
+        hashes.append(h)
+        if collect:
+            texts[h] = stanza
+    if _cache is not None:
+        _cache.put(path, stamp, comments, hashes, texts)
+    return path, comments, hashes, texts if keep_text else {}
+
+
+def _parse_text(name, text):
+    """normalize a config held in memory into stanza hashes
+
+    There is no file to read the stanzas from again, so their text
+    is always returned
+
+    Args:
+        name (string): device name the config is added under
+        text (string): config text
+
+    Returns:
+        tuple: (name, comments, array of stanza hashes in config order,
+            dict of stanza hash to text), as parse_file()
+    """
+    comments = []
+    hashes = array("Q")
+    texts = {}
+    for stanza in _normalizer.text_stanzas(text, comments):
+        h = stanza_hash(stanza)
+        hashes.append(h)
+        texts[h] = stanza
+    return name, comments, hashes, texts
+
+
+def _tree_file(path):
+    """normalize one config file into nested lines
+
+    Args:
+        path (Path): config file
+
+    Returns:
+        tuple: (path, comments, list of (depth, line))
+    """
+    comments = []
+    lines = _normalizer.lines(read_lines(path), comments)
+    return path, comments, list(tree_lines(lines))
+
+
+def _file_texts(path, wanted):
+    """text of the wanted stanzas of one config file
+
+    Args:
+        path (Path): config file
+        wanted (set): stanza hashes to return the text of
+
+    Returns:
+        dict: stanza hash to text
+    """
+    texts = {}
+    for stanza in _normalizer.file_stanzas(path):
+        h = stanza_hash(stanza)
+        if h in wanted:
+            texts[h] = stanza
+    return texts
+
+
+class StanzaIndex:
+    """stanzas of a corpus of configs, interned to integer ids
+
+    Stanzas are interned through their content hash, every device is
+    kept as the array of its stanza ids in file order.  Membership is
+    a boolean devices x stanzas matrix, stored sparse (CSR) because
+    most stanzas are only in a handful of devices.
+
+    In streaming mode only the stanza hashes and their counts stay in
+    memory, the stanzas of a device are read again from its file when
+    they are needed and there is no membership matrix.
+
+    Attributes:
+        ids (dict): stanza hash to stanza id
+        hashes (array): stanza id to stanza hash
+        devices (dict): config file to array of its stanza ids,
+            None in streaming mode
+        texts (dict): stanza id to text, for the stanzas resolved
+        comments (list): '!!' comments found in the corpus
+    """
+
+    def __init__(self, mask="", jobs=1, cache=None, stream=False):
+        self.mask = mask
+        self.jobs = jobs
+        self.cache = cache
+        self.stream = stream
+        self.store = None
+        self.corpus = None
+        self.normalizer = Normalizer(mask)
+        self.ids = {}
+        self.hashes = array("Q")
+        self.devices = {}
+        self.texts = {}
+        self.comments = []
+        # config file to its comments, to drop them when it's replaced
+        self._device_comments = {}
+        self._membership = None
+        self._inverted = None
+        self._occurrences = None
+        # streaming mode counts, per stanza id
+        self._occurrence_counts = array("I")
+        self._device_counts = array("I")
+        self._first_device = array("I")
+
+    def _map(self, func, *iterables):
+        """run func over the iterables, in a process pool if jobs > 1"""
+        return _pool_map(self.jobs, self.mask, self.cache, func, *iterables)
+
+    def intern(self, h):
+        """id of a stanza hash, a new id is given to unseen stanzas"""
+        stanza_id = self.ids.get(h)
+        if stanza_id is None:
+            stanza_id = self.ids[h] = len(self.hashes)
+            self.hashes.append(h)
+        return stanza_id
+
+    def add(self, path, comments, hashes, texts):
+        """add the parsed stanza hashes of one config file, a file
+        already in the index is replaced"""
+        intern = self.intern
+        metrics.count("index.files")
+        metrics.count("index.stanzas", len(hashes))
+        self._drop_comments(path)
+        if comments:
+            self.comments += comments
+            self._device_comments[path] = comments
+        ids = array("I", [intern(h) for h in hashes])
+        if self.stream:
+            self._count(ids)
+            self.devices[path] = None
+        else:
+            self.devices[path] = ids
+        for h, text in texts.items():
+            self.texts[self.ids[h]] = text
+        self._membership = None
+        self._inverted = None
+        self._occurrences = None
+
+    def remove(self, path):
+        """drop a config file from the index, e.g. once deleted
+
+        Its stanza ids stay interned, seen in no device
+        """
+        if self.stream:
+            raise ValueError("devices can't be removed in streaming mode")
+        del self.devices[path]
+        self._drop_comments(path)
+        self._membership = None
+        self._inverted = None
+        self._occurrences = None
+
+    def _drop_comments(self, path):
+        """drop the comments of a config file from the corpus comments"""
+        dropped = Counter(self._device_comments.pop(path, ()))
+        if dropped:
+            comments = []
+            for comment in self.comments:
+                if dropped[comment]:
+                    dropped[comment] -= 1
+                else:
+                    comments.append(comment)
+            self.comments = comments
+
+    def prune_texts(self):
+        """drop the text of the stanzas no device has any more, e.g.
+        after files were replaced or removed
+
+        Returns:
+            int: number of texts dropped
+        """
+        occurrences = self.occurrences()
+        unused = [i for i in self.texts if not occurrences[i]]
+        for i in unused:
+            del self.texts[i]
+        return len(unused)
+
+    def _count(self, ids):
+        """streaming mode, count the stanzas of the device being added"""
+        new = len(self.hashes) - len(self._occurrence_counts)
+        if new:
+            self._occurrence_counts.extend([0] * new)
+            self._device_counts.extend([0] * new)
+            self._first_device.extend([len(self.devices)] * new)
+        occurrence_counts = self._occurrence_counts
+        for i in ids:
+            occurrence_counts[i] += 1
+        device_counts = self._device_counts
+        for i in set(ids):
+            device_counts[i] += 1
+
+    def device_ids(self, device):
+        """stanza ids of a device, in file order
+
+        Args:
+            device (Path): config file
+
+        Returns:
+            array: stanza ids
+        """
+        ids = self.devices[device]
+        if ids is None:
+            ids = array(
+                "I",
+                [
+                    self.ids[stanza_hash(stanza)]
+                    for stanza in self.normalizer.file_stanzas(device)
+                ],
+            )
+        return ids
+
+    def load(self, paths):
+        """parse config files into the index
+
+        With a single job and no parse cache the text of every
+        stanza is kept as it is parsed, otherwise it is fetched
+        by resolve()
+
+        Args:
+            paths (list): config files
+        """
+        keep_text = self.jobs <= 1 and not self.cache and not self.stream
+        with metrics.phase("index.load"):
+            for result in self._map(
+                parse_file, paths, [keep_text] * len(paths)
+            ):
+                self.add(*result)
+
+    def load_snapshot(self, store, snapshot, devices=None):
+        """load the devices of a config store snapshot into the index
+
+        Devices whose config was already parsed with the same rules
+        and mask, in this snapshot or any other, are not parsed again,
+        the others are parsed and their stanzas kept in the store
+
+        Args:
+            store (ConfigStore): config store
+            snapshot (string): snapshot name
+            devices (list): device names, every device if None
+        """
+        with metrics.phase("index.load"):
+            self._load_snapshot(store, snapshot, devices)
+
+    def _load_snapshot(self, store, snapshot, devices):
+        self.store = store
+        rules = rules_digest(self.mask)
+        manifests = store.manifests(snapshot, devices)
+        results = {}
+        for device, (digest, _) in manifests.items():
+            parsed = store.parsed(digest, rules)
+            if parsed is not None:
+                results[device] = (device, *parsed, {})
+        todo = [device for device in manifests if device not in results]
+        metrics.count("store.parsed_hits", len(results))
+        metrics.count("store.parsed_misses", len(todo))
+        configs = (
+            data.decode("utf-8") for _, data in store.configs(snapshot, todo)
+        )
+        for result in self._map(_parse_text, todo, configs):
+            device, comments, hashes, texts = result
+            store.put_parsed(
+                manifests[device][0], rules, comments, hashes, texts
+            )
+            results[device] = result
+        for device in manifests:
+            self.add(*results[device])
+
+    def load_corpus(self, corpus, devices=None):
+        """load the devices of a dictionary encoded corpus
+
+        Nothing is parsed: the stanza ids of the index are the ones of
+        the corpus and the stanza ids of each device are a view of the
+        mapped file, the text of a stanza is decoded by resolve()
+
+        Args:
+            corpus (Corpus): corpus opened from a snapshot file
+            devices (list): device names, every device if None
+
+        Raises:
+            ValueError: the index isn't empty, is in streaming mode
+                or a device isn't in the corpus
+        """
+        if self.devices or self.hashes or self.stream:
+            raise ValueError("a corpus can only be loaded into an empty index")
+        with metrics.phase("index.load"):
+            numbers = {name: n for n, name in enumerate(corpus.devices)}
+            if devices is None:
+                devices = corpus.devices
+            unknown = [device for device in devices if device not in numbers]
+            if unknown:
+                raise ValueError(f"not in the corpus: {', '.join(unknown)}")
+            self.corpus = corpus
+            self.hashes = array("Q", corpus.stanza_hashes.tobytes())
+            self.ids = dict(zip(self.hashes, range(len(self.hashes))))
+            for device in devices:
+                self.devices[device] = corpus.device_stanza_ids(numbers[device])
+            self.comments += corpus.comments
+            metrics.count("index.files", len(self.devices))
+
+    async def consume(self, queue):
+        """add the configs put on an asyncio queue as they arrive
+
+        Configs are parsed by 'jobs' worker processes, or a worker
+        thread with a single job, while the event loop goes on
+        fetching the next ones.  Their text is kept, there is no file
+        to read it from again.
+
+        Args:
+            queue (asyncio.Queue): (device name, config text) tuples,
+                None once there are no more configs
+        """
+        loop = asyncio.get_running_loop()
+        if self.jobs > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                initializer=init_worker,
+                initargs=(self.mask,),
+            )
+        else:
+            executor = ThreadPoolExecutor(
+                max_workers=1, initializer=init_worker, initargs=(self.mask,)
+            )
+        pending = set()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                pending.add(loop.run_in_executor(executor, _parse_text, *item))
+                if len(pending) >= self.jobs:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        self.add(*future.result())
+            for future in asyncio.as_completed(pending):
+                self.add(*await future)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def resolve(self, stanza_ids):
+        """make sure the text of the stanzas is in self.texts
+
+        Each missing stanza is decoded from the corpus, looked up in
+        the config store or the parse cache, or else read from the
+        first config file that contains it
+
+        Args:
+            stanza_ids (iterable): stanza ids
+        """
+        with metrics.phase("index.resolve"):
+            self._resolve(stanza_ids)
+
+    def _resolve(self, stanza_ids):
+        missing = {int(i) for i in stanza_ids if i not in self.texts}
+        metrics.count("index.resolved", len(missing))
+        if missing and self.corpus is not None:
+            known = len(self.corpus.stanza_hashes)
+            for i in missing:
+                if i < known:
+                    self.texts[i] = self.corpus.stanza(i)
+            missing = {i for i in missing if i not in self.texts}
+        if missing and self.store is not None:
+            for h, text in self.store.texts(
+                self.hashes[i] for i in missing
+            ).items():
+                self.texts[self.ids[h]] = text
+            missing = {i for i in missing if i not in self.texts}
+        if missing and self.cache:
+            cached = ParseCache(self.cache, self.mask).texts(
+                self.hashes[i] for i in missing
+            )
+            for h, text in cached.items():
+                self.texts[self.ids[h]] = text
+            missing = {i for i in missing if i not in self.texts}
+        if not missing:
+            return
+        wanted = {}
+        if self.stream:
+            paths = list(self.devices)
+            for i in missing:
+                path = paths[self._first_device[i]]
+                wanted.setdefault(path, set()).add(self.hashes[i])
+        for path, device_ids in self.devices.items():
+            if not missing or self.stream:
+                break
+            found = missing.intersection(device_ids)
+            if found:
+                wanted[path] = {self.hashes[i] for i in found}
+                missing -= found
+        for texts in self._map(_file_texts, wanted, wanted.values()):
+            for h, text in texts.items():
+                self.texts[self.ids[h]] = text
+
+    def membership(self):
+        """devices x stanzas boolean matrix in CSR form
+
+        Returns:
+            tuple: (indptr, indices) numpy arrays, the stanza ids of
+                device n are indices[indptr[n]:indptr[n + 1]]
+        """
+        if self.stream:
+            raise ValueError("no membership matrix in streaming mode")
+        if self._membership is None:
+            with metrics.phase("index.membership"):
+                self._membership = self._build_membership()
+        return self._membership
+
+    def _build_membership(self):
+        rows = [
+            np.unique(np.frombuffer(ids, dtype=np.uint32))
+            for ids in self.devices.values()
+        ]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=indptr[1:])
+        if rows:
+            indices = np.concatenate(rows)
+        else:
+            indices = np.zeros(0, dtype=np.uint32)
+        return indptr, indices
+
+    def inverted(self):
+        """stanzas x devices inverted index in CSR form
+
+        Returns:
+            tuple: (indptr, devices) numpy arrays, the numbers of the
+                devices holding stanza n are devices[indptr[n]:indptr[n + 1]]
+        """
+        if self._inverted is None:
+            indptr, indices = self.membership()
+            rows = np.repeat(
+                np.arange(len(self.devices), dtype=np.uint32),
+                np.diff(indptr),
+            )
+            order = np.argsort(indices, kind="stable")
+            stanza_ptr = np.zeros(len(self.hashes) + 1, dtype=np.int64)
+            np.cumsum(self.device_counts(), out=stanza_ptr[1:])
+            self._inverted = stanza_ptr, rows[order]
+        return self._inverted
+
+    def lookup(self, stanza):
+        """id of a normalized stanza, None if no device has it"""
+        return self.ids.get(stanza_hash(stanza))
+
+    def __contains__(self, stanza):
+        return self.lookup(stanza) is not None
+
+    def devices_with(self, stanza_id):
+        """config files that contain a stanza
+
+        Args:
+            stanza_id (int): stanza id
+
+        Returns:
+            list: config files, in the order they were loaded
+        """
+        indptr, devices = self.inverted()
+        paths = list(self.devices)
+        return [
+            paths[n] for n in devices[indptr[stanza_id]:indptr[stanza_id + 1]]
+        ]
+
+    def occurrences(self):
+        """number of times each stanza id was seen in the corpus"""
+        if self.stream:
+            return np.array(self._occurrence_counts, dtype=np.int64)
+        if self._occurrences is None:
+            if self.devices:
+                ids = np.concatenate(
+                    [
+                        np.frombuffer(ids, dtype=np.uint32)
+                        for ids in self.devices.values()
+                    ]
+                )
+            else:
+                ids = np.zeros(0, dtype=np.uint32)
+            self._occurrences = np.bincount(ids, minlength=len(self.hashes))
+        return self._occurrences
+
+    def specific(self, device, maxcount=1):
+        """stanzas of a device seen maxcount times or less in the corpus
+
+        Args:
+            device (Path): config file
+            maxcount (int): most times a stanza is seen to be specific
+
+        Returns:
+            array: stanza ids, in file order
+        """
+        ids = np.frombuffer(self.device_ids(device), dtype=np.uint32)
+        return ids[self.occurrences()[ids] <= maxcount]
+
+    def specific_texts(self, device, maxcount=1):
+        """text of the specific stanzas of a device, see specific()
+
+        Outside of streaming mode the stanzas must be resolved first
+
+        Yields:
+            string: stanzas, in file order
+        """
+        if not self.stream:
+            for i in self.specific(device, maxcount):
+                yield self.texts[i]
+            return
+        occurrence_counts = self._occurrence_counts
+        for stanza in self.normalizer.file_stanzas(device):
+            if occurrence_counts[self.ids[stanza_hash(stanza)]] <= maxcount:
+                yield stanza
+
+    def device_counts(self):
+        """number of devices each stanza id was seen in"""
+        if self.stream:
+            return np.array(self._device_counts, dtype=np.int64)
+        indices = self.membership()[1]
+        return np.bincount(indices, minlength=len(self.hashes))
+
+    def seen_in(self, count):
+        """ids of the stanzas seen in count or more devices"""
+        return np.flatnonzero(self.device_counts() >= count)
+
+    def common(self):
+        """ids of the stanzas seen in every device"""
+        return self.seen_in(len(self.devices))
+
+    def unique(self):
+        """ids of the stanzas seen in a single device"""
+        return np.flatnonzero(self.device_counts() == 1)
+
+
+class LineIndex:
+    """occurrences of config lines across a set of files
+
+    Built once from the lines of every file, each line maps to the
+    number of times it was seen and a bitmask of the files it is in.
+
+    Attributes:
+        files (list): the files, file n is bit n of the masks
+        lines (dict): line to [count, mask]
+    """
+
+    def __init__(self):
+        self.files = []
+        self.lines = {}
+
+    def add(self, file, lines):
+        """add the lines of one file
+
+        Args:
+            file: name of the file
+            lines (iterable): its lines
+        """
+        bit = 1 << len(self.files)
+        self.files.append(file)
+        index = self.lines
+        for line in lines:
+            entry = index.get(line)
+            if entry is None:
+                index[line] = [1, bit]
+            else:
+                entry[0] += 1
+                entry[1] |= bit
+
+    def count(self, line):
+        """number of times a line was seen"""
+        entry = self.lines.get(line)
+        return entry[0] if entry else 0
+
+    def mask(self, line):
+        """bitmask of the files a line is in"""
+        entry = self.lines.get(line)
+        return entry[1] if entry else 0
+
+    def files_in(self, mask):
+        """files of a bitmask"""
+        return [
+            file for n, file in enumerate(self.files) if mask >> n & 1
+        ]
+
+
+class PathNode:
+    """a command under its chain of parent commands
+
+    Nodes form one tree for the whole corpus: the devices that have
+    the same line under the same parents share the node.
+
+    Attributes:
+        line (int): line id
+        parent (int): path id of the parent node, None for the root
+        children (dict): line id to path id of the child nodes
+    """
+
+    __slots__ = ("line", "parent", "children")
+
+    def __init__(self, line, parent):
+        self.line = line
+        self.parent = parent
+        self.children = {}
+
+
+class TreeIndex:
+    """configs as paths of a command tree shared by the corpus
+
+    Unlike StanzaIndex, a block that differs in one child line from
+    the same block on other devices only differs in that line: each
+    line is counted under its own parent path.  Every device is kept
+    as the array of its path ids in config order.
+
+    Attributes:
+        lines (list): line id to line, with its indentation
+        line_ids (dict): line to line id
+        nodes (list): path id to PathNode, path 0 is the root
+        devices (dict): config file to array of its path ids
+        comments (list): '!!' comments found in the corpus
+    """
+
+    def __init__(self, mask="", jobs=1):
+        self.mask = mask
+        self.jobs = jobs
+        self.lines = []
+        self.line_ids = {}
+        self.nodes = [PathNode(None, None)]
+        self.devices = {}
+        self.comments = []
+        self._device_counts = None
+
+    def add(self, device, comments, lines):
+        """add the nested lines of one config
+
+        Args:
+            device: device name or config file
+            comments (list): its '!!' comments
+            lines (iterable): (depth, line) tuples, see tree_lines()
+        """
+        line_ids = self.line_ids
+        nodes = self.nodes
+        metrics.count("tree.files")
+        self.comments += comments
+        # path ids of the current parents, by depth
+        stack = [0]
+        ids = array("I")
+        for depth, line in lines:
+            del stack[depth + 1:]
+            line_id = line_ids.get(line)
+            if line_id is None:
+                line_id = line_ids[line] = len(self.lines)
+                self.lines.append(line)
+            children = nodes[stack[-1]].children
+            path_id = children.get(line_id)
+            if path_id is None:
+                path_id = children[line_id] = len(nodes)
+                nodes.append(PathNode(line_id, stack[-1]))
+            ids.append(path_id)
+            stack.append(path_id)
+        self.devices[device] = ids
+        self._device_counts = None
+
+    def load(self, paths):
+        """parse config files into the tree
+
+        Args:
+            paths (list): config files, sorted so that children are
+                kept in the order of the first config that has them
+        """
+        with metrics.phase("tree.load"):
+            for result in _pool_map(self.jobs, self.mask, None, _tree_file, paths):
+                self.add(*result)
+
+    def load_snapshot(self, store, snapshot, devices=None):
+        """load the devices of a config store snapshot into the tree
+
+        Args:
+            store (ConfigStore): config store
+            snapshot (string): snapshot name
+            devices (list): device names, every device if None
+        """
+        normalizer = Normalizer(self.mask)
+        with metrics.phase("tree.load"):
+            for device, data in store.configs(snapshot, devices):
+                comments = []
+                lines = normalizer.lines(
+                    text_lines(data.decode("utf-8")), comments
+                )
+                self.add(device, comments, tree_lines(lines))
+
+    def device_counts(self):
+        """number of devices each path id was seen in"""
+        if self._device_counts is None:
+            with metrics.phase("tree.counts"):
+                if self.devices:
+                    ids = np.concatenate(
+                        [
+                            np.unique(np.frombuffer(ids, dtype=np.uint32))
+                            for ids in self.devices.values()
+                        ]
+                    )
+                else:
+                    ids = np.zeros(0, dtype=np.uint32)
+                self._device_counts = np.bincount(
+                    ids, minlength=len(self.nodes)
+                )
+        return self._device_counts
+
+    def line(self, path_id):
+        """line of a path id"""
+        return self.lines[self.nodes[path_id].line]
+
+    def ancestors(self, path_id):
+        """path ids of the parents of a node, outermost first"""
+        chain = []
+        parent = self.nodes[path_id].parent
+        while parent:
+            chain.append(parent)
+            parent = self.nodes[parent].parent
+        return chain[::-1]
+
+    def common_blocks(self, count):
+        """top level commands seen in count or more devices, with
+        their children seen in count or more devices
+
+        Each node is visited at most once and the children below the
+        count are not visited, so this is linear in the tree size
+
+        Args:
+            count (int): minimum number of devices
+
+        Returns:
+            list: (lines, number of devices of the top level command)
+                tuples, in tree order
+        """
+        device_counts = self.device_counts()
+        nodes = self.nodes
+        blocks = []
+        for top in nodes[0].children.values():
+            if device_counts[top] < count:
+                continue
+            lines = []
+            pending = [top]
+            while pending:
+                path_id = pending.pop()
+                lines.append(self.lines[nodes[path_id].line])
+                pending.extend(
+                    child
+                    for child in reversed(list(nodes[path_id].children.values()))
+                    if device_counts[child] >= count
+                )
+            blocks.append((lines, int(device_counts[top])))
+        return blocks
+
+    def specific_lines(self, device, maxcount=1):
+        """lines of a device seen in maxcount devices or less, under
+        their parent commands
+
+        Args:
+            device: device name or config file
+            maxcount (int): most devices a line is seen in to be specific
+
+        Returns:
+            list: blocks, lists of lines, in config order
+        """
+        device_counts = self.device_counts()
+        blocks = []
+        shown = set()
+        for path_id in self.devices[device]:
+            if device_counts[path_id] > maxcount or path_id in shown:
+                continue
+            chain = self.ancestors(path_id)
+            if not chain or chain[0] not in shown:
+                blocks.append([])
+            for parent in chain:
+                if parent not in shown:
+                    shown.add(parent)
+                    blocks[-1].append(self.line(parent))
+            shown.add(path_id)
+            blocks[-1].append(self.line(path_id))
+        return blocks
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confmetrics.py
+#
+"""DESCRIPTION
+Phase timings, counters, gauges and latency histograms for the tools
+
+One Metrics object per process, confmetrics.metrics, that the tools
+and the modules they use record into.  It costs a clock read per
+phase or sample, never per config line, so it is always on;
+--metrics-json writes it out and --profile adds a cProfile dump of
+the run.  Work done in --jobs worker processes is timed as a whole
+by the parent.
+"""
+
+import atexit
+import bisect
+import cProfile
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# upper bounds, in seconds, of the histogram buckets
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, float("inf"),
+)
+
+
+class Histogram:
+    """fixed bucket histogram of durations
+
+    Attributes:
+        counts (list): samples per bucket of BUCKETS
+        count (int): number of samples
+        total (float): sum of the samples
+    """
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """upper bound of the bucket holding the q quantile"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                str(bound): count
+                for bound, count in zip(BUCKETS, self.counts)
+                if count
+            },
+        }
+
+
+class Gauge:
+    """last, lowest and highest value of a level, e.g. a limit
+
+    Attributes:
+        last (float): last value set
+        min (float): lowest value set
+        max (float): highest value set
+        count (int): number of values set
+    """
+
+    def __init__(self, value):
+        self.last = self.min = self.max = value
+        self.count = 1
+
+    def set(self, value):
+        self.last = value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.count += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "last": self.last,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """timings, counters, gauges and histograms of one run
+
+    Phases are wall clock timers, a phase run several times adds up
+    and phases may nest, e.g. 'index.resolve' inside 'report'.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._current = None
+        # confgrabber's thread engine records from many threads
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """time a block as a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def begin(self, name):
+        """end the current top level phase and start the next one"""
+        self.end()
+        self._current = (name, time.perf_counter())
+
+    def end(self):
+        """end the current top level phase, if any"""
+        if self._current is not None:
+            name, start = self._current
+            self.add_time(name, time.perf_counter() - start)
+            self._current = None
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        """set the current value of a level, not a duration"""
+        with self._lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                self.gauges[name] = Gauge(value)
+            else:
+                gauge.set(value)
+
+    def observe(self, name, seconds):
+        """add a sample, in seconds, to a histogram"""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def to_dict(self):
+        return {
+            "wall_seconds": time.perf_counter() - self.start,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "gauges": {
+                name: gauge.to_dict() for name, gauge in self.gauges.items()
+            },
+            "histograms": {
+                name: histogram.to_dict()
+                for name, histogram in self.histograms.items()
+            },
+        }
+
+    def summary(self, out=sys.stderr):
+        """print the phases, counters, gauges and histograms, for humans"""
+        data = self.to_dict()
+        print(f"\n##### {data['wall_seconds']:.3f}s wall, "
+              f"{data['max_rss_kb']} kB max RSS #####", file=out)
+        for name, seconds in data["phases"].items():
+            print(f"phase {name:<28} {seconds:10.3f}s", file=out)
+        for name, value in data["counters"].items():
+            print(f"count {name:<28} {value:10}", file=out)
+        for name, gauge in data["gauges"].items():
+            print(
+                f"gauge {name:<28} last={gauge['last']:g} "
+                f"min={gauge['min']:g} max={gauge['max']:g}",
+                file=out,
+            )
+        for name, histogram in data["histograms"].items():
+            print(
+                f"histo {name:<28} n={histogram['count']} "
+                f"p50={histogram['p50']:.3f}s p90={histogram['p90']:.3f}s "
+                f"p99={histogram['p99']:.3f}s max={histogram['max']:.3f}s",
+                file=out,
+            )
+
+
+metrics = Metrics()
+
+
+def add_arguments(parser):
+    """add --profile and --metrics-json to a tool's arguments"""
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default="",
+        help="write a cProfile dump of the run to this file, and print the phase timings to stderr",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-json",
+        type=str,
+        default="",
+        help="write the phase timings, counters and histograms of the run to this JSON file",
+        required=False,
+    )
+
+
+def start(args, tool):
+    """start profiling as asked by the arguments
+
+    The metrics are written out when the process exits
+
+    Args:
+        args (Namespace): parsed arguments, see add_arguments()
+        tool (string): name of the tool, recorded in the JSON
+    """
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        metrics.end()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            metrics.summary()
+        if args.metrics_json:
+            data = metrics.to_dict()
+            data["tool"] = tool
+            with open(args.metrics_json, "w") as writer:
+                json.dump(data, writer, indent=1)
+
+    if args.profile or args.metrics_json:
+        atexit.register(finish)
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# confparse.py
+#
+"""DESCRIPTION
+Shared normalization engine for config-tool.py and config-differ.py
+
+EOS configs are normalized in a single pass over their lines and
+split into '!' delimited stanzas.  The rules are the same ones the
+tools used to apply as a series of re.sub() calls over the whole file:
+
+  - lines starting with '!!' (and any blank lines before them),
+    '>' or 'end' are blanked, '!!' lines are collected as comments
+  - the RANCID content type marker is removed
+  - 'Command:' header lines are removed
+  - '!' markers that are not stanza delimiters are swapped to '#'
+  - '! boot system' lines are removed
+  - the optional mask is applied
+  - 'hostname' gets a stanza of its own
+"""
+
+import io
+import re
+from hashlib import blake2b
+
+
+regex_sub_rancid = re.compile(r"RANCID-CONTENT-TYPE:\sarista", re.IGNORECASE)
+regex_sub_endbang = re.compile(r"(\w)!")
+regex_sub_boot_system = re.compile(r"^!.*boot\ssystem")
+regex_sub_comments = re.compile(r"(^\s+)#(.*)", re.M)
+
+
+def restore_bangs(stanza):
+    """substitute the '!' back in for the '#'
+    used to trick the split parser
+
+    Args:
+        stanza (string): normalized stanza
+
+    Returns:
+        string: stanza as it should be printed
+    """
+    return re.sub(regex_sub_comments, r"\1!\2", stanza)
+
+
+def stanza_hash(stanza):
+    """content hash of a normalized stanza
+
+    The hash is stable between processes and runs, unlike hash()
+
+    Args:
+        stanza (string): normalized stanza
+
+    Returns:
+        int: 64 bit hash of the stanza
+    """
+    return int.from_bytes(
+        blake2b(stanza.encode(), digest_size=8).digest(), "big"
+    )
+
+
+def iter_lines(stream):
+    """split an open text stream into lines
+
+    Args:
+        stream (iterable): text stream, in universal newlines mode
+
+    Yields:
+        string: lines without their line ending, the last line is
+            empty if the stream ends with a newline
+    """
+    tail = ""
+    for line in stream:
+        if line[-1:] == "\n":
+            yield line[:-1]
+            tail = ""
+        else:
+            tail = line
+    yield tail
+
+
+def read_lines(path):
+    """read a config file line by line
+
+    Args:
+        path (string): path of the config file
+
+    Yields:
+        string: lines without their line ending, see iter_lines()
+    """
+    with open(path, "r") as current_file:
+        yield from iter_lines(current_file)
+
+
+def text_lines(text):
+    """lines of a config held in memory, split as read_lines() would
+
+    Args:
+        text (string): config text
+
+    Yields:
+        string: lines without their line ending, see iter_lines()
+    """
+    return iter_lines(io.StringIO(text, newline=None))
+
+
+def _with_hostname_stanza(lines):
+    """fix any issues with the stanzas
+    Example these lines will appear as one stanza:
+
+       hostname superswitch101
+       ip name-server vrf mgmt foo.com
+       ip name-server vrf mgmt foo2.com
+       dns domain bar.com
+
+    If hostname is separated, the following 3
+    lines are likely to be shared among some or
+    all of the configs
+
+       hostname superswitch101
+       !
+       ip name-server vrf mgmt foo.com
+       ip name-server vrf mgmt foo2.com
+       dns domain bar.com
+    """
+    for line in lines:
+        yield line
+        if line.startswith("hostname"):
+            yield "!"
+
+
+def tree_lines(lines):
+    """nesting depth of normalized config lines
+
+    A line is the child of the closest line above it that is less
+    indented.  Banner text is kept under its 'banner' command, up to
+    and including its 'EOF' line.  Blank lines, '!' separators and
+    top level comments, '!' or the '#' they are normalized to, are
+    dropped.
+
+    Args:
+        lines (iterable): normalized config lines
+
+    Yields:
+        tuple: (depth, line), depth 0 for top level commands
+    """
+    indents = []
+    in_banner = False
+    for line in lines:
+        if in_banner:
+            yield 1, line
+            in_banner = line != "EOF"
+            continue
+        stripped = line.strip()
+        if not stripped or stripped in ("!", "#"):
+            continue
+        indent = len(line) - len(line.lstrip())
+        if not indent and line[0] in "!#":
+            continue
+        while indents and indents[-1] >= indent:
+            indents.pop()
+        yield len(indents), line
+        indents.append(indent)
+        if not indent and stripped.startswith("banner "):
+            in_banner = True
+
+
+class Normalizer:
+    """single pass EOS config normalizer
+
+    The mask regex is compiled once, share one Normalizer
+    between all the files of a run.
+
+    Args:
+        mask (string): optional string to ignore, the rest of any
+            line containing it is replaced with 'MASKED'
+    """
+
+    def __init__(self, mask=""):
+        self.mask = mask
+        if mask:
+            self.regex_sub_mask = re.compile(
+                r"(.*{}).*".format(mask), re.IGNORECASE
+            )
+            # cheap search first, the sub backtracks on every line
+            self.regex_search_mask = re.compile(mask, re.IGNORECASE)
+        else:
+            self.regex_sub_mask = None
+            self.regex_search_mask = None
+
+    def lines(self, lines, comments=None):
+        """normalize config lines
+
+        Args:
+            lines (iterable): config lines without line endings
+            comments (list): optional list the '!!' comments are
+                appended to
+
+        Yields:
+            string: normalized lines
+        """
+        regex_sub_mask = self.regex_sub_mask
+        regex_search_mask = self.regex_search_mask
+        # whitespace only lines, swallowed if a '!!' line follows
+        blanks = []
+        # previous line is empty, a 'Command:' line after it is dropped
+        prev_empty = False
+        # a one character line and whitespace since, the next
+        # non-whitespace character is swapped if it is a '!'
+        bang_pending = False
+
+        for line in _with_hostname_stanza(lines):
+            stripped = line.lstrip()
+            if not stripped:
+                blanks.append(line)
+                continue
+            if stripped.startswith("!!"):
+                if comments is not None:
+                    comments.append("\n".join(blanks + [line]))
+                blanks = []
+                line = stripped = ""
+            else:
+                for blank in blanks:
+                    prev_empty = not blank
+                    if blank:
+                        bang_pending = True
+                    if regex_sub_mask is not None:
+                        blank = regex_sub_mask.sub(r"\1 MASKED", blank)
+                    yield blank
+                blanks = []
+                if line[0] == ">" or line.startswith("end"):
+                    line = stripped = ""
+
+            if ":" in line:
+                if "ANCID" in line.upper():
+                    line = regex_sub_rancid.sub("", line)
+                    stripped = line.lstrip()
+                if "Command:" in line:
+                    if prev_empty:
+                        # the empty line is where the match starts,
+                        # the two lines collapse into the empty one
+                        prev_empty = False
+                        continue
+                    if line[0].isspace():
+                        line = stripped = ""
+                    prev_empty = False
+                else:
+                    prev_empty = not line
+            else:
+                prev_empty = not line
+
+            # change any '!' with preceding whitespace to a '#'
+            if bang_pending:
+                if stripped:
+                    bang_pending = False
+                    if stripped[0] == "!":
+                        i = len(line) - len(stripped)
+                        line = line[:i] + "#" + line[i + 1:]
+                        stripped = ""
+            elif line and not stripped:
+                bang_pending = True
+            if stripped:
+                if line[0].isspace():
+                    rest = stripped
+                    gap = len(line) - len(stripped) - 1
+                elif len(line) > 1 and line[1].isspace():
+                    rest = line[1:].lstrip()
+                    gap = 1
+                elif len(line) == 1:
+                    rest = ""
+                    gap = 0
+                else:
+                    rest = None
+                if rest == "":
+                    bang_pending = True
+                elif rest and gap > 0 and rest[0] == "!":
+                    i = len(line) - len(rest)
+                    line = line[:i] + "#" + line[i + 1:]
+
+            if "!" in line:
+                # change any '!' at the end of a word to a '#'
+                line = regex_sub_endbang.sub(r"\1#", line)
+                if line[0] == "!" and regex_sub_boot_system.match(line):
+                    line = ""
+            if regex_sub_mask is not None and regex_search_mask.search(line):
+                line = regex_sub_mask.sub(r"\1 MASKED", line)
+            yield line
+
+        for blank in blanks:
+            if regex_sub_mask is not None:
+                blank = regex_sub_mask.sub(r"\1 MASKED", blank)
+            yield blank
+
+    def stanzas(self, lines, comments=None):
+        """normalize config lines and split them into stanzas
+
+        Args:
+            lines (iterable): config lines without line endings
+            comments (list): optional list the '!!' comments are
+                appended to
+
+        Yields:
+            string: the '!' separated stanzas
+        """
+        current = []
+        first = True
+        for line in self.lines(lines, comments):
+            if not first:
+                line = "\n" + line
+            first = False
+            if "!" in line:
+                parts = line.split("!")
+                current.append(parts[0])
+                yield "".join(current)
+                for part in parts[1:-1]:
+                    yield part
+                current = [parts[-1]]
+            else:
+                current.append(line)
+        yield "".join(current)
+
+    def file_stanzas(self, path, comments=None):
+        """generator of the stanzas of one config file
+
+        Args:
+            path (string): path of the config file
+            comments (list): optional list the '!!' comments are
+                appended to
+
+        Yields:
+            string: the '!' separated stanzas
+        """
+        return self.stanzas(read_lines(path), comments)
+
+    def text_stanzas(self, text, comments=None):
+        """generator of the stanzas of a config held in memory
+
+        Args:
+            text (string): config text, e.g. as fetched from a device
+            comments (list): optional list the '!!' comments are
+                appended to
+
+        Yields:
+            string: the '!' separated stanzas
+        """
+        return self.stanzas(text_lines(text), comments)
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confreport.py
+#
+"""DESCRIPTION
+Report printing shared by config-tool.py and the analyze mode of
+confgrabber.py
+"""
+
+import csv
+import re
+import sys
+
+import numpy as np
+
+from confparse import restore_bangs
+from confsimilar import stanza_lines
+
+
+def print_seen(stanza, seen, num_files):
+    """print a stanza between its SEEN banners
+
+    Args:
+        stanza (string): normalized stanza
+        seen (int): number of times the stanza was seen
+        num_files (string): number of files in the corpus
+    """
+    if stanza and not str.isspace(stanza):
+        print(
+            f'\n\n\n\n\n\x1b[6;30;44m ↓ SEEN ->({str(seen)}/{num_files})<- TIMES ↓\x1b[0m'
+        )
+        # gah this is hacky stuff to get the "!" in correctly
+        if not re.match("\n#", stanza):
+            print("!")
+        # substitute the '  !' back in for the '#'
+        # used to trick the split parser earlier
+        print(restore_bangs(stanza).strip())
+        print("!")
+        print(
+            f'\x1b[6;30;44m ↑ SEEN ->({str(seen)}/{num_files})<- TIMES ↑\x1b[0m'
+        )
+
+
+def print_counts(index, counts, num_files):
+    """print the stanzas seen in at least each count of devices
+
+    Every threshold comes from the same membership matrix
+
+    Args:
+        index (StanzaIndex): stanza index of the corpus
+        counts (list): minimum device counts, as strings, or 'all'
+        num_files (string): number of files in the corpus
+    """
+    device_counts = index.device_counts()
+    for count in counts:
+        if count == "all":
+            seen = index.common()
+            count = num_files
+        else:
+            seen = index.seen_in(int(count))
+        print(
+            f"\n\n##################### SEEN IN {count}/{num_files} OR MORE DEVICES #######################"
+        )
+        index.resolve(seen)
+        for k, v in sorted(
+            (index.texts[i], int(device_counts[i])) for i in seen
+        ):
+            print_seen(k, v, num_files)
+
+
+def print_tree_counts(tree, counts, num_files):
+    """print, for each count, the commands seen in at least count
+    devices with their children seen in at least count devices
+
+    Args:
+        tree (TreeIndex): command tree of the corpus
+        counts (list): minimum device counts, as strings, or 'all'
+        num_files (string): number of files in the corpus
+    """
+    for count in counts:
+        if count == "all":
+            threshold = len(tree.devices)
+            count = num_files
+        else:
+            threshold = int(count)
+        print(
+            f"\n\n##################### SEEN IN {count}/{num_files} OR MORE DEVICES #######################"
+        )
+        for lines, seen in sorted(tree.common_blocks(threshold)):
+            print_seen("\n" + "\n".join(lines), seen, num_files)
+
+
+def print_tree_specific(tree, maxcount=1):
+    """print, for each device, its lines seen in maxcount devices or
+    less, under their parent commands
+
+    Args:
+        tree (TreeIndex): command tree of the corpus
+        maxcount (int): most devices a line is seen in to be specific
+    """
+    for device in tree.devices:
+        blocks = tree.specific_lines(device, maxcount)
+        if blocks:
+            print(
+                f'\n\n\n\n\n\x1b[6;30;44m ↓ Device Specific Config for: {device} ↓\x1b[0m'
+            )
+            print(
+                restore_bangs(
+                    "\n!\n".join("\n".join(lines) for lines in blocks)
+                )
+            )
+            print(
+                f'!\n\x1b[6;30;44m ↑ Device Specific Config for: {device} ↑\x1b[0m'
+            )
+
+
+def print_groups(index, containers):
+    """print the configlet of each container, the stanzas that could
+    move up to it and the stanzas only seen in its devices
+
+    Args:
+        index (StanzaIndex): stanza index of the corpus
+        containers (Containers): containers of the devices
+    """
+    device_counts = index.device_counts()
+    order = sorted(range(len(containers.names)), key=containers.names.__getitem__)
+    common = [containers.common(c) for c in order]
+    specific = [containers.specific(c) for c in order]
+    promotions = [containers.promotions(c) for c in order]
+    index.resolve(
+        np.concatenate(
+            common
+            + specific
+            + [np.array([i for i, _, _ in p], dtype=np.int64) for p in promotions]
+        )
+    )
+    for container, ids, only, moves in zip(order, common, specific, promotions):
+        name = containers.names[container]
+        size = str(containers.sizes[container])
+        children = len(containers.children(container))
+        print(
+            f"\n\n##################### CONTAINER {name} ({size} DEVICES) #######################"
+        )
+        print(
+            f"\n\n##################### COMMON IN {name} #######################"
+        )
+        for k in sorted(index.texts[i] for i in ids):
+            print_seen(k, size, size)
+        if moves:
+            print(
+                f"\n\n##################### COULD MOVE UP TO {name} #######################"
+            )
+            for k, times, v in sorted(
+                (index.texts[i], times, devices) for i, times, devices in moves
+            ):
+                print(f"\ncommon in {times}/{children} containers below {name}")
+                print_seen(k, v, size)
+        if len(only):
+            print(
+                f"\n\n##################### SEEN ONLY IN {name} #######################"
+            )
+            for k, v in sorted(
+                (index.texts[i], int(device_counts[i])) for i in only
+            ):
+                print_seen(k, v, size)
+
+
+def print_similar(index, clusters, num_files, variants=10):
+    """print clusters of near-duplicate stanzas: the lines shared by
+    every stanza of the cluster, then the extra lines of each variant
+
+    Args:
+        index (StanzaIndex): stanza index of the corpus, with the
+            text of the clustered stanzas resolved
+        clusters (list): clusters of stanza ids
+        num_files (string): number of files in the corpus
+        variants (int): most variants printed per cluster
+    """
+    device_counts = index.device_counts()
+    indptr, devices = index.inverted()
+    report = []
+    for cluster in clusters:
+        seen = len(
+            np.unique(
+                np.concatenate(
+                    [devices[indptr[i]:indptr[i + 1]] for i in cluster]
+                )
+            )
+        )
+        cluster = sorted(cluster, key=lambda i: (-device_counts[i], index.texts[i]))
+        line_sets = [set(stanza_lines(index.texts[i])) for i in cluster]
+        shared = set.intersection(*line_sets)
+        report.append((-seen, cluster, line_sets, shared))
+    for minus_seen, cluster, line_sets, shared in sorted(
+        report, key=lambda entry: (entry[0], index.texts[entry[1][0]])
+    ):
+        print(
+            f"\n\n\n\n\n\x1b[6;30;44m ↓ {len(cluster)} SIMILAR STANZAS SEEN ->({-minus_seen}/{num_files})<- DEVICES ↓\x1b[0m"
+        )
+        print(
+            restore_bangs(
+                "\n".join(
+                    line
+                    for line in stanza_lines(index.texts[cluster[0]])
+                    if line in shared
+                )
+            )
+        )
+        for i, lines in list(zip(cluster, line_sets))[:variants]:
+            print(
+                f"\x1b[6;30;42m + variant in {device_counts[i]}/{num_files} devices \x1b[0m"
+            )
+            for line in stanza_lines(index.texts[i]):
+                if line not in shared:
+                    print(restore_bangs(line))
+        if len(cluster) > variants:
+            print(f"... {len(cluster) - variants} more variants")
+        print(
+            f"!\n\x1b[6;30;44m ↑ {len(cluster)} SIMILAR STANZAS SEEN ->({-minus_seen}/{num_files})<- DEVICES ↑\x1b[0m"
+        )
+
+
+def print_templates(index, templates, num_files, min_devices=2):
+    """print each template, then its variables as CSV, one row per
+    device and stanza
+
+    Args:
+        index (StanzaIndex): index the templates were built from
+        templates (list): Template, members numbered by stanza id
+        num_files (string): number of files in the corpus
+        min_devices (int): least number of devices of a template
+    """
+    indptr, devices = index.inverted()
+    names = list(index.devices)
+    report = []
+    for template in templates:
+        rows = sorted(
+            (str(names[device]), values)
+            for stanza_id, values in template.members
+            for device in devices[indptr[stanza_id]:indptr[stanza_id + 1]]
+        )
+        seen = len({device for device, _ in rows})
+        if seen >= min_devices:
+            report.append((-seen, template.text, template, rows))
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    for minus_seen, text, template, rows in sorted(
+        report, key=lambda entry: entry[:2]
+    ):
+        print(
+            f"\n\n\n\n\n\x1b[6;30;44m ↓ TEMPLATE OF {len(template.members)} STANZAS SEEN ->({-minus_seen}/{num_files})<- DEVICES ↓\x1b[0m"
+        )
+        print(restore_bangs(text))
+        print("!")
+        writer.writerow(["device"] + template.variables)
+        sys.stdout.flush()
+        for device, values in rows:
+            writer.writerow((device,) + values)
+
+
+def print_comments(comments):
+    """print the '!!' comments of the corpus, for review
+
+    Args:
+        comments (iterable): '!!' comments
+    """
+    comments = set(comments)
+    print(
+        "\n\n##################### COMMENTS  '!!' found in corpus #######################"
+    )
+    print("\n".join(comments))
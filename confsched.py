@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""Adaptive request scheduling for the async engine of confgrabber
+
+The number of devices in flight follows AIMD, as TCP does: it grows
+by one for every window of requests that complete on time, and is
+halved when a request fails or when latency climbs well above the
+fastest latency seen, at most once per window.  Devices can also be
+capped per site or per IP prefix, from the inventory file, so a
+shared AAA server or management network is never asked for more
+sessions than it can take.
+"""
+
+import asyncio
+import ipaddress
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from confeapi import split_host
+from confmetrics import metrics
+
+
+def read_inventory(path: str) -> Tuple[List[str], Dict[str, str], Dict[str, int]]:
+    """Read the devices, their sites and the site caps of an inventory.
+
+    One device per line, optionally followed by its site. A line
+    'limit SITE N' or 'limit PREFIX N' caps the devices of a site, or
+    whose address is in an IP prefix, to N in flight. Blank lines and
+    lines starting with '#' are ignored, so a plain list of hostnames
+    is still a valid inventory.
+
+        # pod 1 shares a TACACS server
+        limit pod1 20
+        limit 10.20.0.0/16 50
+        leaf1.pod1 pod1
+        10.20.1.1
+
+    Args:
+        path: Inventory file
+
+    Returns:
+        Tuple of (hostnames, dict of hostname to site, dict of site or
+        prefix to cap)
+
+    Raises:
+        ValueError: A limit line is malformed
+    """
+    hostnames = []
+    sites = {}
+    limits = {}
+    with open(path, "r") as inventory:
+        for number, line in enumerate(inventory, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            if fields[0] == "limit":
+                if len(fields) != 3 or not fields[2].isdigit() or int(fields[2]) < 1:
+                    raise ValueError(f"{path}:{number}: expected 'limit SITE|PREFIX N'")
+                limits[fields[1]] = int(fields[2])
+                continue
+            hostnames.append(fields[0])
+            if len(fields) > 1:
+                sites[fields[0]] = fields[1]
+    return hostnames, sites, limits
+
+
+class AdaptiveLimit:
+    """AIMD limit of the requests in flight.
+
+    Args:
+        maximum: Highest limit
+        initial: Starting limit, the maximum when not adaptive
+        adaptive: Whether the limit follows latency and errors
+        tolerance: Latency, as a multiple of the fastest seen, above
+            which requests are taken as a sign of overload
+        decrease: Factor applied to the limit on overload
+
+    Attributes:
+        limit: Current limit
+        in_flight: Requests in flight
+    """
+
+    def __init__(self, maximum: int, initial: Optional[int] = None,
+                 adaptive: bool = True, tolerance: float = 3.0,
+                 decrease: float = 0.5):
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.limit = float(min(initial or maximum, maximum) if adaptive else maximum)
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.in_flight = 0
+        self.baseline = None
+        self.latency = None
+        self._condition = asyncio.Condition()
+        # requests started before the last decrease do not cut again
+        self._decreased_at = 0.0
+        if adaptive:
+            metrics.gauge("scheduler.limit", int(self.limit))
+
+    async def acquire(self) -> float:
+        """Wait for a free slot.
+
+        Returns:
+            Start time of the request, to give back to release()
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.perf_counter()
+
+    async def release(self, start: float, ok: bool) -> None:
+        """Free a slot and adjust the limit to the outcome of the request.
+
+        Args:
+            start: Start time returned by acquire()
+            ok: Whether the request succeeded
+        """
+        now = time.perf_counter()
+        async with self._condition:
+            self.in_flight -= 1
+            if self.adaptive:
+                self._adjust(start, now, ok)
+            self._condition.notify(max(int(self.limit) - self.in_flight, 0))
+
+    def _adjust(self, start: float, now: float, ok: bool) -> None:
+        overloaded = not ok
+        if ok:
+            elapsed = now - start
+            # smoothed latency, against the fastest smoothed latency
+            self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+            if self.baseline is None or self.latency < self.baseline:
+                self.baseline = self.latency
+            overloaded = self.latency > self.tolerance * self.baseline
+        if overloaded:
+            if start >= self._decreased_at:
+                self.limit = max(1.0, self.limit * self.decrease)
+                self._decreased_at = now
+                metrics.count("scheduler.decreases")
+        elif self.limit < self.maximum:
+            # one more slot per window of requests on time
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+        metrics.gauge("scheduler.limit", int(self.limit))
+
+
+class Scheduler:
+    """Slots of devices in flight, adaptive and capped per site or prefix.
+
+    Args:
+        concurrency: Maximum number of devices in flight
+        adaptive: Whether to adjust the number in flight by AIMD
+        initial: Starting number in flight when adaptive
+        sites: Dict of hostname to site
+        limits: Dict of site or IP prefix to cap, see read_inventory()
+    """
+
+    def __init__(self, concurrency: int, adaptive: bool = False,
+                 initial: int = 16, sites: Optional[Dict[str, str]] = None,
+                 limits: Optional[Dict[str, int]] = None):
+        self.limit = AdaptiveLimit(concurrency, initial, adaptive)
+        self.sites = sites or {}
+        self.caps = {key: asyncio.Semaphore(cap) for key, cap in (limits or {}).items()}
+        self.prefixes = []
+        for key in self.caps:
+            try:
+                self.prefixes.append((ipaddress.ip_network(key, strict=False), key))
+            except ValueError:
+                pass
+
+    def caps_of(self, hostname: str) -> List[str]:
+        """Sites and prefixes capping a device, in a fixed order."""
+        keys = set()
+        site = self.sites.get(hostname)
+        if site in self.caps:
+            keys.add(site)
+        if self.prefixes:
+            try:
+                address = ipaddress.ip_address(split_host(hostname, 0)[0])
+            except ValueError:
+                address = None
+            if address is not None:
+                keys.update(key for network, key in self.prefixes if address in network)
+        # always taken in the same order, so no two devices deadlock
+        return sorted(keys)
+
+    @asynccontextmanager
+    async def slot(self, hostname: str):
+        """Hold a slot for one attempt at a device.
+
+        An exception raised in the block counts as a failure for the
+        adaptive limit, and is raised again.
+        """
+        caps = [self.caps[key] for key in self.caps_of(hostname)]
+        for cap in caps:
+            await cap.acquire()
+        try:
+            start = await self.limit.acquire()
+            ok = False
+            try:
+                yield
+                ok = True
+            finally:
+                await self.limit.release(start, ok)
+        finally:
+            for cap in caps:
+                cap.release()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confsimilar.py
+#
+"""DESCRIPTION
+Near-duplicate stanzas: MinHash signatures and locality-sensitive
+hashing
+
+Each stanza is the set of its lines.  Its MinHash signature keeps,
+for each of num_perm hash functions, the smallest hash of its lines,
+so two signatures agree on about as many values as the Jaccard
+similarity of the two stanzas.  Signatures are cut in bands and
+stanzas that share a whole band land in the same bucket; only the
+stanzas of a bucket are compared, never all pairs.  In a bucket, each
+stanza is compared with one representative of each cluster already
+there, in the order of the sorted texts, so the clusters don't depend
+on the order of the stanzas, and a bucket of thousands of near
+identical stanzas costs one comparison per stanza.  Representatives
+whose signatures agree too little are skipped, the others are checked
+against the exact similarity before stanzas are clustered together.
+"""
+
+import math
+
+import numpy as np
+
+from confparse import stanza_hash
+
+
+def stanza_lines(text):
+    """lines of a stanza that count for similarity, trailing and
+    repeated whitespace collapsed, the indentation kept"""
+    lines = []
+    for line in text.split("\n"):
+        words = line.split()
+        if words:
+            lines.append(line[:len(line) - len(line.lstrip())] + " ".join(words))
+    return lines
+
+
+def minhash(line_sets, num_perm=64, seed=1):
+    """MinHash signatures of sets of line hashes
+
+    Args:
+        line_sets (list): non empty arrays of 64 bit line hashes
+        num_perm (int): number of hash functions
+        seed (int): seed of the hash functions
+
+    Returns:
+        numpy array: one row of num_perm uint32 values per set
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    sizes = np.array([len(lines) for lines in line_sets], dtype=np.int64)
+    offsets = np.zeros(len(line_sets), dtype=np.int64)
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    values = np.concatenate(line_sets).astype(np.uint64)
+    signatures = np.empty((len(line_sets), num_perm), dtype=np.uint32)
+    shift = np.uint64(32)
+    for j in range(num_perm):
+        # multiply-shift hashing, the uint64 product wraps around
+        hashed = (values * a[j] + b[j]) >> shift
+        signatures[:, j] = np.minimum.reduceat(hashed, offsets)
+    return signatures
+
+
+def lsh_buckets(signatures, bands):
+    """groups of sets that share a whole band of their signatures
+
+    Args:
+        signatures (numpy array): MinHash signatures, see minhash()
+        bands (int): number of bands, it must divide the signature
+            length
+
+    Yields:
+        numpy array: indices of the sets of a bucket, two or more
+    """
+    rows = signatures.shape[1] // bands
+    rng = np.random.default_rng(0)
+    weights = rng.integers(1, 1 << 63, size=rows, dtype=np.uint64) | np.uint64(1)
+    for band in range(bands):
+        columns = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (columns * weights).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        for start, end in zip(starts, ends):
+            if end - start > 1:
+                yield order[start:end]
+
+
+def similar_clusters(
+    texts, threshold=0.7, num_perm=64, bands=16, seed=1, bucket_clusters=16
+):
+    """cluster near-duplicate stanzas
+
+    Args:
+        texts (list): stanza texts, distinct
+        threshold (float): minimum Jaccard similarity of the lines of
+            two stanzas of a cluster
+        num_perm (int): MinHash signature length
+        bands (int): LSH bands, more bands find less similar pairs
+        seed (int): seed of the MinHash functions
+        bucket_clusters (int): clusters of a bucket a stanza is
+            compared with, the first ones found
+
+    Returns:
+        list: clusters, lists of indices in texts, two or more each,
+            in the order of the sorted texts
+    """
+    line_hashes = {}
+    sets = []
+    members = []
+    for i in sorted(range(len(texts)), key=texts.__getitem__):
+        text = texts[i]
+        lines = stanza_lines(text)
+        if not lines:
+            continue
+        hashes = set()
+        for line in lines:
+            h = line_hashes.get(line)
+            if h is None:
+                h = line_hashes[line] = stanza_hash(line)
+            hashes.add(h)
+        sets.append(hashes)
+        members.append(i)
+    if len(sets) < 2:
+        return []
+    signatures = minhash(
+        [np.fromiter(s, dtype=np.uint64, count=len(s)) for s in sets],
+        num_perm,
+        seed,
+    )
+
+    parent = list(range(len(sets)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # signatures agreeing this far below the threshold are still
+    # checked, three standard deviations of the MinHash estimate
+    slack = 3 * math.sqrt(threshold * (1 - threshold) / num_perm)
+    agree = math.ceil((threshold - slack) * num_perm)
+    for bucket in lsh_buckets(signatures, bands):
+        # each member is checked against one representative of each
+        # of the first clusters of the bucket, in the order of the
+        # sorted texts
+        slots = {}
+        representatives = []
+        block = np.empty((bucket_clusters, num_perm), dtype=signatures.dtype)
+        for i in sorted(bucket.tolist()):
+            root = find(i)
+            if root in slots:
+                continue
+            slot = None
+            agreement = (block[:len(representatives)] == signatures[i]).sum(1)
+            for n in np.flatnonzero(agreement >= agree).tolist():
+                other = representatives[n]
+                union = len(sets[i] | sets[other])
+                if len(sets[i] & sets[other]) < threshold * union:
+                    continue
+                root_other = find(other)
+                if root_other == root:
+                    continue
+                other_slot = slots.pop(root_other)
+                slot = other_slot if slot is None else slot
+                parent[max(root, root_other)] = min(root, root_other)
+                root = min(root, root_other)
+            if slot is not None:
+                slots[root] = slot
+            elif len(representatives) < bucket_clusters:
+                slots[root] = len(representatives)
+                block[len(representatives)] = signatures[i]
+                representatives.append(i)
+
+    clusters = {}
+    for i in range(len(sets)):
+        clusters.setdefault(find(i), []).append(members[i])
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confsnapshot.py
+#
+"""DESCRIPTION
+Dictionary encoded corpus, in a binary snapshot file that is mapped
+into memory
+
+Every distinct normalized line of the corpus is kept once, in a line
+dictionary, and every distinct stanza once, as the sequence of its
+line ids.  A device is the sequence of its stanza ids, so a device is
+a sequence of line ids with stanza boundaries, without a string per
+line.  The file is a small JSON header and numpy arrays, aligned so
+they are used straight from the memory map: loading a snapshot reads
+the header, the device names and the stanza hashes, and the text of a
+stanza is only decoded when it is printed.
+
+    magic 'CONFSNP1', header length (uint64), JSON header
+    line_ptr     uint64   start of each line in line_blob, and the end
+    line_blob    uint8    UTF-8 text of the lines
+    stanza_hash  uint64   hash of each stanza, as stanza_hash()
+    stanza_ptr   uint64   start of each stanza in stanza_lines, and the end
+    stanza_lines uint32   line ids of the stanzas
+    device_ptr   uint64   start of each device in device_stanzas, and the end
+    device_stanzas uint32 stanza ids of the devices, in config order
+
+Device names and '!!' comments are string tables like the lines.
+
+Usage:
+    ./confsnapshot.py --directory ./configs --output corpus.snap
+    ./confsnapshot.py --info corpus.snap
+    ./config-tool.py --corpus corpus.snap --count all
+"""
+
+import argparse
+import json
+import mmap
+import os
+import pathlib
+import struct
+
+import numpy as np
+
+from confcache import rules_digest
+from confindex import StanzaIndex
+from confstore import ConfigStore
+
+
+MAGIC = b"CONFSNP1"
+VERSION = 1
+_header = struct.Struct("<8sQ")
+
+
+def _string_table(strings):
+    """offsets and UTF-8 blob of a list of strings"""
+    data = [string.encode("utf-8") for string in strings]
+    ptr = np.zeros(len(data) + 1, dtype=np.uint64)
+    np.cumsum([len(item) for item in data], out=ptr[1:])
+    return ptr, np.frombuffer(b"".join(data), dtype=np.uint8)
+
+
+def _strings(ptr, blob):
+    """decode a whole string table"""
+    data = blob.tobytes()
+    return [
+        data[start:end].decode("utf-8")
+        for start, end in zip(ptr[:-1].tolist(), ptr[1:].tolist())
+    ]
+
+
+def write_corpus(path, index):
+    """write the stanzas of an index to a snapshot file
+
+    The text of every stanza must be in index.texts, see resolve().
+    The file is written to a temporary file first, then renamed.
+
+    Args:
+        path (string): snapshot file
+        index (StanzaIndex): stanza index, not in streaming mode
+    """
+    line_ids = {}
+    stanza_lines = []
+    stanza_ptr = np.zeros(len(index.hashes) + 1, dtype=np.uint64)
+    for stanza_id in range(len(index.hashes)):
+        for line in index.texts[stanza_id].split("\n"):
+            line_id = line_ids.get(line)
+            if line_id is None:
+                line_id = line_ids[line] = len(line_ids)
+            stanza_lines.append(line_id)
+        stanza_ptr[stanza_id + 1] = len(stanza_lines)
+    line_ptr, line_blob = _string_table(list(line_ids))
+    devices = [np.asarray(ids, dtype=np.uint32) for ids in index.devices.values()]
+    device_ptr = np.zeros(len(devices) + 1, dtype=np.uint64)
+    np.cumsum([len(ids) for ids in devices], out=device_ptr[1:])
+    name_ptr, name_blob = _string_table([str(device) for device in index.devices])
+    comment_ptr, comment_blob = _string_table(index.comments)
+    sections = {
+        "line_ptr": line_ptr,
+        "line_blob": line_blob,
+        "stanza_hash": np.frombuffer(index.hashes, dtype=np.uint64),
+        "stanza_ptr": stanza_ptr,
+        "stanza_lines": np.array(stanza_lines, dtype=np.uint32),
+        "device_ptr": device_ptr,
+        "device_stanzas": (
+            np.concatenate(devices) if devices else np.zeros(0, dtype=np.uint32)
+        ),
+        "name_ptr": name_ptr,
+        "name_blob": name_blob,
+        "comment_ptr": comment_ptr,
+        "comment_blob": comment_blob,
+    }
+    # the header holds the offsets of the sections, which depend on
+    # its own length: leave room for the largest offsets
+    header = {
+        "version": VERSION,
+        "mask": index.mask,
+        "rules": rules_digest(index.mask),
+        "sections": {
+            name: [0, array.dtype.str, len(array)]
+            for name, array in sections.items()
+        },
+    }
+    size = len(json.dumps(header)) + 20 * len(sections)
+    offset = -(-(_header.size + size) // 8) * 8
+    for name, array in sections.items():
+        header["sections"][name][0] = offset
+        offset += -(-array.nbytes // 8) * 8
+    data = json.dumps(header).encode().ljust(size)
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "wb") as writer:
+        writer.write(_header.pack(MAGIC, len(data)))
+        writer.write(data)
+        for name, array in sections.items():
+            writer.seek(header["sections"][name][0])
+            writer.write(array.tobytes())
+        writer.truncate(offset)
+    os.replace(tmp_file, path)
+
+
+class Corpus:
+    """dictionary encoded corpus, mapped from a snapshot file
+
+    Args:
+        path (string): snapshot file
+
+    Raises:
+        ValueError: not a snapshot file, or of another version
+
+    Attributes:
+        mask (string): mask the configs were normalized with
+        rules (string): rules_digest() of the normalization
+        devices (list): device names, in the order they were added
+        comments (list): '!!' comments found in the corpus
+        stanza_hashes (numpy array): hash of each stanza id
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as reader:
+            size = os.fstat(reader.fileno()).st_size
+            if size < _header.size:
+                raise ValueError(f"{path}: not a corpus snapshot")
+            self._map = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = _header.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a corpus snapshot")
+        header = json.loads(self._map[_header.size:_header.size + length])
+        if header["version"] != VERSION:
+            raise ValueError(f"{path}: corpus snapshot version {header['version']}")
+        self.mask = header["mask"]
+        self.rules = header["rules"]
+        arrays = {
+            name: np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+            for name, (offset, dtype, count) in header["sections"].items()
+        }
+        self.line_ptr = arrays["line_ptr"]
+        self.line_blob = arrays["line_blob"]
+        self.stanza_hashes = arrays["stanza_hash"]
+        self.stanza_ptr = arrays["stanza_ptr"]
+        self.stanza_lines = arrays["stanza_lines"]
+        self.device_ptr = arrays["device_ptr"]
+        self.device_stanzas = arrays["device_stanzas"]
+        self.devices = _strings(arrays["name_ptr"], arrays["name_blob"])
+        self.comments = _strings(arrays["comment_ptr"], arrays["comment_blob"])
+
+    def line(self, line_id):
+        """text of a line id"""
+        start, end = self.line_ptr[line_id:line_id + 2]
+        return self.line_blob[int(start):int(end)].tobytes().decode("utf-8")
+
+    def stanza(self, stanza_id):
+        """text of a stanza id, decoded from the line dictionary"""
+        return "\n".join(
+            self.line(line_id) for line_id in self.stanza_line_ids(stanza_id)
+        )
+
+    def stanza_line_ids(self, stanza_id):
+        """line ids of a stanza"""
+        start, end = self.stanza_ptr[stanza_id:stanza_id + 2]
+        return self.stanza_lines[int(start):int(end)]
+
+    def device_stanza_ids(self, device):
+        """stanza ids of a device number, a view of the snapshot"""
+        start, end = self.device_ptr[device:device + 2]
+        return self.device_stanzas[int(start):int(end)]
+
+    def device_line_ids(self, device):
+        """line ids of a device number, and where each stanza starts,
+        see lines_of()"""
+        return self.lines_of(self.device_stanza_ids(device))
+
+    def lines_of(self, ids):
+        """line ids of a sequence of stanzas, and where each one starts
+
+        Args:
+            ids (numpy array): stanza ids
+
+        Returns:
+            tuple: (line ids, offsets of the stanzas in them) numpy arrays
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = self.stanza_ptr[ids].astype(np.int64)
+        lengths = self.stanza_ptr[ids + 1].astype(np.int64) - starts
+        bounds = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=bounds[1:])
+        positions = np.repeat(starts - bounds[:-1], lengths) + np.arange(bounds[-1])
+        return self.stanza_lines[positions], bounds
+
+    def close(self):
+        """unmap the snapshot file
+
+        Views of the arrays, such as the stanza ids loaded into a
+        StanzaIndex, must be dropped first
+        """
+        self.line_ptr = self.line_blob = self.stanza_hashes = None
+        self.stanza_ptr = self.stanza_lines = None
+        self.device_ptr = self.device_stanzas = None
+        self._map.close()
+
+
+def open_corpus(path):
+    """open a snapshot file for analysis
+
+    Its stanza hashes are only valid with the normalization rules it
+    was written with, like the parse cache.
+
+    Args:
+        path (string): snapshot file
+
+    Returns:
+        Corpus: the corpus
+
+    Raises:
+        ValueError: not a snapshot file, or written by other rules
+    """
+    corpus = Corpus(path)
+    if corpus.rules != rules_digest(corpus.mask):
+        corpus.close()
+        raise ValueError(
+            f"{path}: written with other normalization rules, write it again"
+        )
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--directory",
+        type=str,
+        default="",
+        help="directory that contains EOS configuration files",
+        required=False,
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default="",
+        help="config store to read the configuration files from, instead of --directory",
+        required=False,
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=str,
+        default="",
+        help="snapshot of the --store, default the latest one",
+        required=False,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="",
+        help="corpus file to write",
+        required=False,
+    )
+    parser.add_argument(
+        "-m",
+        "--mask",
+        type=str,
+        default="",
+        help="specify a string to ignore, e.g. 'description'",
+        required=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes parsing the configuration files",
+        required=False,
+    )
+    parser.add_argument(
+        "--info",
+        type=str,
+        default="",
+        help="corpus file to print the size of",
+        required=False,
+    )
+    args = parser.parse_args()
+
+    if args.info:
+        try:
+            corpus = Corpus(args.info)
+        except (OSError, ValueError) as error:
+            parser.error(f"--info: {error}")
+        print(f"devices {len(corpus.devices)}")
+        print(f"stanzas {len(corpus.stanza_hashes)}")
+        print(f"lines {len(corpus.line_ptr) - 1}")
+        print(f"stanza lines {len(corpus.stanza_lines)}")
+        print(f"device stanzas {len(corpus.device_stanzas)}")
+        print(f"mask {corpus.mask!r}")
+        corpus.close()
+        return
+    if not args.output or not (args.directory or args.store):
+        parser.error("specify --output and one of --directory or --store, or --info")
+
+    index = StanzaIndex(args.mask, args.jobs)
+    if args.store:
+        store = ConfigStore(args.store)
+        snapshot = args.snapshot or store.latest()
+        if snapshot not in store.snapshots():
+            parser.error(f"--snapshot: no snapshot '{snapshot}' in {args.store}")
+        index.load_snapshot(store, snapshot)
+    else:
+        index.load(
+            sorted(
+                path
+                for path in pathlib.Path(args.directory).iterdir()
+                if path.is_file() and not path.name.startswith(".")
+            )
+        )
+    index.resolve(range(len(index.hashes)))
+    write_corpus(args.output, index)
+    print(f"{len(index.devices)} devices, {len(index.hashes)} stanzas in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
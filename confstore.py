@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confstore.py
+#
+"""DESCRIPTION
+Content-addressed, compressed store of EOS config snapshots
+
+Configs are cut after every top level '!' line and each piece is kept
+once, zlib compressed, under its content hash: identical stanzas of
+thousands of devices, and of every daily snapshot, take the space of
+one.  A manifest maps each device of a snapshot to its pieces.
+
+The stanza hashes config-tool.py and config-differ.py work on are kept
+in the store as well, per manifest, normalization rules and mask, with
+the text of each normalized stanza once.  Reading a snapshot that was
+already analyzed decompresses nothing but the stanzas printed, and a
+device that did not change between snapshots is only parsed once.
+
+Usage:
+    ./confstore.py --store configs.db --import ./configs
+    ./confstore.py --store configs.db --list
+    ./confstore.py --store configs.db --snapshot 2022-06-01 --export ./out
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from hashlib import blake2b
+
+from confcache import signed_hash, unsigned_hash
+
+
+regex_chunk_end = re.compile(rb"^!\n", re.M)
+
+
+def split_chunks(data):
+    """cut a config after every top level '!' line
+
+    Args:
+        data (bytes): config
+
+    Returns:
+        list: pieces of the config, joined they give it back
+    """
+    chunks = []
+    start = 0
+    for match in regex_chunk_end.finditer(data):
+        chunks.append(data[start:match.end()])
+        start = match.end()
+    if start < len(data):
+        chunks.append(data[start:])
+    return chunks
+
+
+def chunk_key(chunk):
+    """content hash a config piece is stored under"""
+    return blake2b(chunk, digest_size=16).digest()
+
+
+class ConfigStore:
+    """SQLite store of compressed, deduplicated config snapshots
+
+    Args:
+        path (string): path of the SQLite file, created if needed
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "key BLOB PRIMARY KEY, data BLOB);"
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "name TEXT PRIMARY KEY, created REAL);"
+            "CREATE TABLE IF NOT EXISTS manifests ("
+            "snapshot TEXT, device TEXT, digest BLOB, chunks BLOB, "
+            "PRIMARY KEY (snapshot, device));"
+            "CREATE TABLE IF NOT EXISTS parsed ("
+            "digest BLOB, rules TEXT, comments TEXT, hashes BLOB, "
+            "PRIMARY KEY (digest, rules));"
+            "CREATE TABLE IF NOT EXISTS stanzas ("
+            "hash INTEGER PRIMARY KEY, data BLOB);"
+        )
+        self.db.commit()
+
+    def _existing(self, table, column, keys):
+        """keys already in a table, queried 500 at a time"""
+        keys = list(set(keys))
+        found = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            found.update(
+                row[0]
+                for row in self.db.execute(
+                    "SELECT {0} FROM {1} WHERE {0} IN ({2})".format(
+                        column, table, ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                )
+            )
+        return found
+
+    def put(self, snapshot, device, config):
+        """store the config of a device in a snapshot
+
+        Only the pieces not in the store yet are compressed
+
+        Args:
+            snapshot (string): snapshot name, e.g. the date
+            device (string): device name, e.g. its config file name
+            config (bytes or string): config
+        """
+        if isinstance(config, str):
+            config = config.encode("utf-8")
+        pieces = split_chunks(config)
+        keys = [chunk_key(chunk) for chunk in pieces]
+        chunks = dict(zip(keys, pieces))
+        existing = self._existing("chunks", "key", chunks)
+        self.db.executemany(
+            "INSERT OR IGNORE INTO chunks VALUES (?, ?)",
+            (
+                (key, zlib.compress(chunk))
+                for key, chunk in chunks.items()
+                if key not in existing
+            ),
+        )
+        blob = b"".join(keys)
+        self.db.execute(
+            "INSERT OR IGNORE INTO snapshots VALUES (?, ?)",
+            (snapshot, time.time()),
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO manifests VALUES (?, ?, ?, ?)",
+            (snapshot, device, chunk_key(blob), blob),
+        )
+        self.db.commit()
+
+    def snapshots(self):
+        """snapshot names, sorted, oldest first with the default
+        date names, as config-history orders them"""
+        return [
+            row[0]
+            for row in self.db.execute(
+                "SELECT name FROM snapshots ORDER BY name"
+            )
+        ]
+
+    def latest(self):
+        """name of the last snapshot, None if the store is empty"""
+        snapshots = self.snapshots()
+        return snapshots[-1] if snapshots else None
+
+    def devices(self, snapshot):
+        """device names of a snapshot, sorted"""
+        return [
+            row[0]
+            for row in self.db.execute(
+                "SELECT device FROM manifests WHERE snapshot = ? "
+                "ORDER BY device",
+                (snapshot,),
+            )
+        ]
+
+    def manifests(self, snapshot, devices=None):
+        """manifests of the devices of a snapshot
+
+        Args:
+            snapshot (string): snapshot name
+            devices (list): device names, every device if None
+
+        Returns:
+            dict: device name to (manifest digest, piece keys), in the
+                order of devices, or sorted
+        """
+        rows = {
+            device: (digest, [blob[i:i + 16] for i in range(0, len(blob), 16)])
+            for device, digest, blob in self.db.execute(
+                "SELECT device, digest, chunks FROM manifests "
+                "WHERE snapshot = ? ORDER BY device",
+                (snapshot,),
+            )
+        }
+        if devices is None:
+            return rows
+        return {device: rows[device] for device in devices if device in rows}
+
+    def configs(self, snapshot, devices=None, cached=4096):
+        """configs of the devices of a snapshot
+
+        The pieces last used are kept decompressed, the stanzas shared
+        by many devices are decompressed once
+
+        Args:
+            snapshot (string): snapshot name
+            devices (list): device names, every device if None
+            cached (int): most pieces kept decompressed
+
+        Yields:
+            tuple: (device name, config bytes)
+        """
+        pieces = OrderedDict()
+        for device, (digest, keys) in self.manifests(
+            snapshot, devices
+        ).items():
+            found = {}
+            for key in keys:
+                if key in pieces:
+                    pieces.move_to_end(key)
+                    found[key] = pieces[key]
+            missing = [key for key in set(keys) if key not in found]
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                for key, data in self.db.execute(
+                    "SELECT key, data FROM chunks WHERE key IN ({})".format(
+                        ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                ):
+                    found[key] = pieces[key] = zlib.decompress(data)
+            while len(pieces) > cached:
+                pieces.popitem(last=False)
+            yield device, b"".join(found[key] for key in keys)
+
+    def config(self, snapshot, device):
+        """config of one device, as text"""
+        for _, data in self.configs(snapshot, [device]):
+            return data.decode("utf-8")
+        raise KeyError(device)
+
+    def parsed(self, digest, rules):
+        """stanza hashes of a manifest, if it was parsed with the rules
+
+        Args:
+            digest (bytes): manifest digest
+            rules (string): see confcache.rules_digest()
+
+        Returns:
+            tuple: (comments, array of stanza hashes) or None
+        """
+        row = self.db.execute(
+            "SELECT comments, hashes FROM parsed "
+            "WHERE digest = ? AND rules = ?",
+            (digest, rules),
+        ).fetchone()
+        if row is None:
+            return None
+        hashes = array("Q")
+        hashes.frombytes(row[1])
+        return json.loads(row[0]), hashes
+
+    def put_parsed(self, digest, rules, comments, hashes, texts):
+        """store the stanza hashes of a manifest
+
+        Args:
+            digest (bytes): manifest digest
+            rules (string): see confcache.rules_digest()
+            comments (list): its '!!' comments
+            hashes (array): its stanza hashes, in config order
+            texts (dict): stanza hash to text, for all its stanzas
+        """
+        self.db.execute(
+            "INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)",
+            (digest, rules, json.dumps(comments), hashes.tobytes()),
+        )
+        signed = {signed_hash(h): text for h, text in texts.items()}
+        existing = self._existing("stanzas", "hash", signed)
+        self.db.executemany(
+            "INSERT OR IGNORE INTO stanzas VALUES (?, ?)",
+            (
+                (h, zlib.compress(text.encode("utf-8")))
+                for h, text in signed.items()
+                if h not in existing
+            ),
+        )
+        self.db.commit()
+
+    def texts(self, hashes):
+        """text of stored normalized stanzas
+
+        Args:
+            hashes (iterable): stanza hashes
+
+        Returns:
+            dict: stanza hash to text, for the stanzas in the store
+        """
+        hashes = [signed_hash(h) for h in set(hashes)]
+        texts = {}
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            for h, data in self.db.execute(
+                "SELECT hash, data FROM stanzas WHERE hash IN ({})".format(
+                    ",".join("?" * len(chunk))
+                ),
+                chunk,
+            ):
+                texts[unsigned_hash(h)] = zlib.decompress(data).decode("utf-8")
+        return texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--store",
+        type=str,
+        required=True,
+        help="SQLite file of the config store, created if needed",
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=str,
+        default="",
+        help="snapshot name, default today's date on --import and the latest snapshot otherwise",
+        required=False,
+    )
+    parser.add_argument(
+        "--import",
+        dest="import_dir",
+        type=str,
+        default="",
+        help="directory of EOS configuration files to store as a snapshot",
+        required=False,
+    )
+    parser.add_argument(
+        "--export",
+        type=str,
+        default="",
+        help="directory to write the configuration files of a snapshot to",
+        required=False,
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="list the snapshots and their number of devices",
+        required=False,
+    )
+    args = parser.parse_args()
+
+    store = ConfigStore(args.store)
+    if args.import_dir:
+        snapshot = args.snapshot or time.strftime("%Y-%m-%d")
+        for path in sorted(pathlib.Path(args.import_dir).iterdir()):
+            if path.is_file() and not path.name.startswith("."):
+                store.put(snapshot, path.name, path.read_bytes())
+        print(f"{len(store.devices(snapshot))} devices in snapshot {snapshot}")
+    elif args.export:
+        snapshot = args.snapshot or store.latest()
+        os.makedirs(args.export, exist_ok=True)
+        for device, data in store.configs(snapshot):
+            with open(os.path.join(args.export, device), "wb") as writer:
+                writer.write(data)
+    elif args.list:
+        for snapshot in store.snapshots():
+            print(f"{snapshot} {len(store.devices(snapshot))}")
+    else:
+        parser.error("specify one of --import, --export or --list")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# conftemplate.py
+#
+"""DESCRIPTION
+Configlet templates from stanzas that only differ in their values
+
+The tokens of each line are classified (addresses, prefixes, VLAN
+IDs, ASNs, interface names, descriptions...) and replaced by their
+class to give the shape of the line.  Stanzas with the same shape are
+one template: the tokens that are the same in every stanza stay as
+they are, the others become variables, with one row of values per
+device and stanza.
+
+Each distinct line is tokenized once for the whole corpus, and each
+distinct stanza once, whatever the number of devices that have it.
+"""
+
+import re
+import string
+
+
+# free text keywords, the rest of the line is the value
+FREE_TEXT = (
+    ("description ", "description"),
+    ("name ", "name"),
+    ("hostname ", "hostname"),
+)
+
+regex_token = re.compile(
+    r"(?P<ipv4_prefix>\b\d{1,3}(?:\.\d{1,3}){3}/\d{1,2}\b)"
+    r"|(?P<ipv4>\b\d{1,3}(?:\.\d{1,3}){3}\b)"
+    r"|(?P<ipv6>(?<![\w:])(?:[0-9a-fA-F]{1,4}:){2,7}[0-9a-fA-F:]*(?:/\d{1,3})?)"
+    r"|(?P<mac>\b[0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\b)"
+    r"|(?P<interface>\b(?:Ethernet|Port-Channel|Vlan|Loopback|Management"
+    r"|Vxlan|Tunnel)\d+(?:/\d+)*(?:\.\d+)?\b)"
+    r"|(?P<asn>(?<=router bgp )\d+(?:\.\d+)?\b|(?<=remote-as )\d+(?:\.\d+)?\b"
+    r"|(?<=local-as )\d+(?:\.\d+)?\b)"
+    r"|(?P<vlan>(?<=vlan )\d+(?:[-,]\d+)*\b)"
+    r"|(?P<number>\b\d+\b)"
+)
+
+
+class Tokenizer:
+    """token classifier, memoized per distinct line
+
+    Attributes:
+        cache (dict): line to (shape, kinds, values)
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def line(self, line):
+        """classify the tokens of a line
+
+        Args:
+            line (string): config line
+
+        Returns:
+            tuple: (shape, tuple of token kinds, tuple of token values),
+                the shape is the line with '{}' in place of each token
+                and its other braces doubled
+        """
+        cached = self.cache.get(line)
+        if cached is not None:
+            return cached
+        stripped = line.lstrip()
+        indent = line[:len(line) - len(stripped)]
+        for keyword, kind in FREE_TEXT:
+            if stripped.startswith(keyword) and len(stripped) > len(keyword):
+                value = stripped[len(keyword):]
+                cached = (
+                    indent + keyword.replace("{", "{{").replace("}", "}}") + "{}",
+                    (kind,),
+                    (value,),
+                )
+                self.cache[line] = cached
+                return cached
+        parts = []
+        kinds = []
+        values = []
+        end = 0
+        for match in regex_token.finditer(line):
+            parts.append(line[end:match.start()].replace("{", "{{").replace("}", "}}"))
+            parts.append("{}")
+            kinds.append(match.lastgroup)
+            values.append(match.group())
+            end = match.end()
+        parts.append(line[end:].replace("{", "{{").replace("}", "}}"))
+        cached = ("".join(parts), tuple(kinds), tuple(values))
+        self.cache[line] = cached
+        return cached
+
+    def stanza(self, text):
+        """classify the tokens of a stanza
+
+        Args:
+            text (string): normalized stanza
+
+        Returns:
+            tuple: (shape, tuple of token kinds, tuple of token values),
+                the shape is the line shapes joined by newlines
+        """
+        shapes = []
+        kinds = []
+        values = []
+        for line in text.split("\n"):
+            shape, line_kinds, line_values = self.line(line)
+            shapes.append(shape)
+            kinds += line_kinds
+            values += line_values
+        return "\n".join(shapes), tuple(kinds), tuple(values)
+
+
+class Template:
+    """stanzas of the same shape as one template
+
+    Attributes:
+        text (string): template, '{name}' for each variable
+        variables (list): variable names, e.g. 'ipv4_1'
+        members (list): (stanza number, tuple of variable values)
+    """
+
+    def __init__(self, shape, kinds, members):
+        values = [values for _, values in members]
+        varying = [
+            len({row[position] for row in values}) > 1
+            for position in range(len(kinds))
+        ]
+        numbers = {}
+        parts = []
+        self.variables = []
+        # the shape is a format() string, its literal text unescaped
+        # by the parser, one '{}' field per token
+        position = -1
+        for literal, field, _, _ in string.Formatter().parse(shape):
+            parts.append(literal)
+            if field is None:
+                # an escaped brace, or the end of the shape
+                continue
+            position += 1
+            kind = kinds[position]
+            if varying[position]:
+                numbers[kind] = numbers.get(kind, 0) + 1
+                name = f"{kind}_{numbers[kind]}"
+                self.variables.append(name)
+                parts.append("{" + name + "}")
+            else:
+                # the same in every stanza
+                parts.append(values[0][position])
+        self.text = "".join(parts)
+        self.members = [
+            (
+                number,
+                tuple(v for v, keep in zip(row, varying) if keep),
+            )
+            for number, row in members
+        ]
+
+
+def templates(texts, tokenizer=None):
+    """group stanzas by shape into templates
+
+    Args:
+        texts (list): distinct normalized stanzas
+        tokenizer (Tokenizer): tokenizer to share its cache, optional
+
+    Returns:
+        list: Template of each shape of two or more stanzas
+    """
+    tokenizer = tokenizer or Tokenizer()
+    shapes = {}
+    for number, text in enumerate(texts):
+        if not text or text.isspace():
+            continue
+        shape, kinds, values = tokenizer.stanza(text)
+        if kinds:
+            shapes.setdefault((shape, kinds), []).append((number, values))
+    return [
+        Template(shape, kinds, members)
+        for (shape, kinds), members in shapes.items()
+        if len(members) > 1
+    ]
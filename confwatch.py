@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2022, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#  - Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#  - Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#  - Neither the name of Arista Networks nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# confwatch.py
+#
+"""DESCRIPTION
+Watch mode of config-tool.py: a live stanza index and its query API
+
+The config directory is watched with inotify, or polled where inotify
+is not available.  A changed, new or deleted file only updates that
+device in the in-memory StanzaIndex, and the index is queried over
+HTTP on localhost or on a Unix socket:
+
+  GET /status                 devices and stanzas in the index
+  GET /common?count=N         stanzas seen in N or more devices, or 'all'
+  GET /specific?device=NAME   stanzas of a device seen nowhere else
+  POST /devices               devices having each stanza of the config
+                              text in the request body
+  GET /devices?stanza=TEXT    same, for a stanza given in the URL
+
+Answers are JSON.  The membership matrix is only rebuilt by the first
+query after a change, the next ones are answered from it.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import os
+import pathlib
+import signal
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from confindex import init_worker, parse_file
+from confmetrics import metrics
+from confparse import restore_bangs
+
+
+# inotify(7) flags
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+# struct inotify_event without its name
+_event = struct.Struct("iIII")
+
+
+def _is_config(path):
+    """config files are the visible files of the directory"""
+    return path.is_file() and not path.name.startswith(".")
+
+
+class Inotify:
+    """inotify watch of one directory, through libc
+
+    Args:
+        directory (string): directory to watch
+
+    Raises:
+        OSError: inotify is not available
+    """
+
+    def __init__(self, directory):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("no libc for inotify")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("no inotify in libc")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), directory)
+
+    def read(self):
+        """names of the files changed since the last read
+
+        Returns:
+            set: file names, None if events were lost and the whole
+                directory must be scanned again
+        """
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _event.unpack_from(data, offset)
+                offset += _event.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    names = None
+                elif names is not None and name:
+                    names.add(os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatch:
+    """live stanza index of a config directory
+
+    Args:
+        index (StanzaIndex): index loaded from the directory
+        directory (string): config directory
+        interval (float): seconds between scans when polling
+        delay (float): seconds to wait for more changes before an
+            update, editors and rsync write a file in several steps
+    """
+
+    def __init__(self, index, directory, interval=2.0, delay=0.2):
+        self.index = index
+        self.directory = pathlib.Path(directory)
+        self.interval = interval
+        self.delay = delay
+        self.updated = time.time()
+        self.updates = 0
+        self._pending = set()
+        self._wake = asyncio.Event()
+        self._mtimes = self._scan()
+        if index.jobs > 1:
+            self.executor = ProcessPoolExecutor(
+                max_workers=index.jobs,
+                initializer=init_worker,
+                initargs=(index.mask, index.cache),
+            )
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=1,
+                initializer=init_worker,
+                initargs=(index.mask, index.cache),
+            )
+
+    def _scan(self):
+        """modification time and size of every config file"""
+        mtimes = {}
+        for path in self.directory.iterdir():
+            try:
+                if _is_config(path):
+                    stat = path.stat()
+                    mtimes[path.name] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+    def _changed(self, names):
+        """queue changed files for the next update, None for all"""
+        if names is None:
+            names = set(self._scan()) | {path.name for path in self.index.devices}
+        self._pending |= names
+        if self._pending:
+            self._wake.set()
+
+    async def _updater(self):
+        """run the updates one at a time, so the parse of an older
+        version of a file never replaces a newer one"""
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.delay)
+            self._wake.clear()
+            await self.update()
+
+    async def update(self):
+        """parse the changed files again, drop the deleted ones
+
+        A file that can't be read or parsed keeps its previous
+        stanzas, the error is printed and the other files are updated
+        """
+        names, self._pending = self._pending, set()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        paths = [self.directory / name for name in sorted(names)]
+        parsed = [
+            (path, loop.run_in_executor(self.executor, parse_file, path, True))
+            for path in paths
+            if _is_config(path)
+        ]
+        for path in paths:
+            if not _is_config(path) and path in self.index.devices:
+                self.index.remove(path)
+        for path, future in parsed:
+            try:
+                self.index.add(*await future)
+            except FileNotFoundError:
+                # deleted again while being parsed
+                pass
+            except Exception as error:
+                metrics.count("watch.errors")
+                print(
+                    f"{path}: {type(error).__name__}: {error}", file=sys.stderr
+                )
+        # replaced stanzas would pile up over a long watch
+        metrics.count("watch.pruned", self.index.prune_texts())
+        self.updated = time.time()
+        self.updates += 1
+        metrics.count("watch.updates")
+        metrics.count("watch.files", len(paths))
+        metrics.observe("watch.update_seconds", time.perf_counter() - start)
+
+    async def watch(self):
+        """follow the changes of the directory and update the index,
+        until cancelled"""
+        await asyncio.gather(self._follow(), self._updater())
+
+    async def _follow(self):
+        """queue the changes of the directory"""
+        loop = asyncio.get_running_loop()
+        try:
+            inotify = Inotify(self.directory)
+        except OSError:
+            inotify = None
+        if inotify is not None:
+            loop.add_reader(inotify.fd, lambda: self._changed(inotify.read()))
+            try:
+                await asyncio.Event().wait()
+            finally:
+                loop.remove_reader(inotify.fd)
+                inotify.close()
+        # no inotify, the directory is scanned every interval
+        while True:
+            await asyncio.sleep(self.interval)
+            mtimes = self._scan()
+            self._changed(
+                {
+                    name
+                    for name in mtimes.keys() | self._mtimes.keys()
+                    if mtimes.get(name) != self._mtimes.get(name)
+                }
+            )
+            self._mtimes = mtimes
+
+    def _device(self, name):
+        """config file of a device, by file name or path"""
+        for path in self.index.devices:
+            if name in (path.name, str(path)):
+                return path
+        return None
+
+    def status(self):
+        index = self.index
+        devices = len(index.devices)
+        return {
+            "devices": devices,
+            "stanzas": int(np.count_nonzero(index.device_counts())) if devices else 0,
+            "updated": self.updated,
+            "updates": self.updates,
+        }
+
+    def common(self, count):
+        """stanzas seen in count or more devices, count may be 'all'"""
+        index = self.index
+        count = len(index.devices) if count == "all" else int(count)
+        device_counts = index.device_counts()
+        seen = index.seen_in(count)
+        index.resolve(seen)
+        return {
+            "count": count,
+            "devices": len(index.devices),
+            "stanzas": [
+                {"stanza": restore_bangs(text), "devices": seen}
+                for text, seen in sorted(
+                    (index.texts[i], int(device_counts[i])) for i in seen
+                )
+            ],
+        }
+
+    def specific(self, name):
+        """stanzas of a device found in no other config"""
+        index = self.index
+        device = self._device(name)
+        if device is None:
+            raise KeyError(name)
+        ids = index.specific(device)
+        index.resolve(ids)
+        return {
+            "device": device.name,
+            "stanzas": [restore_bangs(index.texts[i]) for i in ids],
+        }
+
+    def devices(self, text):
+        """devices having each stanza of a config text"""
+        index = self.index
+        found = []
+        for stanza in index.normalizer.text_stanzas(text):
+            if not stanza or str.isspace(stanza):
+                continue
+            # stanzas of a config start on the line after the '!'
+            if not stanza.startswith("\n"):
+                stanza = "\n" + stanza
+            stanza_id = index.lookup(stanza)
+            devices = [] if stanza_id is None else index.devices_with(stanza_id)
+            found.append(
+                {
+                    "stanza": restore_bangs(stanza),
+                    "devices": [device.name for device in devices],
+                }
+            )
+        return {"stanzas": found}
+
+    def query(self, method, target, body):
+        """answer one request
+
+        Returns:
+            tuple: (HTTP status, JSON-able answer)
+        """
+        url = urlsplit(target)
+        params = {
+            key: values[0] for key, values in parse_qs(url.query).items()
+        }
+        wanted = {"/specific": "device", "/devices": "stanza"}.get(url.path)
+        if wanted and wanted not in params and method != "POST":
+            return "400 Bad Request", {"error": f"missing parameter: {wanted}"}
+        try:
+            if url.path == "/status":
+                return "200 OK", self.status()
+            if url.path == "/common":
+                return "200 OK", self.common(params.get("count", "all"))
+            if url.path == "/specific":
+                return "200 OK", self.specific(params["device"])
+            if url.path == "/devices":
+                if method == "POST":
+                    return "200 OK", self.devices(body.decode("utf-8"))
+                return "200 OK", self.devices(params["stanza"])
+        except KeyError as error:
+            return "404 Not Found", {"error": f"not found: {error}"}
+        except ValueError as error:
+            return "400 Bad Request", {"error": str(error)}
+        return "404 Not Found", {"error": f"no such query: {url.path}"}
+
+    async def handle(self, reader, writer):
+        """serve the requests of one keep-alive connection"""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get("content-length", 0))
+                )
+                start = time.perf_counter()
+                status, answer = self.query(method, target, body)
+                data = json.dumps(answer).encode()
+                metrics.count("watch.queries")
+                metrics.observe(
+                    "watch.query_seconds", time.perf_counter() - start
+                )
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, listen=None, socket_path=None):
+        """watch the directory and answer queries, until cancelled
+        or terminated
+
+        Args:
+            listen (tuple): (host, port) to serve HTTP on
+            socket_path (string): Unix socket to serve HTTP on
+        """
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, asyncio.current_task().cancel
+        )
+        servers = []
+        if listen:
+            servers.append(await asyncio.start_server(self.handle, *listen))
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            servers.append(
+                await asyncio.start_unix_server(self.handle, socket_path)
+            )
+        try:
+            await self.watch()
+        finally:
+            for server in servers:
+                server.close()
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from gencorpus import write_corpus  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory):
+    """directory of synthetic EOS configs, some with '!!' comments"""
+    directory = tmp_path_factory.mktemp("corpus")
+    paths = write_corpus(str(directory), 12, stanzas=40, variability=0.2)
+    for n, path in enumerate(paths[:3]):
+        with open(path, "a") as writer:
+            writer.write(f"\n!! last change ticket {n}\n!\n")
+    return directory
@@ -0,0 +1,102 @@
+import pytest
+
+from confcomply import Golden
+from confsnapshot import Corpus, write_corpus
+from confindex import StanzaIndex
+
+GOLDEN = (
+    "hostname golden\n"
+    "!\n"
+    "ip routing\n"
+    "!\n"
+    "ntp server 10.0.0.123\n"
+    "!\n"
+    "interface Ethernet1\n"
+    "   mtu 9214\n"
+    "   no shutdown\n"
+    "!\n"
+    "interface Ethernet2\n"
+    "   mtu 1500\n"
+    "   no shutdown\n"
+    "!\n"
+    "end\n"
+)
+
+
+@pytest.fixture
+def golden(tmp_path):
+    path = tmp_path / "golden.txt"
+    path.write_text(GOLDEN)
+    return Golden(str(path), "hostname")
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_compliant(golden, tmp_path):
+    path = write(tmp_path, "leaf1.txt", GOLDEN.replace("golden", "leaf1"))
+    [(device, missing, extra, missing_lines, extra_lines)] = list(
+        golden.check_files([path])
+    )
+    assert (device, missing, extra) == (path, [], [])
+    assert (missing_lines, extra_lines) == ([], [])
+
+
+def test_swapped_values(golden, tmp_path):
+    swapped = (
+        GOLDEN.replace("mtu 9214", "mtu X")
+        .replace("mtu 1500", "mtu 9214")
+        .replace("mtu X", "mtu 1500")
+    )
+    path = write(tmp_path, "leaf1.txt", swapped)
+    [(_, missing, extra, missing_lines, extra_lines)] = list(
+        golden.check_files([path])
+    )
+    assert len(missing) == len(extra) == 2
+    assert missing_lines == [
+        ("interface Ethernet1", "   mtu 9214"),
+        ("interface Ethernet2", "   mtu 1500"),
+    ]
+    assert extra_lines == [
+        ("interface Ethernet1", "   mtu 1500"),
+        ("interface Ethernet2", "   mtu 9214"),
+    ]
+
+
+def test_unpaired_stanzas(golden, tmp_path):
+    # no stanza with the same first line, compared with all the others
+    config = GOLDEN.replace("ntp server 10.0.0.123", "ntp server 10.0.0.1")
+    config = config.replace("interface Ethernet2\n", "interface Ethernet3\n")
+    path = write(tmp_path, "leaf1.txt", config)
+    [(_, missing, extra, missing_lines, extra_lines)] = list(
+        golden.check_files([path])
+    )
+    assert len(missing) == len(extra) == 2
+    assert missing_lines == [
+        ("ntp server 10.0.0.123", "ntp server 10.0.0.123"),
+        ("interface Ethernet2", "interface Ethernet2"),
+    ]
+    assert extra_lines == [
+        ("ntp server 10.0.0.1", "ntp server 10.0.0.1"),
+        ("interface Ethernet3", "interface Ethernet3"),
+    ]
+
+
+def test_modes_agree(golden, corpus, tmp_path):
+    paths = sorted(corpus.iterdir())
+    expected = list(golden.check_files(paths))
+    assert any(result[1] or result[2] for result in expected)
+    assert list(golden.check_files(paths, jobs=2)) == expected
+    texts = [(path, path.read_text()) for path in paths]
+    assert list(golden.check_texts(texts, jobs=2)) == expected
+    index = StanzaIndex("hostname")
+    index.load(paths)
+    write_corpus(str(tmp_path / "corpus.snap"), index)
+    corpus = Corpus(str(tmp_path / "corpus.snap"))
+    results = list(golden.check_corpus(corpus))
+    assert [result[1:] for result in results] == [
+        result[1:] for result in expected
+    ]
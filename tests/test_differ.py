@@ -0,0 +1,112 @@
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+
+from conftest import ROOT
+from confindex import LineIndex
+from confparse import Normalizer, restore_bangs
+
+
+def config_differ(*args):
+    return subprocess.run(
+        [sys.executable, os.path.join(ROOT, "config-differ.py"), *args],
+        env=dict(os.environ, PYTHONHASHSEED="0"),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+def stanzas_of(path):
+    return list(Normalizer().file_stanzas(path))
+
+
+def csv_rows(output):
+    """rows of a CSV output, without its header"""
+    return output.split("\n")[2:-1]
+
+
+def test_line_index():
+    lines = LineIndex()
+    lines.add("a", ["x", "y", "x"])
+    lines.add("b", ["y", "z"])
+    assert (lines.count("x"), lines.count("y"), lines.count("w")) == (2, 2, 0)
+    assert lines.files_in(lines.mask("y")) == ["a", "b"]
+    assert lines.files_in(lines.mask("z")) == ["b"]
+    assert lines.mask("w") == 0
+
+
+def test_diffs(corpus):
+    first, second = (str(path) for path in sorted(corpus.iterdir())[:2])
+    # the lines seen once in the stanzas of only one of the files
+    stanzas = {path: stanzas_of(path) for path in (first, second)}
+    counts = Counter(s for texts in stanzas.values() for s in texts)
+    specific = {
+        path: [s for s in texts if counts[s] == 1]
+        for path, texts in stanzas.items()
+    }
+    lines = Counter(
+        line
+        for texts in specific.values()
+        for s in texts
+        for line in s.split("\n")
+    )
+    expected = [
+        f"{path},{other},{line}"
+        for path, other in ((first, second), (second, first))
+        for s in specific[path]
+        for line in s.split("\n")
+        if lines[line] == 1
+    ]
+    assert expected
+    output = config_differ("-t", "diffs", "-c", "-f", first, second)
+    assert csv_rows(output) == expected
+
+
+def test_nway_diffs(corpus):
+    paths = [str(path) for path in sorted(corpus.iterdir())[:4]]
+    lines = {
+        path: {line for s in stanzas_of(path) for line in s.split("\n")}
+        for path in paths
+    }
+    expected = []
+    seen = set()
+    for path in paths:
+        for s in stanzas_of(path):
+            for line in s.split("\n"):
+                if line in seen or not line or line.isspace():
+                    continue
+                seen.add(line)
+                have = [p for p in paths if line in lines[p]]
+                if len(have) < len(paths):
+                    lack = [p for p in paths if p not in have]
+                    row = f"{';'.join(have)},{';'.join(lack)},{line}"
+                    expected.append(row)
+    assert expected
+    output = config_differ("-t", "diffs", "-c", "-f", *paths)
+    assert csv_rows(output) == expected
+
+
+def test_nway_stanzas(corpus):
+    paths = [str(path) for path in sorted(corpus.iterdir())[:4]]
+    stanzas = {path: set(stanzas_of(path)) for path in paths}
+    expected = set()
+    for s in set().union(*stanzas.values()):
+        have = [p for p in paths if s in stanzas[p]]
+        if len(have) < len(paths) and s.strip():
+            lack = [p for p in paths if p not in have]
+            text = restore_bangs(s).strip()
+            expected.add((" ".join(have), " ".join(lack), text))
+    output = config_differ("-t", "stanzas", "-f", *paths)
+    found = set(
+        re.findall(
+            r"\n\x1b\[6;30;42m(.*?) *\x1b\[0m \x1b\[6;37;41m(.*?) *\x1b\[0m\n"
+            r"(.*?)(?=\n\n\x1b|\n\Z)",
+            output,
+            re.S,
+        )
+    )
+    assert expected
+    assert found == expected
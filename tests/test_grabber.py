@@ -0,0 +1,292 @@
+import asyncio
+import errno
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import confgrabber
+from conftest import ROOT
+from confeapi import EapiError, EapiPool, split_host
+from confgrabber import (
+    grab_configs_async,
+    grab_single_config_async,
+    sweep_devices,
+)
+from confindex import StanzaIndex
+from mockeapi import CommandError, MockEapi, device_index
+
+
+class FailingMock(MockEapi):
+    """mock whose second device can't return its config"""
+
+    def run_cmds(self, host, cmds):
+        if device_index(host) == 1 and any("running-config" in c for c in cmds):
+            raise CommandError("CLI command 2 of 2 failed: mock", [{}])
+        return super().run_cmds(host, cmds)
+
+
+class TruncateOnceMock(MockEapi):
+    """mock whose first response is cut in the middle of its body"""
+
+    @property
+    def failure_rate(self):
+        return 1.0 if self.requests == 1 else 0.0
+
+    @failure_rate.setter
+    def failure_rate(self, value):
+        pass
+
+
+def serve(mock, test):
+    """run test(port) against a mock eAPI server on every loopback address"""
+
+    async def main():
+        server = await asyncio.start_server(mock.handle, "0.0.0.0", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await test(port)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(main())
+
+
+def hosts(count, port):
+    return [f"127.0.0.{n + 1}:{port}" for n in range(count)]
+
+
+@pytest.mark.parametrize(
+    "host, expected",
+    [
+        ("leaf1", ("leaf1", 443)),
+        ("leaf1:8443", ("leaf1", 8443)),
+        ("10.0.0.1:80", ("10.0.0.1", 80)),
+        ("2001:db8::1", ("2001:db8::1", 443)),
+        ("[2001:db8::1]:8443", ("2001:db8::1", 8443)),
+        ("[::1]", ("::1", 443)),
+    ],
+)
+def test_split_host(host, expected):
+    assert split_host(host, 443) == expected
+
+
+def test_failing_device(tmp_path):
+    async def test(port):
+        pool = EapiPool("a", "b", transport="http", timeout=5)
+        try:
+            return [
+                await grab_single_config_async(
+                    pool, host, str(tmp_path), False, max_retries=1
+                )
+                for host in hosts(3, port)
+            ]
+        finally:
+            await pool.close()
+
+    results = serve(FailingMock(stanzas=10), test)
+    assert [success for _, success, _ in results] == [True, False, True]
+    assert "mock" in results[1][2]
+
+
+@pytest.mark.parametrize(
+    "mock, retries, success",
+    [
+        (TruncateOnceMock(stanzas=10, failure_modes=["truncate"]), 2, True),
+        (MockEapi(stanzas=10, failure_rate=1, failure_modes=["truncate"]), 2,
+         False),
+    ],
+)
+def test_truncated_response(tmp_path, mock, retries, success):
+    async def test(port):
+        pool = EapiPool("a", "b", transport="http", timeout=5)
+        try:
+            return await grab_single_config_async(
+                pool, hosts(1, port)[0], str(tmp_path), False,
+                max_retries=retries,
+            )
+        finally:
+            await pool.close()
+
+    _, result, message = serve(mock, test)
+    assert result == success
+    # every attempt was made, the truncated body was retried
+    assert mock.requests == retries
+    assert success or "closed" in message
+
+
+class Garbage:
+    """server answering every request with the same bytes"""
+
+    def __init__(self, response):
+        self.response = response
+
+    async def handle(self, reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(self.response)
+        await writer.drain()
+        writer.close()
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        b"garbage\r\n",
+        b"HTTP/1.1 OK\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: x\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nnot",
+    ],
+)
+def test_malformed_response(response):
+    async def test(port):
+        pool = EapiPool("a", "b", transport="http", timeout=5)
+        try:
+            with pytest.raises(EapiError):
+                await pool.run_cmds(hosts(1, port)[0], ["enable"])
+        finally:
+            await pool.close()
+
+    serve(Garbage(response), test)
+
+
+def test_write_error_fails_one_device(tmp_path, capsys):
+    async def test(port):
+        names = hosts(3, port)
+        # the config of the second device can't be written
+        (tmp_path / f"{names[1]}.txt").mkdir()
+        await grab_configs_async(
+            names, "a", "b", str(tmp_path), False, transport="http",
+            sweep_timeout=None,
+        )
+        return names
+
+    names = serve(MockEapi(stanzas=10), test)
+    output = capsys.readouterr().out
+    assert f"Failed to download config from {names[1]}" in output
+    for name in (names[0], names[2]):
+        assert (tmp_path / f"{name}.txt").is_file()
+        assert f"Successfully downloaded config from {name}" in output
+
+
+def counts(index):
+    hashes = np.frombuffer(index.hashes, dtype=np.uint64).tolist()
+    return {
+        h: (int(n), int(d))
+        for h, n, d in zip(
+            hashes, index.occurrences(), index.device_counts()
+        )
+        if n
+    }
+
+
+@pytest.mark.parametrize("jobs, write", [(1, True), (2, True), (1, False)])
+def test_analyze(tmp_path, jobs, write):
+    index = StanzaIndex(jobs=jobs)
+
+    async def test(port):
+        await grab_configs_async(
+            hosts(6, port), "a", "b", str(tmp_path), False,
+            transport="http", sweep_timeout=None, index=index, write=write,
+        )
+
+    mock = MockEapi(stanzas=30, variability=0.3)
+    serve(mock, test)
+    # the same analysis as a plain load of the configs
+    directory = tmp_path / "expected"
+    directory.mkdir()
+    for n in range(6):
+        result = mock.run_cmds(
+            f"127.0.0.{n + 1}", ["enable", "show running-config"]
+        )
+        (directory / f"{n}.txt").write_text(result[1]["output"])
+    expected = StanzaIndex()
+    expected.load(sorted(directory.iterdir()))
+    assert len(index.devices) == 6
+    assert counts(index) == counts(expected)
+    assert len(list(tmp_path.glob("*.txt"))) == (6 if write else 0)
+
+
+def test_bad_extra_command_keeps_config(tmp_path):
+    commands = ["show version | json", "bogus", "show clock"]
+
+    async def test(port):
+        await grab_configs_async(
+            hosts(2, port), "a", "b", str(tmp_path), False, transport="http",
+            sweep_timeout=None, commands=commands,
+            commands_dir=str(tmp_path / "commands"),
+        )
+        return hosts(2, port)
+
+    for name in serve(MockEapi(stanzas=10), test):
+        assert "hostname" in (tmp_path / f"{name}.txt").read_text()
+        document = json.loads((tmp_path / "commands" / f"{name}.json").read_text())
+        assert document["commands"]["show version | json"]["modelName"] == "vEOS-mock"
+        assert set(document["errors"]) == {"bogus", "show clock"}
+
+
+def test_pool_discard(tmp_path):
+    async def test(port):
+        pool = EapiPool("a", "b", transport="http", timeout=5)
+        host = hosts(1, port)[0]
+        await pool.run_cmds(host, ["enable"])
+        idle = len(pool.idle[host])
+        pool.discard(host)
+        return idle, host in pool.idle
+
+    assert serve(MockEapi(stanzas=10), test) == (1, False)
+
+
+def test_sweep_retries_local_errors(monkeypatch):
+    calls = []
+
+    async def probe_device(hostname, port, timeout):
+        calls.append(hostname)
+        if len(calls) == 1:
+            raise OSError(errno.EMFILE, "Too many open files")
+        return hostname, hostname != "down"
+
+    monkeypatch.setattr(confgrabber, "probe_device", probe_device)
+    reachable, unreachable = asyncio.run(sweep_devices(["up", "down"], 443))
+    assert reachable == ["up"]
+    assert unreachable == ["down"]
+    assert calls.count("up") == 2
+
+
+def test_sweep_refused():
+    # nothing listens on port 1, the device is down, not retried
+    reachable, unreachable = asyncio.run(
+        sweep_devices(["127.0.0.1:1"], 443, timeout=1)
+    )
+    assert (reachable, unreachable) == ([], ["127.0.0.1:1"])
+
+
+@pytest.mark.parametrize(
+    "option",
+    [
+        ["--fingerprint-cmd", "show version"],
+        ["--concurrency", "10"],
+        ["--timeout", "5"],
+        ["--no-sweep"],
+        ["--sweep-timeout", "1"],
+        ["--initial-concurrency", "4"],
+    ],
+)
+def test_threads_rejects_async_options(tmp_path, option):
+    inventory = tmp_path / "devices"
+    inventory.write_text("127.0.0.1\n")
+    result = subprocess.run(
+        [
+            sys.executable,
+            os.path.join(ROOT, "confgrabber.py"),
+            "-u", "admin", "-p", "admin", "-f", str(inventory),
+            "-d", str(tmp_path), "-e", "threads", *option,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 2
+    assert f"{option[0]} needs the async engine" in result.stderr
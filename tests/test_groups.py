@@ -0,0 +1,172 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from confgroups import Containers, match_groups, read_groups
+from confindex import StanzaIndex
+
+
+# device file to its stanzas
+DNS = "ip name-server 8.8.8.8"
+NTP = "ntp server 1.1.1.1"
+DEVICES = {
+    "border1.txt": ["ip routing", NTP],
+    "leaf1.txt": ["ip routing", NTP, "vlan 10", "vlan 40", DNS],
+    "leaf2.txt": ["ip routing", NTP, "vlan 10", DNS],
+    "leaf3.cfg": ["ip routing", NTP, "vlan 20", "vlan 30", DNS],
+    "leaf4.conf": ["ip routing", NTP, "vlan 20", "vlan 40", DNS],
+    # not 'spine1' in the groups, '.dc2' is not a config extension
+    "spine1.dc2": ["ip routing", "vlan 10"],
+}
+
+GROUPS = """\
+# device container
+border1 DC1
+leaf1 DC1/pod1
+leaf2, DC1/pod1
+leaf3\tDC1/pod2
+leaf4 DC1/pod2
+spine1 DC2
+"""
+
+
+@pytest.fixture
+def configs(tmp_path):
+    directory = tmp_path / "configs"
+    directory.mkdir()
+    for name, stanzas in DEVICES.items():
+        (directory / name).write_text(
+            "".join(f"!\n{stanza}\n" for stanza in stanzas) + "!\nend\n"
+        )
+    return directory
+
+
+@pytest.fixture
+def index(configs):
+    index = StanzaIndex()
+    index.load(sorted(configs.iterdir()))
+    index.resolve(range(len(index.hashes)))
+    return index
+
+
+def text(index, i):
+    return index.texts[i].strip("\n!")
+
+
+def stanzas(index, ids):
+    return sorted(filter(None, (text(index, i) for i in ids)))
+
+
+def test_read_groups(tmp_path):
+    path = tmp_path / "groups"
+    path.write_text(GROUPS)
+    assert read_groups(str(path)) == {
+        "border1": ("DC1",),
+        "leaf1": ("DC1", "pod1"),
+        "leaf2": ("DC1", "pod1"),
+        "leaf3": ("DC1", "pod2"),
+        "leaf4": ("DC1", "pod2"),
+        "spine1": ("DC2",),
+    }
+
+
+def test_read_groups_no_container(tmp_path):
+    path = tmp_path / "groups"
+    path.write_text("leaf1\n")
+    with pytest.raises(ValueError):
+        read_groups(str(path))
+
+
+def test_match_groups():
+    names = ["dc1-pod1-leaf1", "dc1-pod2-leaf3", "dc2-spine1", "oob1"]
+    assert match_groups(names, [r"^(dc\d+)-", r"-(pod\d+)-"]) == {
+        "dc1-pod1-leaf1": ("dc1", "pod1"),
+        "dc1-pod2-leaf3": ("dc1", "pod2"),
+        # stops at the first level it does not match
+        "dc2-spine1": ("dc2",),
+        "oob1": (),
+    }
+    # the whole match without a group
+    assert match_groups(["leaf12"], [r"leaf"]) == {"leaf12": ("leaf",)}
+
+
+def test_containers(index, tmp_path):
+    path = tmp_path / "groups"
+    path.write_text(GROUPS)
+    containers = Containers(index, read_groups(str(path)))
+    assert containers.names == [
+        "Tenant",
+        "Tenant/DC1",
+        "Tenant/DC1/pod1",
+        "Tenant/DC1/pod2",
+    ]
+    assert containers.parents == [-1, 0, 1, 1]
+    assert containers.sizes.tolist() == [6, 5, 2, 2]
+    common = [
+        stanzas(index, containers.common(n))
+        for n in range(len(containers.names))
+    ]
+    assert common == [
+        ["ip routing"],
+        ["ntp server 1.1.1.1"],
+        [DNS, "vlan 10"],
+        [DNS, "vlan 20"],
+    ]
+    # in leaf1 and leaf4, not common to any container, vlan 30 is in
+    # a single device and vlan 10 is common to pod1
+    assert stanzas(index, containers.specific(1)) == ["vlan 40"]
+    assert stanzas(index, containers.specific(0)) == []
+    promotions = containers.promotions(1)
+    assert [
+        (text(index, i), times, found) for i, times, found in promotions
+    ] == [(DNS, 2, 4)]
+    assert containers.promotions(1, min_children=3) == []
+
+
+def test_containers_counts(index):
+    groups = match_groups(
+        [os.path.basename(str(device)) for device in index.devices],
+        [r"^([a-z]+)"],
+    )
+    containers = Containers(index, groups)
+    assert containers.names == [
+        "Tenant",
+        "Tenant/border",
+        "Tenant/leaf",
+        "Tenant/spine",
+    ]
+    counts = containers.counts()
+    for container, name in enumerate(containers.names):
+        expected = {}
+        for device, device_stanzas in DEVICES.items():
+            if device.startswith(name.split("/")[-1]) or name == "Tenant":
+                for stanza in device_stanzas:
+                    expected[stanza] = expected.get(stanza, 0) + 1
+        ids, found = counts[container]
+        found = {text(index, i): int(n) for i, n in zip(ids, found)}
+        found.pop("", None)
+        assert found == expected
+
+
+def test_config_tool_groups(configs, tmp_path):
+    path = tmp_path / "groups"
+    path.write_text(GROUPS)
+    output = subprocess.run(
+        [
+            sys.executable,
+            os.path.join(ROOT, "config-tool.py"),
+            "-d",
+            str(configs),
+            "--groups",
+            str(path),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    for name in ("Tenant/DC1/pod1", "Tenant/DC1/pod2", "vlan 40"):
+        assert name in output
+    assert "Tenant/DC2" not in output
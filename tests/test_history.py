@@ -0,0 +1,108 @@
+import numpy as np
+
+from confhistory import StanzaHistory
+from confparse import Normalizer, stanza_hash
+from confstore import ConfigStore
+
+STANZAS = {
+    name: f"{name.lower()} one\n   {name.lower()} two\n"
+    for name in "ABCDE"
+}
+
+
+def config(*names):
+    return "".join("!\n" + STANZAS[name] for name in names) + "!\nend\n"
+
+
+def h(name):
+    """hash of a stanza as the normalizer cuts it out of a config"""
+    text = "!\n" + STANZAS[name] + "!\n"
+    stanza = next(
+        s for s in Normalizer().text_stanzas(text) if s.strip()
+    )
+    return stanza_hash(stanza)
+
+
+def hashes(*names):
+    """stanza hashes of a config, blank stanzas included"""
+    return sorted(
+        {stanza_hash(s) for s in Normalizer().text_stanzas(config(*names))}
+    )
+
+
+def history(tmp_path, snapshots):
+    store = ConfigStore(str(tmp_path / "store.db"))
+    for snapshot, devices in snapshots.items():
+        for device, names in devices.items():
+            store.put(snapshot, device, config(*names))
+    return store, StanzaHistory(store)
+
+
+SNAPSHOTS = {
+    "2022-06-01": {"d1": "ABC", "d2": "ABD"},
+    "2022-06-02": {"d1": "ACE", "d2": "ABD"},
+    "2022-06-03": {"d1": "ACE", "d2": "AB", "d3": "AB"},
+}
+
+
+def test_states(tmp_path):
+    _, stanzas = history(tmp_path, SNAPSHOTS)
+    assert stanzas.update() == list(SNAPSHOTS)
+    assert stanzas.update() == []
+    for snapshot, devices in SNAPSHOTS.items():
+        states = stanzas.states(snapshot)
+        assert {d: s.tolist() for d, s in states.items()} == {
+            device: hashes(*names) for device, names in devices.items()
+        }
+    # devices looked up in batches
+    names = ["d2"] + [f"x{n}" for n in range(1200)] + ["d1"]
+    assert set(stanzas.states("2022-06-02", names)) == {"d1", "d2"}
+
+
+def test_changes(tmp_path):
+    _, stanzas = history(tmp_path, SNAPSHOTS)
+    stanzas.update()
+    added, removed = stanzas.changes("d1", "2022-06-01", "2022-06-03")
+    assert (added.tolist(), removed.tolist()) == ([h("E")], [h("B")])
+    added, removed = stanzas.changes("d3", "2022-06-01", "2022-06-03")
+    assert (added.tolist(), removed.tolist()) == (hashes("A", "B"), [])
+    assert stanzas.snapshot_at("2022-06-02T12") == "2022-06-02"
+    assert stanzas.snapshot_at("2022-05-01") is None
+
+
+def test_drift(tmp_path):
+    _, stanzas = history(tmp_path, SNAPSHOTS)
+    stanzas.update()
+    baseline, drifted = stanzas.drift("2022-06-01", "2022-06-03")
+    assert baseline.tolist() == hashes("A", "B")
+    assert {d: lost.tolist() for d, lost in drifted.items()} == {
+        "d1": [h("B")]
+    }
+    # a baseline of the stanzas of one device or more
+    baseline, drifted = stanzas.drift("2022-06-01", "2022-06-03", count=1)
+    assert baseline.tolist() == hashes("A", "B", "C", "D")
+    assert {d: lost.tolist() for d, lost in drifted.items()} == {
+        "d1": [h("B")],
+        "d2": [h("D")],
+    }
+
+
+def test_first_seen(tmp_path):
+    _, stanzas = history(tmp_path, SNAPSHOTS)
+    stanzas.update()
+    assert stanzas.first_seen(h("A")) == ("2022-06-01", ["d1", "d2"])
+    assert stanzas.first_seen(h("E")) == ("2022-06-02", ["d1"])
+    assert stanzas.first_seen(12345) is None
+
+
+def test_older_snapshot_rebuilds(tmp_path):
+    store, stanzas = history(tmp_path, SNAPSHOTS)
+    stanzas.update()
+    store.put("2022-05-31", "d1", config("C"))
+    assert stanzas.update() == ["2022-05-31"] + list(SNAPSHOTS)
+    assert stanzas.first_seen(h("C")) == ("2022-05-31", ["d1"])
+    added, _ = stanzas.changes("d1", "2022-05-31", "2022-06-01")
+    assert added.tolist() == sorted([h("A"), h("B")])
+    assert np.array_equal(
+        stanzas.states("2022-06-03")["d1"], hashes("A", "C", "E")
+    )
@@ -0,0 +1,208 @@
+import functools
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import confindex
+from confcache import ParseCache
+from confindex import StanzaIndex
+from confparse import Normalizer
+from conftest import ROOT
+from confsnapshot import Corpus, write_corpus
+from confstore import ConfigStore
+
+
+def paths_of(corpus):
+    return sorted(corpus.iterdir())
+
+
+def summary(index):
+    """what the reports are made of, independent of the stanza ids"""
+    hashes = np.frombuffer(index.hashes, dtype=np.uint64)
+    occurrences = dict(zip(hashes.tolist(), index.occurrences().tolist()))
+    device_counts = dict(zip(hashes.tolist(), index.device_counts().tolist()))
+    return (
+        {h: n for h, n in occurrences.items() if n},
+        {h: n for h, n in device_counts.items() if n},
+        sorted(index.comments),
+    )
+
+
+def devices(index):
+    return {
+        os.path.basename(str(device)): [
+            index.hashes[i] for i in index.device_ids(device)
+        ]
+        for device in index.devices
+    }
+
+
+def texts(index):
+    index.resolve(range(len(index.hashes)))
+    return {index.hashes[i]: t for i, t in index.texts.items()}
+
+
+@pytest.fixture(scope="module")
+def plain(corpus):
+    index = StanzaIndex()
+    index.load(paths_of(corpus))
+    return index
+
+
+def test_jobs(corpus, plain):
+    index = StanzaIndex(jobs=2)
+    index.load(paths_of(corpus))
+    assert summary(index) == summary(plain)
+    assert devices(index) == devices(plain)
+    assert texts(index) == texts(plain)
+
+
+def config_tool(*args, cwd):
+    return subprocess.run(
+        [sys.executable, os.path.join(ROOT, "config-tool.py"), *args],
+        cwd=cwd,
+        env=dict(os.environ, PYTHONHASHSEED="0"),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+@functools.lru_cache()
+def plain_report(directory, *report):
+    output = config_tool("-d", directory, *report, cwd=directory)
+    assert output
+    return output
+
+
+REPORTS = [["-c", "all", "6"], ["-a", "specific"], ["--similar", "0.7"]]
+
+
+@pytest.mark.parametrize("report", REPORTS)
+def test_config_tool_jobs(corpus, tmp_path, report):
+    directory = str(corpus)
+    assert config_tool(
+        "-d", directory, "-j", "2", *report, cwd=tmp_path
+    ) == plain_report(directory, *report)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_cache(corpus, plain, tmp_path, jobs):
+    cache = str(tmp_path / "cache.db")
+    for _ in range(2):
+        # parsed, then read from the cache
+        index = StanzaIndex(jobs=jobs, cache=cache)
+        index.load(paths_of(corpus))
+        assert summary(index) == summary(plain)
+        assert devices(index) == devices(plain)
+        assert not index.texts
+        assert texts(index) == texts(plain)
+
+
+def test_cache_modified_while_parsed(tmp_path, monkeypatch):
+    path = tmp_path / "leaf1.txt"
+    path.write_text("!\nvlan 10\n!\nend\n")
+    cache = ParseCache(str(tmp_path / "cache.db"))
+    normalizer = Normalizer("")
+    monkeypatch.setattr(confindex, "_cache", cache)
+    monkeypatch.setattr(confindex, "_normalizer", normalizer)
+
+    def file_stanzas(path, comments, parse=normalizer.file_stanzas):
+        yield from parse(path, comments)
+        # saved again once read, the hashes are of the old config
+        path.write_text("!\nvlan 10\n!\nvlan 20\n!\nend\n")
+
+    monkeypatch.setattr(normalizer, "file_stanzas", file_stanzas)
+    _, _, old, _ = confindex.parse_file(path)
+    assert cache.get(path) is None
+    del normalizer.file_stanzas
+    _, _, new, _ = confindex.parse_file(path)
+    assert len(new) == len(old) + 1
+    assert cache.get(path)[1] == new
+
+
+@pytest.mark.parametrize("report", REPORTS)
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_config_tool_cache(corpus, tmp_path, report, jobs):
+    directory = str(corpus)
+    cache = str(tmp_path / "cache.db")
+    for _ in range(2):
+        assert config_tool(
+            "-d", directory, "--cache", cache, "-j", jobs, *report,
+            cwd=tmp_path,
+        ) == plain_report(directory, *report)
+
+
+def test_stream(corpus, plain):
+    index = StanzaIndex(stream=True)
+    index.load(paths_of(corpus))
+    assert summary(index) == summary(plain)
+    assert devices(index) == devices(plain)
+    assert not index.texts
+
+
+def test_stream_cache_keeps_no_text(corpus, tmp_path):
+    index = StanzaIndex(cache=str(tmp_path / "cache.db"), stream=True)
+    index.load(paths_of(corpus))
+    assert not index.texts
+
+
+@pytest.mark.parametrize("report", REPORTS[:2])
+def test_config_tool_stream(corpus, tmp_path, report):
+    directory = str(corpus)
+    assert config_tool(
+        "-d", directory, "-s", *report, cwd=tmp_path
+    ) == plain_report(directory, *report)
+
+
+def test_store(corpus, plain, tmp_path):
+    store = ConfigStore(str(tmp_path / "store.db"))
+    for path in paths_of(corpus):
+        store.put("s1", path.name, path.read_bytes())
+    for jobs in (1, 2):
+        index = StanzaIndex(jobs=jobs)
+        index.load_snapshot(store, "s1")
+        assert summary(index) == summary(plain)
+        assert devices(index) == devices(plain)
+        assert texts(index) == texts(plain)
+
+
+def test_corpus(plain, tmp_path):
+    path = str(tmp_path / "corpus.snap")
+    write_corpus(path, plain)
+    corpus = Corpus(path)
+    index = StanzaIndex()
+    index.load_corpus(corpus)
+    assert summary(index) == summary(plain)
+    assert devices(index) == devices(plain)
+    index.resolve(range(len(index.hashes)))
+    assert index.texts == plain.texts
+    for n, device in enumerate(plain.devices):
+        lines, bounds = corpus.device_line_ids(n)
+        stanzas = [
+            "\n".join(corpus.line(i) for i in lines[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        assert stanzas == [plain.texts[i] for i in plain.devices[device]]
+
+
+def test_corpus_needs_empty_index(plain, tmp_path):
+    path = str(tmp_path / "corpus.snap")
+    write_corpus(path, plain)
+    index = StanzaIndex()
+    index.load_corpus(Corpus(path))
+    with pytest.raises(ValueError):
+        index.load_corpus(Corpus(path))
+
+
+@pytest.mark.parametrize("report", REPORTS)
+def test_config_tool_corpus(corpus, tmp_path, report):
+    directory = str(corpus)
+    path = str(tmp_path / "corpus.snap")
+    config_tool("-d", directory, "--save-corpus", path, "-c", "2", cwd=tmp_path)
+    assert config_tool(
+        "--corpus", path, *report, cwd=tmp_path
+    ) == plain_report(directory, *report)
@@ -0,0 +1,93 @@
+import random
+import re
+
+import pytest
+
+from confparse import Normalizer, restore_bangs
+
+
+def reference(content, mask=""):
+    """the series of re.sub() calls the tools used before Normalizer"""
+    comments = re.findall(re.compile(r"^\s*!!.*", re.M), content)
+    content = re.sub(re.compile(r"^(hostname.*)", re.M), r"\1\n!", content)
+    s = re.sub(re.compile(r"^\s*!!.*|^>.*|^end.*|", re.M), "", content)
+    s = re.sub(re.compile(r"RANCID-CONTENT-TYPE:\sarista", re.IGNORECASE), "", s)
+    s = re.sub(re.compile(r"^\s.*Command:.*", re.M), "", s)
+    s = re.sub(re.compile(r"(^.\s+)!(.*)", re.M), r"\1#\2", s)
+    s = re.sub(re.compile(r"(\w)!", re.M), r"\1#", s)
+    s = re.sub(re.compile(r"^!.*boot\ssystem.*", re.M), "", s)
+    if mask:
+        s = re.sub(
+            re.compile(r"(.*{}).*".format(mask), re.M | re.IGNORECASE),
+            r"\1 MASKED",
+            s,
+        )
+    return s, comments
+
+
+PIECES = [
+    "!", "!!", " ", "  ", "\t", "a", "x", "hostname h1", "end", "endx", ">",
+    "! Command: show", " Command: x", "Command: y",
+    "RANCID-CONTENT-TYPE: arista", "!rancid-content-type: Arista",
+    "! boot system flash", "!boot system", "description foo",
+    "Description BAR baz", "word!", "a !", "a  !b", " !", "   ! c", "!!x",
+    "  !!y", "", "", "", "interface Eth1", "   ip address 1.1.1.1/24", "b!!",
+    ":",
+]
+
+
+@pytest.mark.parametrize("mask", ["", "description"])
+def test_matches_reference(mask):
+    r = random.Random(0)
+    for _ in range(5000):
+        lines = []
+        for _ in range(r.randint(0, 12)):
+            piece = r.choice(PIECES)
+            if r.random() < 0.2:
+                piece += r.choice(PIECES)
+            lines.append(piece)
+        content = "\n".join(lines) + r.choice(["", "\n"])
+        expected, expected_comments = reference(content, mask)
+        normalizer = Normalizer(mask)
+        comments = []
+        lines = "\n".join(normalizer.lines(content.split("\n"), comments))
+        assert lines == expected, repr(content)
+        assert comments == expected_comments, repr(content)
+        assert list(normalizer.text_stanzas(content)) == expected.split("!")
+
+
+def test_stanzas():
+    config = (
+        "! Command: show running-config\n"
+        "! boot system flash:/EOS.swi\n"
+        "!\n"
+        "hostname leaf1\n"
+        "ip name-server 10.0.0.53\n"
+        "!\n"
+        "interface Ethernet1\n"
+        "   description uplink\n"
+        "   ! keep\n"
+        "!! changed by ops\n"
+        "!\n"
+        "end\n"
+    )
+    comments = []
+    stanzas = list(Normalizer("description").text_stanzas(config, comments))
+    assert stanzas[2] == "\nhostname leaf1\n"
+    assert stanzas[3] == "\nip name-server 10.0.0.53\n"
+    assert stanzas[4] == (
+        "\ninterface Ethernet1\n   description MASKED\n   # keep\n\n"
+    )
+    assert restore_bangs(stanzas[4]).split("\n")[3] == "   ! keep"
+    assert comments == ["!! changed by ops"]
+
+
+def test_file_and_text_stanzas_agree(corpus):
+    normalizer = Normalizer()
+    for path in sorted(corpus.iterdir()):
+        file_comments = []
+        text_comments = []
+        assert list(normalizer.file_stanzas(path, file_comments)) == list(
+            normalizer.text_stanzas(path.read_text(), text_comments)
+        )
+        assert file_comments == text_comments
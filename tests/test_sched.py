@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+import confsched
+from confmetrics import Metrics
+from confsched import AdaptiveLimit, Scheduler, read_inventory
+
+
+async def _request(limit, ok):
+    start = await limit.acquire()
+    await limit.release(start, ok)
+
+
+def test_additive_increase():
+    limit = AdaptiveLimit(6, initial=4)
+    # about one slot more per window of requests on time
+    for _ in range(2):
+        before = limit.limit
+        for _ in range(int(before)):
+            asyncio.run(_request(limit, True))
+        assert 0.75 < limit.limit - before <= 1
+    for _ in range(20):
+        asyncio.run(_request(limit, True))
+    assert limit.limit == 6
+
+
+def test_multiplicative_decrease():
+    limit = AdaptiveLimit(64, initial=16)
+    asyncio.run(_request(limit, False))
+    assert limit.limit == 8
+    for _ in range(10):
+        asyncio.run(_request(limit, False))
+    assert limit.limit == 1
+
+
+def test_one_decrease_per_window():
+    async def run():
+        limit = AdaptiveLimit(64, initial=16)
+        starts = [await limit.acquire() for _ in range(8)]
+        # requests started before the first failure don't cut again
+        for start in starts:
+            await limit.release(start, False)
+        return limit.limit
+
+    assert asyncio.run(run()) == 8
+
+
+def test_latency_overload():
+    async def run():
+        limit = AdaptiveLimit(64, initial=16, tolerance=3)
+        for _ in range(5):
+            start = await limit.acquire()
+            await limit.release(start, True)
+        start = await limit.acquire()
+        await limit.release(start - 10, True)
+        return limit.limit
+
+    assert asyncio.run(run()) < 16
+
+
+def test_not_adaptive():
+    limit = AdaptiveLimit(32, initial=4, adaptive=False)
+    asyncio.run(_request(limit, False))
+    assert limit.limit == 32
+
+
+def test_limit_gauge(monkeypatch):
+    recorded = Metrics()
+    monkeypatch.setattr(confsched, "metrics", recorded)
+    limit = AdaptiveLimit(64, initial=16)
+    asyncio.run(_request(limit, False))
+    for _ in range(20):
+        asyncio.run(_request(limit, True))
+    gauge = recorded.to_dict()["gauges"]["scheduler.limit"]
+    assert (gauge["min"], gauge["max"], gauge["last"]) == (8, 16, 10)
+    assert "scheduler.limit" not in recorded.histograms
+
+
+def test_caps(tmp_path):
+    inventory = tmp_path / "inventory"
+    inventory.write_text(
+        "# pod 1 shares a TACACS server\n"
+        "limit pod1 2\n"
+        "limit 10.20.0.0/16 3\n"
+        + "".join(f"leaf{n}.pod1 pod1\n" for n in range(8))
+        + "".join(f"10.20.1.{n}\n" for n in range(8))
+        + "spine1\n"
+    )
+    hostnames, sites, limits = read_inventory(str(inventory))
+    assert len(hostnames) == 17
+    assert limits == {"pod1": 2, "10.20.0.0/16": 3}
+    scheduler = Scheduler(100, sites=sites, limits=limits)
+    assert scheduler.caps_of("leaf1.pod1") == ["pod1"]
+    assert scheduler.caps_of("10.20.1.1:443") == ["10.20.0.0/16"]
+    assert scheduler.caps_of("spine1") == []
+    in_flight = {"pod1": 0, "10.20.0.0/16": 0, "": 0}
+    peak = dict(in_flight)
+
+    async def device(hostname):
+        key = (scheduler.caps_of(hostname) or [""])[0]
+        async with scheduler.slot(hostname):
+            in_flight[key] += 1
+            peak[key] = max(peak[key], in_flight[key])
+            await asyncio.sleep(0.01)
+            in_flight[key] -= 1
+
+    async def run():
+        await asyncio.gather(*(device(hostname) for hostname in hostnames))
+
+    asyncio.run(run())
+    assert peak == {"pod1": 2, "10.20.0.0/16": 3, "": 1}
+
+
+def test_bad_limit(tmp_path):
+    inventory = tmp_path / "inventory"
+    inventory.write_text("limit pod1 zero\n")
+    with pytest.raises(ValueError):
+        read_inventory(str(inventory))
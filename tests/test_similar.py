@@ -0,0 +1,69 @@
+import random
+
+from confsimilar import similar_clusters, stanza_lines
+
+ACL = "\nip access-list edge\n" + "".join(
+    f"   {n * 10} permit ip 10.{n}.0.0/16 any\n" for n in range(1, 13)
+)
+
+
+def clusters_of(texts, threshold=0.7):
+    return sorted(
+        sorted(texts[i] for i in cluster)
+        for cluster in similar_clusters(texts, threshold)
+    )
+
+
+def interface(n, description):
+    return (
+        f"\ninterface Ethernet{n}\n"
+        f"   description {description}\n"
+        "   mtu 9214\n"
+        "   switchport mode trunk\n"
+        "   switchport trunk allowed vlan 10-20\n"
+        "   spanning-tree portfast\n"
+        "   storm-control broadcast level 1\n"
+        "   lldp transmit\n"
+        "   lldp receive\n"
+        "   load-interval 5\n"
+        "   no shutdown\n"
+    )
+
+
+def test_stanza_lines():
+    text = "\nrouter bgp 65000\n   neighbor  10.0.0.1   remote-as 1 \n"
+    assert stanza_lines(text) == [
+        "router bgp 65000",
+        "   neighbor 10.0.0.1 remote-as 1",
+    ]
+
+
+def test_near_duplicates():
+    texts = [
+        ACL,
+        ACL + "   130 permit ip 10.13.0.0/16 any\n",
+        ACL.replace(" 40 permit", " 40 deny"),
+        "\nhostname leaf1\n",
+        "\nip name-server 10.0.0.53\n",
+        "\nrouter bgp 65000\n   router-id 10.0.0.1\n",
+    ]
+    assert clusters_of(texts) == [sorted(texts[:3])]
+    assert clusters_of(texts, 0.95) == []
+
+
+def test_order_independent():
+    rng = random.Random(0)
+    texts = [interface(n, f"host{n % 7}") for n in range(300)]
+    texts += [ACL.replace(" 40 ", f" {n} ") for n in range(41, 200)]
+    texts += [f"\nvlan {n}\n   name v{n}\n" for n in range(100)]
+    expected = clusters_of(texts)
+    assert expected
+    for _ in range(3):
+        rng.shuffle(texts)
+        assert clusters_of(texts) == expected
+
+
+def test_large_bucket():
+    # every stanza lands in the same buckets, one cluster
+    texts = [interface(1, f"host{n}") for n in range(4000)]
+    assert [len(c) for c in similar_clusters(texts)] == [4000]
@@ -0,0 +1,51 @@
+import zlib
+
+import pytest
+
+import confstore
+from confstore import ConfigStore, split_chunks
+
+
+def test_round_trip(corpus, tmp_path):
+    store = ConfigStore(str(tmp_path / "store.db"))
+    configs = {path.name: path.read_bytes() for path in corpus.iterdir()}
+    for snapshot in ("s1", "s2"):
+        for name, data in configs.items():
+            store.put(snapshot, name, data)
+    assert store.snapshots() == ["s1", "s2"]
+    assert store.devices("s2") == sorted(configs)
+    assert dict(store.configs("s2")) == configs
+    names = sorted(configs)[3:6]
+    assert list(store.configs("s1", names)) == [
+        (name, configs[name]) for name in names
+    ]
+    # every piece is stored once, whatever the number of snapshots
+    pieces = {
+        piece for data in configs.values() for piece in split_chunks(data)
+    }
+    (count,) = store.db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+    assert count == len(pieces)
+
+
+@pytest.mark.parametrize("cached", [0, 1, 16, 100000])
+def test_configs_cached(corpus, tmp_path, monkeypatch, cached):
+    store = ConfigStore(str(tmp_path / "store.db"))
+    configs = {path.name: path.read_bytes() for path in corpus.iterdir()}
+    for name, data in configs.items():
+        store.put("s1", name, data)
+    decompressed = []
+
+    def decompress(data, original=zlib.decompress):
+        decompressed.append(data)
+        return original(data)
+
+    monkeypatch.setattr(confstore.zlib, "decompress", decompress)
+    assert dict(store.configs("s1", cached=cached)) == configs
+    pieces = {
+        piece for data in configs.values() for piece in split_chunks(data)
+    }
+    if cached >= len(pieces):
+        # each piece once, however many devices share it
+        assert len(decompressed) == len(pieces)
+    else:
+        assert len(decompressed) >= len(pieces)
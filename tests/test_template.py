@@ -0,0 +1,98 @@
+import pytest
+
+from conftemplate import Tokenizer, templates
+
+
+@pytest.mark.parametrize(
+    "line, shape, kinds, values",
+    [
+        (
+            "   ip address 10.0.0.1/31",
+            "   ip address {}",
+            ("ipv4_prefix",),
+            ("10.0.0.1/31",),
+        ),
+        (
+            "   neighbor 10.0.0.2 remote-as 65001",
+            "   neighbor {} remote-as {}",
+            ("ipv4", "asn"),
+            ("10.0.0.2", "65001"),
+        ),
+        (
+            "interface Ethernet3/1",
+            "interface {}",
+            ("interface",),
+            ("Ethernet3/1",),
+        ),
+        ("vlan 10-20,30", "vlan {}", ("vlan",), ("10-20,30",)),
+        (
+            "   description uplink to {spine} 1",
+            "   description {}",
+            ("description",),
+            ("uplink to {spine} 1",),
+        ),
+        ("   mtu 9214", "   mtu {}", ("number",), ("9214",)),
+        ("ip routing", "ip routing", (), ()),
+    ],
+)
+def test_line(line, shape, kinds, values):
+    tokenizer = Tokenizer()
+    assert tokenizer.line(line) == (shape, kinds, values)
+    assert tokenizer.cache[line] == (shape, kinds, values)
+
+
+def test_line_braces():
+    shape, kinds, values = Tokenizer().line("banner {motd} 42")
+    assert shape == "banner {{motd}} {}"
+    assert shape.format(*values) == "banner {motd} 42"
+
+
+def test_stanza():
+    shape, kinds, values = Tokenizer().stanza(
+        "interface Ethernet1\n   mtu 9214"
+    )
+    assert shape == "interface {}\n   mtu {}"
+    assert kinds == ("interface", "number")
+    assert values == ("Ethernet1", "9214")
+
+
+def test_templates():
+    texts = [
+        "interface Ethernet1\n   mtu 9214\n   ip address 10.0.0.1/31",
+        "interface Ethernet2\n   mtu 9214\n   ip address 10.0.0.3/31",
+        "router bgp 65001\n   router-id 1.1.1.1",
+        "",
+        "interface Ethernet3\n   mtu 9214\n   ip address 10.0.0.5/31",
+    ]
+    (template,) = templates(texts)
+    assert template.text == (
+        "interface {interface_1}\n   mtu 9214\n   ip address {ipv4_prefix_1}"
+    )
+    assert template.variables == ["interface_1", "ipv4_prefix_1"]
+    assert template.members == [
+        (0, ("Ethernet1", "10.0.0.1/31")),
+        (1, ("Ethernet2", "10.0.0.3/31")),
+        (4, ("Ethernet3", "10.0.0.5/31")),
+    ]
+
+
+def test_templates_braces():
+    texts = [
+        "banner {motd}\n   hostname leaf1",
+        "banner {motd}\n   hostname leaf2",
+    ]
+    (template,) = templates(texts)
+    assert template.text == "banner {motd}\n   hostname {hostname_1}"
+    for number, row in template.members:
+        values = dict(zip(template.variables, row))
+        assert template.text.replace(
+            "{hostname_1}", values["hostname_1"]
+        ) == texts[number]
+
+
+def test_templates_shared_tokenizer():
+    tokenizer = Tokenizer()
+    texts = ["vlan 10\n   name red", "vlan 20\n   name blue"]
+    (template,) = templates(texts, tokenizer)
+    assert template.text == "vlan {vlan_1}\n   name {name_1}"
+    assert "vlan 10" in tokenizer.cache
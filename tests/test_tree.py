@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from confindex import TreeIndex
+from confparse import tree_lines
+from confstore import ConfigStore
+
+INTERFACE = "!\ninterface Ethernet1\n{}   mtu 9214\n{}"
+BGP = (
+    "!\nrouter bgp 1\n"
+    "   neighbor 10.0.0.1 remote-as 2\n"
+    "   address-family ipv4\n"
+    "      neighbor 10.0.0.1 activate\n"
+)
+CONFIGS = {
+    "d1.txt": INTERFACE.format("   description a\n", "") + BGP + "!\nend\n",
+    "d2.txt": INTERFACE.format("   description b\n", "") + BGP + "!\nend\n",
+    "d3.txt": INTERFACE.format("", "   shutdown\n") + "!\nend\n",
+}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    for name, text in CONFIGS.items():
+        (tmp_path / name).write_text(text)
+    return sorted(tmp_path.iterdir())
+
+
+def blocks(tree):
+    return (
+        tree.common_blocks(3),
+        tree.common_blocks(2),
+        {
+            os.path.basename(str(device)): tree.specific_lines(device)
+            for device in tree.devices
+        },
+    )
+
+
+def test_tree_lines():
+    lines = [
+        "router bgp 1",
+        "   address-family ipv4",
+        "      neighbor 10.0.0.1 activate",
+        "   router-id 1.1.1.1",
+        "!",
+        "banner login",
+        "welcome",
+        "EOF",
+        "# comment",
+        "hostname x",
+    ]
+    assert [depth for depth, _ in tree_lines(lines)] == [0, 1, 2, 1, 0, 1, 1, 0]
+
+
+def test_blocks(paths):
+    tree = TreeIndex()
+    tree.load(paths)
+    common_all, common_two, specific = blocks(tree)
+    assert common_all == [(["interface Ethernet1", "   mtu 9214"], 3)]
+    assert common_two == [
+        (["interface Ethernet1", "   mtu 9214"], 3),
+        (BGP.strip("!\n").split("\n"), 2),
+    ]
+    assert specific == {
+        "d1.txt": [["interface Ethernet1", "   description a"]],
+        "d2.txt": [["interface Ethernet1", "   description b"]],
+        "d3.txt": [["interface Ethernet1", "   shutdown"]],
+    }
+
+
+def test_modes_agree(paths, tmp_path):
+    tree = TreeIndex()
+    tree.load(paths)
+    parallel = TreeIndex(jobs=2)
+    parallel.load(paths)
+    assert blocks(parallel) == blocks(tree)
+    store = ConfigStore(str(tmp_path / "store.db"))
+    for path in paths:
+        store.put("s1", path.name, path.read_bytes())
+    stored = TreeIndex()
+    stored.load_snapshot(store, "s1")
+    assert blocks(stored) == blocks(tree)
@@ -0,0 +1,120 @@
+import asyncio
+import shutil
+
+import pytest
+
+from confindex import StanzaIndex
+from confmetrics import metrics
+from confwatch import ConfigWatch
+
+
+@pytest.fixture
+def directory(corpus, tmp_path):
+    directory = tmp_path / "configs"
+    shutil.copytree(corpus, directory)
+    return directory
+
+
+def live(directory, jobs=1):
+    index = StanzaIndex(jobs=jobs)
+    index.load(sorted(directory.iterdir()))
+    return ConfigWatch(index, directory, interval=0.05, delay=0.05)
+
+
+def answers(watch):
+    """what the query API answers, to compare with a fresh load"""
+    return (
+        watch.status()["devices"],
+        watch.status()["stanzas"],
+        watch.common("all"),
+        watch.common(2),
+        {
+            path.name: watch.specific(path.name)
+            for path in watch.index.devices
+        },
+        sorted(watch.index.comments),
+    )
+
+
+def edit(directory):
+    """change, add and delete configs, return the names touched"""
+    names = sorted(path.name for path in directory.iterdir())
+    first = directory / names[0]
+    first.write_text(
+        first.read_text().replace("!\n", "!\nip domain-name edited\n!\n", 1)
+    )
+    shutil.copy(directory / names[1], directory / "new.txt")
+    (directory / names[2]).unlink()
+    return {names[0], names[2], "new.txt"}
+
+
+def update(watch, names):
+    async def run():
+        watch._changed(names)
+        await watch.update()
+
+    asyncio.run(run())
+
+
+def test_update(directory):
+    watch = live(directory)
+    update(watch, edit(directory))
+    assert watch.updates == 1
+    assert answers(watch) == answers(live(directory))
+
+
+def test_unparsable_file(directory):
+    watch = live(directory)
+    names = sorted(path.name for path in directory.iterdir())
+    broken = directory / names[3]
+    before = list(watch.index.device_ids(broken))
+    broken.write_bytes(b"hostname \xff\xfe\n")
+    touched = edit(directory)
+    errors = metrics.counters.get("watch.errors", 0)
+    update(watch, touched | {broken.name})
+    assert metrics.counters["watch.errors"] == errors + 1
+    # the other files are updated, the broken one keeps its stanzas
+    assert watch.updates == 1
+    assert list(watch.index.device_ids(broken)) == before
+    assert (directory / "new.txt") in watch.index.devices
+
+
+def test_comments_replaced(directory):
+    watch = live(directory)
+    comments = sorted(watch.index.comments)
+    assert comments
+    names = {path.name for path in directory.iterdir()}
+    for _ in range(3):
+        update(watch, names)
+    assert sorted(watch.index.comments) == comments
+    commented = next(
+        path for path in sorted(directory.iterdir()) if "!!" in path.read_text()
+    )
+    commented.unlink()
+    update(watch, {commented.name})
+    assert len(watch.index.comments) == len(comments) - 1
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_watch(directory, jobs):
+    watch = live(directory, jobs)
+
+    async def run():
+        task = asyncio.create_task(watch.watch())
+        # changes in quick succession, while updates run
+        path = directory / sorted(p.name for p in directory.iterdir())[0]
+        for n in range(5):
+            path.write_text(path.read_text() + f"ntp server 10.0.0.{n}\n!\n")
+            await asyncio.sleep(0.03)
+        edit(directory)
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if watch.updates and not watch._pending and answers(
+                watch
+            ) == answers(live(directory)):
+                break
+        task.cancel()
+        watch.executor.shutdown()
+
+    asyncio.run(run())
+    assert answers(watch) == answers(live(directory))